@@ -0,0 +1,368 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Iterable, List
+
+from bottr import ratelimit
+from bottr.clients import ClientPool
+from bottr.retry import RetryPolicy, RATELIMIT
+from bottr.seen import SeenSet
+from bottr.util import parse_wait_time
+
+actions_logger = logging.getLogger(__name__)
+
+"""Minimum seconds an action is deferred by when its rate limiter has no token left"""
+MIN_DEFER = 0.01
+
+
+class Action(ABC):
+    """
+    A write action on a reddit thing, such as a reply.
+
+    Handlers may return actions instead of calling PRAW themselves. The bot then executes them on
+    the original PRAW object, e.g. in the parent process when handlers run in a process pool.
+
+    With a :class:`~bottr.clients.ClientPool`, an :class:`Outbox` executes actions as the account
+    named by :attr:`account`, or as any account if it is :code:`None`.
+    """
+
+    account = None  # type: str
+
+    @abstractmethod
+    def apply(self, thing) -> Any:
+        """
+        Execute this action on :code:`thing`.
+
+        :param thing: PRAW object the action refers to
+        """
+        pass
+
+    def __eq__(self, other):
+        return type(self) is type(other) and vars(self) == vars(other)
+
+    def __repr__(self):
+        return '{}({})'.format(self.__class__.__name__,
+                               ', '.join('{}={!r}'.format(k, v) for k, v in sorted(vars(self).items())))
+
+
+class Reply(Action):
+    """Reply to a comment, submission or message with :code:`body`, optionally as :code:`account`."""
+
+    def __init__(self, body: str, account: str = None):
+        self.body = body
+        self.account = account
+
+    def apply(self, thing):
+        return thing.reply(self.body)
+
+
+class Edit(Action):
+    """
+    Replace the body of an own comment or submission with :code:`body`. An :class:`Outbox` with a
+    :class:`~bottr.clients.ClientPool` executes it as the author.
+    """
+
+    def __init__(self, body: str):
+        self.body = body
+
+    def apply(self, thing):
+        return thing.edit(self.body)
+
+
+class MarkRead(Action):
+    """Mark an inbox message as read. It is executed by the client the message was read with."""
+
+    def apply(self, thing):
+        return thing.mark_read()
+
+
+class SendMessage(Action):
+    """Send a private message to the redditor :code:`recipient`, e.g. in response to a mention."""
+
+    def __init__(self, recipient: str, subject: str, body: str, account: str = None):
+        self.recipient = recipient
+        self.subject = subject
+        self.body = body
+        self.account = account
+
+    def apply(self, thing):
+        return thing._reddit.redditor(self.recipient).message(self.subject, self.body)
+
+
+def iter_actions(result) -> List[Action]:
+    """
+    List the actions a handler returned.
+
+    :param result: :code:`None`, a single :class:`Action` or an iterable of actions
+    """
+    if result is None:
+        return []
+
+    if isinstance(result, Action):
+        return [result]
+
+    actions = []
+    for action in result:
+        if not isinstance(action, Action):
+            actions_logger.warning('Ignoring handler result {!r}, it is not an Action.'.format(action))
+            continue
+        actions.append(action)
+    return actions
+
+
+def apply_actions(result, thing):
+    """
+    Execute the actions a handler returned on :code:`thing`.
+
+    :param result: :code:`None`, a single :class:`Action` or an iterable of actions
+    :param thing: PRAW object the actions refer to
+    """
+    for action in iter_actions(result):
+        action.apply(thing)
+
+
+class Outbox(object):
+    """
+    Queue of write actions, executed by a dedicated writer thread.
+
+    Handlers enqueue replies, edits, messages etc. and return at once, so reading and classifying
+    items does not wait for writes. The writer executes the actions in order, paced by the
+    :class:`~bottr.ratelimit.RateLimiter` of the reddit instance of each item. An action whose
+    limiter has no token left is deferred until it has one, while later actions go ahead, so a
+    paused account does not hold up the writes of other accounts. Failed actions are retried with
+    the backoff of :code:`retry`. A :code:`RATELIMIT` error pauses the shared limiter and retries
+    the action once it is lifted, which counts as an attempt too. Enqueuing the same action on the
+    same item twice has no effect.
+
+    Pass an outbox as :code:`outbox` to a bot to route the :class:`Action` objects returned by
+    its handlers through it, or use it directly from handlers.
+
+    :param retry: Backoff for failed actions. Defaults to up to 5 attempts.
+    :param dedupe_capacity: Number of recent actions remembered for de-duplication
+    :param clients: Accounts to execute the actions with, see :class:`~bottr.clients.ClientPool`.
+        Each action is executed by the client with the most rate limit budget left, unless it
+        names an account. :code:`None` executes actions with the client of their item.
+
+    **Example usage**::
+
+        outbox = Outbox()
+
+        def parse(comment):
+            if 'banana' in comment.body:
+                outbox.reply(comment, 'This comment is bananas.')
+
+        bot = CommentBot(reddit=reddit, func_comment=parse, outbox=outbox)
+        bot.start()
+    """
+
+    def __init__(self, retry: RetryPolicy = None, dedupe_capacity: int = 10000,
+                 clients: ClientPool = None):
+        self._retry = retry if retry is not None else RetryPolicy(base=5, max_attempts=5)
+        self._clients = clients
+        self._seen = SeenSet(capacity=dedupe_capacity)
+        self._heap = []  # type: List[tuple]
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._pending = 0
+        self._stop = False
+        self._thread = None  # type: threading.Thread
+        self.log = logging.getLogger(__name__)
+
+    @staticmethod
+    def _key(thing, action: Action) -> str:
+        return '{}:{!r}'.format(thing.fullname, action)
+
+    def put(self, thing, action: Action) -> bool:
+        """
+        Enqueue :code:`action` on :code:`thing`.
+
+        :param thing: PRAW object the action refers to
+        :param action: Action to execute
+        :return: False if the same action was enqueued on :code:`thing` before
+        """
+        if not self._seen.add(self._key(thing, action)):
+            self.log.debug('Skipping duplicate {} on {}'.format(action, thing.fullname))
+            return False
+
+        self._schedule(time.monotonic(), thing, action, 0)
+        return True
+
+    def put_all(self, thing, actions: Iterable[Action]):
+        """Enqueue several actions on :code:`thing`, see :func:`~Outbox.put`."""
+        for action in actions:
+            self.put(thing, action)
+
+    def reply(self, thing, body: str) -> bool:
+        """Enqueue a :class:`Reply` to :code:`thing`."""
+        return self.put(thing, Reply(body))
+
+    def edit(self, thing, body: str) -> bool:
+        """Enqueue an :class:`Edit` of :code:`thing`."""
+        return self.put(thing, Edit(body))
+
+    def mark_read(self, thing) -> bool:
+        """Enqueue marking the message :code:`thing` as read."""
+        return self.put(thing, MarkRead())
+
+    def send_message(self, thing, recipient: str, subject: str, body: str) -> bool:
+        """Enqueue a :class:`SendMessage` in response to :code:`thing`."""
+        return self.put(thing, SendMessage(recipient, subject, body))
+
+    def _schedule(self, ready: float, thing, action: Action, attempt: int, new: bool = True):
+        with self._cond:
+            heapq.heappush(self._heap, (ready, next(self._counter), thing, action, attempt))
+            if new:
+                self._pending += 1
+            self._cond.notify_all()
+
+    def start(self):
+        """Start the writer thread. Does nothing if it is already running."""
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stop = False
+            self._thread = threading.Thread(target=self._run, name='outbox-writer-thread')
+            self._thread.start()
+
+    def stop(self, drain: bool = True, timeout: float = None) -> bool:
+        """
+        Stop the writer thread.
+
+        :param drain: Execute all pending actions first, including their retries
+        :param timeout: Maximum seconds to wait. Actions still pending then are abandoned.
+            :code:`None` waits until all are done.
+        :return: :code:`False` if pending actions were abandoned or the writer thread was still
+            executing an action after :code:`timeout` seconds
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        drained = self.join(timeout) if drain else False
+
+        with self._cond:
+            self._stop = True
+            abandoned = self._pending if not drained else 0
+            self._heap = []
+            self._pending = 0
+            self._cond.notify_all()
+            thread, self._thread = self._thread, None
+
+        if abandoned and drain:
+            self.log.warning('Outbox did not finish within {} seconds, abandoning {} actions'
+                             .format(timeout, abandoned))
+
+        if thread is not None:
+            thread.join(max(0.0, deadline - time.monotonic()) if deadline is not None else None)
+            if thread.is_alive():
+                return False
+        return not abandoned
+
+    def join(self, timeout: float = None) -> bool:
+        """
+        Block until all enqueued actions have been executed or given up on.
+
+        :param timeout: Maximum seconds to wait. :code:`None` waits as long as needed.
+        :return: :code:`False` if actions were still pending after :code:`timeout` seconds
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._cond:
+            while self._pending > 0:
+                if deadline is None:
+                    self._cond.wait()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+            return True
+
+    def __len__(self) -> int:
+        """Number of pending actions"""
+        return self._pending
+
+    def _next(self):
+        """Wait for the next action that is ready, or return None when stopped."""
+        with self._cond:
+            while not self._stop:
+                if self._heap:
+                    wait = self._heap[0][0] - time.monotonic()
+                    if wait <= 0:
+                        return heapq.heappop(self._heap)
+                    self._cond.wait(wait)
+                else:
+                    self._cond.wait()
+            return None
+
+    def _done(self):
+        with self._cond:
+            # Actions abandoned by stop() are no longer pending
+            self._pending = max(0, self._pending - 1)
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            job = self._next()
+            if job is None:
+                break
+
+            _, _, thing, action, attempt = job
+            try:
+                bound = self._bind(thing, action)
+            except Exception as e:
+                self._failed(thing, action, attempt, e, ratelimit.default_limiter)
+                continue
+
+            # Defer the action instead of waiting, so the actions of other accounts go ahead
+            limiter = ratelimit.for_reddit(getattr(bound, '_reddit', None))
+            if not limiter.try_acquire():
+                ready = time.monotonic() + max(limiter.wait_time(), MIN_DEFER)
+                self._schedule(ready, thing, action, attempt, new=False)
+                continue
+
+            try:
+                action.apply(bound)
+                self._done()
+            except Exception as e:
+                self._failed(thing, action, attempt, e, limiter)
+
+    def _bind(self, thing, action: Action):
+        """:code:`thing` bound to the client of the pool that has to execute :code:`action`."""
+        if self._clients is None or isinstance(action, MarkRead):
+            return thing
+
+        if isinstance(action, Edit):
+            # Only the author can edit a thing
+            client = self._clients.choose(account=str(vars(thing).get('author')))
+        else:
+            client = self._clients.choose(account=action.account)
+        return self._clients.bind(thing, client)
+
+    def _failed(self, thing, action: Action, attempt: int, e: Exception,
+                limiter: ratelimit.RateLimiter):
+        if 'DELETED_COMMENT' in str(e):
+            self.log.warning('{} has been deleted, dropping {}'.format(thing.fullname, action))
+            self._done()
+            return
+
+        if self._retry.classify(e) == RATELIMIT:
+            # Pause all writes on this account and try again as soon as the pause is over
+            limiter.block(parse_wait_time(str(e)))
+            if self._retry.delay(attempt, e) is None:
+                self.log.error('Giving up on {} on {} after {} rate limited attempts: {}'
+                               .format(action, thing.fullname, attempt + 1, e))
+                self._done()
+                return
+            self._schedule(time.monotonic(), thing, action, attempt + 1, new=False)
+            return
+
+        delay = self._retry.delay(attempt, e)
+        if delay is None:
+            self.log.error('Giving up on {} on {} ({} error): {}'
+                           .format(action, thing.fullname, self._retry.classify(e), e))
+            self._done()
+            return
+
+        self.log.warning('{} on {} failed, retrying in {:.1f} seconds: {}'
+                         .format(action, thing.fullname, delay, e))
+        self._schedule(time.monotonic() + delay, thing, action, attempt + 1, new=False)
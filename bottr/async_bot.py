@@ -0,0 +1,345 @@
+import asyncio
+import functools
+import logging
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Callable, Any
+
+import praw
+
+from bottr.bot import BotThread
+from bottr.retry import RetryPolicy
+
+"""Marker returned when a stream is exhausted"""
+_END = object()
+
+
+class AbstractAsyncBot(ABC):
+    """
+    Abstract bot class running its handlers on a single :mod:`asyncio` event loop.
+
+    Instead of :code:`n_jobs` worker threads, up to :code:`max_concurrency` handlers are in flight
+    at the same time, bounded by a semaphore. PRAW streams are blocking, so each stream is iterated
+    in its own helper thread and its items are handed over to the event loop. Streams pause while
+    no new items arrive, so the listeners notice :func:`~AbstractAsyncBot.stop` on quiet streams
+    too.
+    """
+
+    def __init__(self, reddit: praw.Reddit,
+                 subreddits: Iterable = None,
+                 name: str = "AbstractAsyncBot",
+                 max_concurrency: int = 100,
+                 retry: RetryPolicy = None):
+        """
+        Default constructor
+
+        :param reddit: Reddit instance
+        :param subreddits: List of subreddits
+        :param max_concurrency: Maximum number of handlers in flight
+        :param retry: Backoff policy for restarting failed streams
+        """
+
+        if subreddits is None:
+            subreddits = []  # type: List[str]
+
+        if max_concurrency < 1:
+            raise Exception('You need to allow at least one handler in flight.')
+
+        self._subs = subreddits
+        self._name = name
+        self._reddit = reddit
+        self._max_concurrency = max_concurrency
+        self._retry = retry if retry is not None else RetryPolicy()
+        self._stop = False
+        self._loop = None  # type: asyncio.AbstractEventLoop
+        self._thread = None  # type: BotThread
+        self.log = logging.getLogger(__name__)
+        super().__init__()
+
+    @abstractmethod
+    def _listeners(self) -> List[Any]:
+        """Coroutines listening to the streams of this bot"""
+        pass
+
+    def start(self):
+        """
+        Starts the event loop of this bot in a separate thread. Therefore, this call is non-blocking.
+        """
+        self._thread = BotThread(name='{}-event-loop-thread'.format(self._name), target=self._run)
+        self._thread.start()
+        self.log.info('Starting event loop ...')
+
+    def stop(self):
+        """
+        Stops this bot.
+
+        Returns as soon as all handlers in flight have finished.
+        """
+        self.log.debug('Stopping bot {}'.format(self._name))
+        self._stop = True
+        if self._thread is not None:
+            self._thread.join()
+
+        self.log.debug('Stopping bot {} finished. Event loop closed.'.format(self._name))
+
+    def _run(self):
+        """Run all listeners on a new event loop until they finished."""
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(asyncio.gather(*self._listeners()))
+        finally:
+            self._loop.close()
+
+    async def _call(self, func: Callable, item, *args):
+        """Await :code:`func` if it is a coroutine function, otherwise run it in the default executor."""
+        if asyncio.iscoroutinefunction(func):
+            await func(item, *args)
+        else:
+            await self._loop.run_in_executor(None, functools.partial(func, item, *args))
+
+    async def _handle(self, process: Callable, item, semaphore: asyncio.Semaphore):
+        try:
+            await process(item)
+        except Exception as e:
+            self.log.error('Exception while processing {}:'.format(item))
+            self.log.error(str(e))
+        finally:
+            semaphore.release()
+
+    async def _listen(self, stream: Callable[[], Iterable], process: Callable, kind: str):
+        """
+        Dispatch every item of :code:`stream()` to the coroutine :code:`process`.
+
+        :param stream: Function returning a PRAW stream
+        :param process: Coroutine function processing a single item
+        :param kind: Name of the stream used for logging
+        """
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+        tasks = set()
+        executor = ThreadPoolExecutor(max_workers=1)
+        attempt = 0
+
+        while not self._stop:
+            try:
+                items = iter(await self._loop.run_in_executor(executor, stream))
+                while True:
+                    item = await self._loop.run_in_executor(executor, next, items, _END)
+
+                    # Check for stopping or end of the stream
+                    if self._stop or item is _END:
+                        break
+
+                    # Paused stream without new items
+                    if item is None:
+                        continue
+                    attempt = 0
+
+                    await semaphore.acquire()
+                    task = self._loop.create_task(self._handle(process, item, semaphore))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+
+                self.log.debug('Listen {} stopped'.format(kind))
+                break
+            except Exception as e:
+                self.log.error('Exception while listening to {}:'.format(kind))
+                self.log.error(str(e))
+
+                delay = self._retry.delay(attempt, e)
+                if delay is None:
+                    self.log.error('Giving up on {} after {} attempts ({} error).'
+                                   .format(kind, attempt + 1, self._retry.classify(e)))
+                    break
+
+                self.log.error('Waiting for {:.1f} seconds and trying again.'.format(delay))
+                attempt += 1
+                await asyncio.sleep(delay)
+
+        # Wait for all handlers in flight
+        if tasks:
+            await asyncio.wait(list(tasks))
+        executor.shutdown(wait=False)
+
+
+class AbstractAsyncCommentBot(AbstractAsyncBot):
+    @abstractmethod
+    async def _process_comment(self, comment: praw.models.Comment):
+        """Process a single comment"""
+        pass
+
+    def _listeners(self):
+        return [self._listen(
+            lambda: self._reddit.subreddit('+'.join(self._subs)).stream.comments(pause_after=0),
+            self._process_comment, 'comments')]
+
+
+class AbstractAsyncSubmissionBot(AbstractAsyncBot):
+    @abstractmethod
+    async def _process_submission(self, submission: praw.models.Submission):
+        """Process a single submission"""
+        pass
+
+    def _listeners(self):
+        return [self._listen(
+            lambda: self._reddit.subreddit('+'.join(self._subs)).stream.submissions(pause_after=0),
+            self._process_submission, 'submissions')]
+
+
+class AbstractAsyncMessageBot(AbstractAsyncBot):
+    def __init__(self, reddit: praw.Reddit,
+                 name: str = "AbstractAsyncInboxBot",
+                 max_concurrency: int = 100,
+                 retry: RetryPolicy = None):
+        """
+        Default constructor
+
+        :param reddit: Reddit instance
+        :param max_concurrency: Maximum number of handlers in flight
+        :param retry: Backoff policy for restarting a failed stream
+        """
+        super().__init__(reddit=reddit, name=name, max_concurrency=max_concurrency, retry=retry)
+
+    @abstractmethod
+    async def _process_inbox_message(self, message: praw.models.Message):
+        """Process a single message"""
+        pass
+
+    def _listeners(self):
+        return [self._listen(lambda: self._reddit.inbox.stream(pause_after=0),
+                             self._process_inbox_message, 'inbox')]
+
+
+class AsyncCommentBot(AbstractAsyncCommentBot):
+    """
+    Asynchronous variant of :class:`~bottr.bot.CommentBot`. Calls :code:`func_comment` as
+    :code:`func_comment(comment, *func_comment_args)` for each :code:`comment` that is submitted in
+    the given :code:`subreddits`.
+
+    :code:`func_comment` may be a coroutine function. Up to :code:`max_concurrency` calls are
+    awaited concurrently on one event loop. Plain functions are run in the default executor of
+    the event loop.
+
+    :param reddit: :class:`praw.Reddit` instance. Check :ref:`setup` on how to create it.
+    :param name: Bot name
+    :param func_comment: Comment function, see :class:`~bottr.bot.CommentBot`.
+    :param func_comment_args: Comment function arguments.
+    :param subreddits: List of subreddit names. Example: :code:`['AskReddit', 'Videos', ...]`
+    :param max_concurrency: Maximum number of :code:`func_comment` calls in flight.
+    :param retry: Backoff policy for restarting failed streams, see :class:`~bottr.bot.CommentBot`.
+
+    **Example usage**::
+
+        async def parse(comment):
+            if 'banana' in comment.body:
+                await lookup_bananas(comment.id)
+
+        reddit = praw.Reddit(...) # Create a PRAW Reddit instance
+        bot = AsyncCommentBot(reddit=reddit, func_comment=parse, max_concurrency=200)
+        bot.start()
+
+    """
+
+    def __init__(self, reddit: praw.Reddit,
+                 name: str = "AsyncCommentBot",
+                 func_comment: Callable[[praw.models.Comment], Any] = None,
+                 func_comment_args: List = None,
+                 subreddits: Iterable = None,
+                 max_concurrency: int = 100,
+                 retry: RetryPolicy = None):
+        super().__init__(reddit, subreddits, name, max_concurrency, retry)
+
+        if func_comment is not None:
+            if func_comment_args is None:
+                func_comment_args = []
+
+            self._func_comment = func_comment
+            self._func_comment_args = func_comment_args
+
+    async def _process_comment(self, comment: praw.models.Comment):
+        """
+        Process a reddit comment. Calls `func_comment(*func_comment_args)`.
+
+        :param comment: Comment to process
+        """
+        await self._call(self._func_comment, comment, *self._func_comment_args)
+
+
+class AsyncMessageBot(AbstractAsyncMessageBot):
+    """
+    Asynchronous variant of :class:`~bottr.bot.MessageBot`. Calls :code:`func_message` as
+    :code:`func_message(message, *func_message_args)` for each :code:`message` that is new in the
+    inbox.
+
+    :param reddit: :class:`praw.Reddit` instance. Check :ref:`setup` on how to create it.
+    :param name: Bot name
+    :param func_message: Message function, may be a coroutine function. See
+        :class:`~bottr.bot.MessageBot`.
+    :param func_message_args: Message function arguments.
+    :param max_concurrency: Maximum number of :code:`func_message` calls in flight.
+    :param retry: Backoff policy for restarting a failed stream, see :class:`~bottr.bot.CommentBot`.
+    """
+
+    def __init__(self, reddit: praw.Reddit,
+                 name: str = "AsyncInboxBot",
+                 func_message: Callable[[praw.models.Message], Any] = None,
+                 func_message_args: List = None,
+                 max_concurrency: int = 100,
+                 retry: RetryPolicy = None):
+        super().__init__(reddit=reddit, name=name, max_concurrency=max_concurrency, retry=retry)
+
+        if func_message is not None:
+            if func_message_args is None:
+                func_message_args = []
+
+            self._func_message = func_message
+            self._func_message_args = func_message_args
+
+    async def _process_inbox_message(self, message: praw.models.Message):
+        """
+        Process a reddit inbox message. Calls `func_message(message, *func_message_args)`.
+
+        :param message: Item to process
+        """
+        await self._call(self._func_message, message, *self._func_message_args)
+
+
+class AsyncSubmissionBot(AbstractAsyncSubmissionBot):
+    """
+    Asynchronous variant of :class:`~bottr.bot.SubmissionBot`. Calls :code:`func_submission` as
+    :code:`func_submission(submission, *func_submission_args)` for each new submission in the
+    given :code:`subreddits`.
+
+    :param reddit: :class:`praw.Reddit` instance. Check :ref:`setup` on how to create it.
+    :param name: Bot name
+    :param func_submission: Submission function, may be a coroutine function. See
+        :class:`~bottr.bot.SubmissionBot`.
+    :param func_submission_args: Submission function arguments.
+    :param subreddits: List of subreddit names. Example: :code:`['AskReddit', 'Videos', ...]`
+    :param max_concurrency: Maximum number of :code:`func_submission` calls in flight.
+    :param retry: Backoff policy for restarting failed streams, see :class:`~bottr.bot.CommentBot`.
+    """
+
+    def __init__(self, reddit: praw.Reddit,
+                 name: str = "AsyncSubmissionBot",
+                 func_submission: Callable[[praw.models.Submission], Any] = None,
+                 func_submission_args: List = None,
+                 subreddits: Iterable = None,
+                 max_concurrency: int = 100,
+                 retry: RetryPolicy = None):
+        super().__init__(reddit, subreddits, name, max_concurrency, retry)
+
+        if func_submission is not None:
+            if func_submission_args is None:
+                func_submission_args = []
+
+            self._func_submission = func_submission
+            self._func_submission_args = func_submission_args
+
+    async def _process_submission(self, submission: praw.models.Submission):
+        """
+        Process a reddit submission. Calls `func_submission(*func_submission_args)`.
+
+        :param submission: Submission to process
+        """
+        await self._call(self._func_submission, submission, *self._func_submission_args)
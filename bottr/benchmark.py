@@ -0,0 +1,150 @@
+"""
+Throughput benchmark for the predefined bots, running against :class:`~bottr.fake.FakeReddit`.
+
+Run it from the command line, e.g.::
+
+    $ python -m bottr.benchmark --kind comment --items 2000 --jobs 1 4 16 --cost 0 0.001 0.01
+"""
+import argparse
+import threading
+import time
+from typing import List
+
+from bottr.bot import CommentBot, SubmissionBot, MessageBot
+from bottr.fake import FakeReddit, generate
+
+
+def percentile(values: List[float], p: float) -> float:
+    """
+    Nearest-rank percentile of :code:`values`.
+
+    :param values: Sorted list of values
+    :param p: Percentile between 0 and 100
+    """
+    if not values:
+        return 0.0
+    rank = int(round(p / 100.0 * (len(values) - 1)))
+    return values[rank]
+
+
+class BenchmarkResult(object):
+    """Measurements of a single benchmark run. All times are in seconds."""
+
+    def __init__(self, kind: str, n_items: int, n_jobs: int, handler_cost: float,
+                 duration: float, latencies: List[float], handoffs: List[float]):
+        self.kind = kind
+        self.n_items = n_items
+        self.n_jobs = n_jobs
+        self.handler_cost = handler_cost
+        self.duration = duration
+        self.latencies = sorted(latencies)
+        self.handoffs = sorted(handoffs)
+
+    @property
+    def throughput(self) -> float:
+        """Processed items per second"""
+        return len(self.latencies) / self.duration if self.duration > 0 else 0.0
+
+    def latency(self, p: float) -> float:
+        """End-to-end latency percentile, from the stream yielding an item to its handler returning"""
+        return percentile(self.latencies, p)
+
+    def handoff(self, p: float) -> float:
+        """Queue-handoff percentile, from the stream yielding an item to its handler starting"""
+        return percentile(self.handoffs, p)
+
+    def __str__(self):
+        return ('{:<10} {:>6} {:>5} {:>9.4f} {:>10.1f} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.3f} {:>9.3f}'
+                .format(self.kind, self.n_items, self.n_jobs, self.handler_cost, self.throughput,
+                        self.latency(50) * 1000, self.latency(90) * 1000, self.latency(99) * 1000,
+                        self.handoff(50) * 1000, self.handoff(99) * 1000))
+
+
+"""Header matching :func:`BenchmarkResult.__str__`"""
+HEADER = '{:<10} {:>6} {:>5} {:>9} {:>10} {:>9} {:>9} {:>9} {:>9} {:>9}'.format(
+    'kind', 'items', 'jobs', 'cost[s]', 'items/s', 'p50[ms]', 'p90[ms]', 'p99[ms]',
+    'hand50[ms]', 'hand99[ms]')
+
+
+def _work(cost: float, cpu: bool):
+    """Simulate a handler taking :code:`cost` seconds, either sleeping or spinning."""
+    if cost <= 0:
+        return
+    if not cpu:
+        time.sleep(cost)
+        return
+    end = time.perf_counter() + cost
+    while time.perf_counter() < end:
+        pass
+
+
+def run_benchmark(kind: str = 'comment', n_items: int = 1000, n_jobs: int = 4,
+                  handler_cost: float = 0.0, cpu: bool = False, rate: float = None,
+                  timeout: float = 300) -> BenchmarkResult:
+    """
+    Run a bot against a :class:`~bottr.fake.FakeReddit` and measure how fast it dispatches items.
+
+    :param kind: :code:`'comment'`, :code:`'submission'` or :code:`'message'`
+    :param n_items: Number of synthetic items
+    :param n_jobs: Number of worker threads of the bot
+    :param handler_cost: Seconds each handler call takes
+    :param cpu: Spin instead of sleeping for :code:`handler_cost`, simulating CPU-bound handlers
+    :param rate: Items per second yielded by the stream. :code:`None` yields as fast as possible.
+    :param timeout: Maximum seconds to wait for all items to be processed
+    :return: Measurements of the run
+    """
+    reddit = FakeReddit(rate=rate, **{kind + 's': generate(kind, n_items)})
+    lock = threading.Lock()
+    done = threading.Event()
+    handoffs = []  # type: List[float]
+    latencies = []  # type: List[float]
+
+    def handler(item):
+        start = time.perf_counter()
+        _work(handler_cost, cpu)
+        end = time.perf_counter()
+        emitted = reddit.emitted[item.fullname]
+        with lock:
+            handoffs.append(start - emitted)
+            latencies.append(end - emitted)
+            if len(latencies) == n_items:
+                done.set()
+
+    if kind == 'comment':
+        bot = CommentBot(reddit=reddit, func_comment=handler, subreddits=['test'], n_jobs=n_jobs)
+    elif kind == 'submission':
+        bot = SubmissionBot(reddit=reddit, func_submission=handler, subreddits=['test'], n_jobs=n_jobs)
+    else:
+        bot = MessageBot(reddit=reddit, func_message=handler, n_jobs=n_jobs)
+
+    start = time.perf_counter()
+    bot.start()
+    done.wait(timeout)
+    duration = time.perf_counter() - start
+
+    reddit.close()
+    bot.stop()
+
+    return BenchmarkResult(kind, n_items, n_jobs, handler_cost, duration, latencies, handoffs)
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description='Benchmark the bottr bots against a fake reddit.')
+    parser.add_argument('--kind', default='comment', choices=['comment', 'submission', 'message'])
+    parser.add_argument('--items', type=int, default=1000, help='Number of items per run')
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1, 4, 16], help='n_jobs values')
+    parser.add_argument('--cost', type=float, nargs='+', default=[0.0, 0.001, 0.01],
+                        help='Handler cost in seconds')
+    parser.add_argument('--cpu', action='store_true', help='Spin instead of sleeping in handlers')
+    parser.add_argument('--rate', type=float, default=None, help='Stream rate in items per second')
+    args = parser.parse_args(argv)
+
+    print(HEADER)
+    for cost in args.cost:
+        for n_jobs in args.jobs:
+            print(run_benchmark(kind=args.kind, n_items=args.items, n_jobs=n_jobs,
+                                handler_cost=cost, cpu=args.cpu, rate=args.rate))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,35 @@
+import functools
 import logging
 import threading
 import time
 from abc import ABC, abstractmethod
-from queue import Queue
-from typing import Iterable, List, Callable
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
+from queue import Queue, Empty
+from typing import Iterable, List, Callable, Dict
 
 import praw
 
+from bottr.actions import apply_actions, iter_actions, Outbox
+from bottr.hydrate import Hydrator
+from bottr.memo import Memo
+from bottr.metrics import BotMetrics, Registry, StreamMetrics, default_registry
+from bottr.pool import AutoscalePolicy, WorkerPool
+from bottr.process import snapshot
+from bottr.queues import BLOCK, FairPolicy, FairQueue, OverflowPolicy, OverflowQueue, SQLiteQueue, \
+    WeightedQueue, abandon, subreddit_of
+from bottr.records import ItemRecord, Projection
+from bottr.replay import STREAM_KINDS, Recorder
+from bottr.retry import RetryPolicy
+from bottr.rules import Rule, RuleSet
+from bottr.seen import SeenSet
+
+"""Maximum seconds between two polls of a stream without new items, as in PRAW's own backoff"""
+MAX_IDLE_WAIT = 16.0
+
+"""Seconds a worker waits before taking a job again after its queue raised an error"""
+QUEUE_ERROR_WAIT = 1.0
+
 
 class AbstractBot(ABC):
     """
@@ -16,13 +39,56 @@ class AbstractBot(ABC):
     def __init__(self, reddit: praw.Reddit,
                  subreddits: Iterable = None,
                  name: str = "AbstractBot",
-                 n_jobs=4):
+                 n_jobs=4,
+                 n_processes: int = None,
+                 shard_size: int = None,
+                 seen: SeenSet = None,
+                 retry: RetryPolicy = None,
+                 outbox: Outbox = None,
+                 metrics: Registry = None,
+                 overflow: OverflowPolicy = None,
+                 queue_path: str = None,
+                 autoscale: AutoscalePolicy = None,
+                 hydrator: Hydrator = None,
+                 recorder: Recorder = None,
+                 projection: Projection = None,
+                 fair: FairPolicy = None,
+                 memo: Memo = None):
         """
         Default constructor
 
         :param reddit: Reddit instance
         :param subreddits: List of subreddits
         :param n_jobs: Number of jobs for parallelization
+        :param n_processes: Number of processes to run handlers in. :code:`None` runs handlers in
+            the worker threads.
+        :param shard_size: Maximum number of subreddits per stream. :code:`None` listens to all
+            subreddits with a single stream.
+        :param seen: Set of the fullnames already processed. Defaults to an in-memory
+            :class:`~bottr.seen.SeenSet`.
+        :param retry: Backoff policy for restarting failed streams. Defaults to
+            :class:`~bottr.retry.RetryPolicy` with its default arguments.
+        :param outbox: Queue executing the actions returned by handlers. :code:`None` executes
+            them in the worker threads.
+        :param metrics: Registry to record the metrics of the bot in. Defaults to
+            :data:`~bottr.metrics.default_registry`.
+        :param overflow: What to do when the queue of a listener is full. :code:`None` blocks the
+            stream until there is room.
+        :param queue_path: Path of a SQLite database keeping the queued and in-flight items, see
+            :class:`~bottr.queues.SQLiteQueue`. :code:`None` keeps them in memory.
+        :param autoscale: Bounds of a worker pool that grows and shrinks with the load of each
+            queue, see :class:`~bottr.pool.AutoscalePolicy`. Its :code:`max_jobs` replaces
+            :code:`n_jobs`. :code:`None` runs :code:`n_jobs` workers per queue.
+        :param hydrator: Fetches the related things the handlers need in bulk before queueing
+            items, see :class:`~bottr.hydrate.Hydrator`. :code:`None` leaves them lazy.
+        :param recorder: Records all items the streams yield, to replay them later, see
+            :class:`~bottr.replay.Recorder`
+        :param projection: Queue compact records of the items instead of the PRAW objects, see
+            :class:`~bottr.records.Projection`. :code:`None` queues the PRAW objects.
+        :param fair: Serve the queued items of each subreddit and priority in turns, see
+            :class:`~bottr.queues.FairPolicy`. :code:`None` serves them in order.
+        :param memo: Cache of handler results by item content, see :class:`~bottr.memo.Memo`.
+            :code:`None` calls the handler for every item.
         """
 
         if subreddits is None:
@@ -31,11 +97,64 @@ class AbstractBot(ABC):
         if n_jobs < 1:
             raise Exception('You need at least one worker thread.')
 
+        if n_processes is not None and n_processes < 1:
+            raise Exception('You need at least one process.')
+
+        if shard_size is not None and shard_size < 1:
+            raise Exception('A shard needs at least one subreddit.')
+
+        if autoscale is not None:
+            n_jobs = autoscale.max_jobs
+
+        if overflow is not None and queue_path is not None:
+            raise Exception('A persistent queue does not overflow, pass either overflow or '
+                            'queue_path.')
+
+        if hydrator is not None and projection is not None:
+            raise Exception('Records cannot be hydrated, pass either hydrator or projection.')
+
+        if fair is not None and (overflow is not None or queue_path is not None):
+            raise Exception('A fair queue cannot overflow or be persisted, pass either fair or '
+                            'overflow and queue_path.')
+
         self._subs = subreddits
         self._name = name
         self._reddit = reddit
         self._n_jobs = n_jobs
+        self._n_processes = n_processes
+        self._shard_size = shard_size
+        self._seen = seen if seen is not None else SeenSet()
+
+        # Fullnames queued or being processed, which are not in the seen set yet
+        self._in_flight = set()  # type: set
+        self._in_flight_lock = threading.Lock()
+        self._pool = None  # type: ProcessPoolExecutor
+        self._batch_size = None  # type: int
+        self._batch_wait = 1.0
+        self._retry = retry if retry is not None else RetryPolicy()
+        self._outbox = outbox
+        self._rules = None  # type: RuleSet
+        self._metrics = BotMetrics(metrics if metrics is not None else default_registry, name,
+                                   job_key=_job_key)
+        self._overflow = overflow
+        self._queue_path = queue_path
+        self._autoscale = autoscale
+        self._hydrator = hydrator
+        self._recorder = recorder
+        self._projection = projection
+        self._fair = fair
+        self._memo = memo
         self._stop = False
+        self._stop_event = threading.Event()
+
+        # Shards of the subreddits and blacklisted subreddits, both replaced as a whole while
+        # running. Listeners wait on the condition for new shards.
+        self._shard_subs = self._shards()
+        self._blacklist = frozenset()  # type: frozenset
+        self._subs_changed = threading.Condition()
+
+        # Set to stop the workers without processing the queued items
+        self._abandon = threading.Event()
         self._threads = []  # type: List[BotThread]
         self.log = logging.getLogger(__name__)
         super().__init__()
@@ -45,74 +164,651 @@ class AbstractBot(ABC):
         """
         Start this bot.
         """
-        pass
+        if self._n_processes is not None and self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self._n_processes)
 
-    def stop(self):
+        if self._outbox is not None:
+            self._outbox.start()
+
+    def stop(self, timeout: float = None, drain: bool = True) -> bool:
         """
         Stops this bot.
 
-        Returns as soon as all running threads have finished processing.
+        Streams stop right away, also while no new items arrive. With :code:`drain`, the workers
+        process all queued items first. Without it, or once :code:`timeout` seconds have passed,
+        queued items are abandoned: the workers only finish the handlers that are running. Items
+        spilled to disk or queued in a SQLite database are kept for the next run, other abandoned
+        items are lost.
+
+        :param timeout: Maximum number of seconds to wait. :code:`None` waits until all threads
+            have finished.
+        :param drain: Process the queued items before stopping
+        :return: :code:`False` if threads were still running a handler after :code:`timeout`
+            seconds, in which case they finish it in the background, or if pending writes of the
+            outbox were abandoned
         """
         self.log.debug('Stopping bot {}'.format(self._name))
         self._stop = True
+        self._stop_event.set()
+        with self._subs_changed:
+            self._subs_changed.notify_all()
+        if not drain:
+            self._abandon.set()
+
+        deadline = time.monotonic() + timeout if timeout is not None else None
         for t in self._threads:
-            t.join()
+            t.join(max(0.0, deadline - time.monotonic()) if deadline is not None else None)
 
-        self.log.debug('Stopping bot {} finished. All threads joined.'.format(self._name))
+        stopped = not any(t.is_alive() for t in self._threads)
+        if not stopped:
+            self.log.warning('Bot {} did not stop within {} seconds, abandoning queued items'
+                             .format(self._name, timeout))
+            self._abandon.set()
 
-    def _do_stop(self, q: Queue, threads: List[threading.Thread]):
-        # For each thread: put None into the queue to stop the thread from polling
-        for i in range(self._n_jobs):
-            q.put(None)
+        if self._pool is not None:
+            self._pool.shutdown(wait=stopped)
+            self._pool = None
 
-        # Join threads
-        for t in threads:
-            t.join()
+        # Execute the actions of all processed items before returning, within the deadline
+        if self._outbox is not None:
+            remaining = max(0.0, deadline - time.monotonic()) if deadline is not None else None
+            if not self._outbox.stop(drain=stopped, timeout=remaining):
+                stopped = False
 
+        self._seen.flush()
 
-class AbstractCommentBot(AbstractBot):
-    @abstractmethod
-    def _process_comment(self, comment: praw.models.Comment):
-        """Process a single comment"""
-        pass
+        if stopped:
+            self.log.debug('Stopping bot {} finished. All threads joined.'.format(self._name))
+        return stopped
 
-    def _listen_comments(self):
-        """Start listening to comments, using a separate thread."""
-        # Collect comments in a queue
-        comments_queue = Queue(maxsize=self._n_jobs * 4)
+    def set_subreddits(self, subreddits: Iterable[str]):
+        """
+        Replace the subreddits of a running bot, e.g. with the subreddits assigned by a
+        :class:`~bottr.coordinator.Coordinator`. Only the streams of shards whose subreddits
+        changed are restarted, the others and the workers keep running. Subreddits that are still
+        listened to stay in their shard, and new ones fill up shards with room first. Without
+        :code:`shard_size`, the single stream is restarted. Items already processed are not
+        processed again.
+
+        :param subreddits: New list of subreddits
+        """
+        subreddits = list(subreddits)
+        with self._subs_changed:
+            shards = self._reshard(self._shard_subs, subreddits)
+            changed = len(set(map(tuple, shards)) - set(map(tuple, self._shard_subs)))
+            self._subs = subreddits
+            self._shard_subs = shards
+            self._subs_changed.notify_all()
+        self.log.info('{} listens to {} subreddits, restarting {} shards'
+                      .format(self._name, len(subreddits), changed))
+
+    def set_blacklist(self, blacklist: Iterable[str]):
+        """
+        Skip the items of the given subreddits from now on, e.g. to exclude subreddits from
+        :code:`r/all`. Items are checked on the stream threads with a set lookup, before they are
+        queued. Streams are not restarted.
 
-        threads = []  # type: List[BotQueueWorker]
+        :param blacklist: Names of the blacklisted subreddits
+        """
+        self._blacklist = frozenset(s.lower() for s in blacklist)
+
+    def _dispatch(self, kind: str, func: Callable, thing, *args):
+        """
+        Call :code:`func(thing, *args)` and execute the :class:`~bottr.actions.Action` objects it
+        returns on :code:`thing`.
 
+        If the bot has a process pool, :code:`func` is called in another process with a
+        :class:`~bottr.process.Snapshot` of :code:`thing`, or with :code:`thing` itself if it is an
+        :class:`~bottr.records.ItemRecord`, while the actions are still executed in this process.
+
+        With a :class:`~bottr.memo.Memo`, :code:`func` is only called for the first item with the
+        same content, and the actions it returned are executed on each of them.
+
+        :param kind: :code:`'comment'`, :code:`'submission'` or :code:`'message'`
+        :param func: Handler function
+        :param thing: PRAW object to process
+        :param args: Additional handler arguments
+        """
         try:
+            if self._memo is None:
+                result = self._call(kind, func, thing, *args)
+            else:
+                # Cache the list of actions, since a generator can only be executed once
+                def compute(item, *item_args):
+                    return iter_actions(self._call(kind, func, item, *item_args))
+
+                result = self._memo.call(compute, thing, kind, *args, handler=func)
+
+            self._apply(result, thing)
+        finally:
+            self._processed(thing)
+
+    def _call(self, kind: str, func: Callable, thing, *args):
+        """Result of :code:`func(thing, *args)`, called in the process pool if there is one."""
+        if self._pool is None:
+            return func(thing, *args)
+        return self._pool.submit(func, self._picklable(thing, kind), *args).result()
+
+    def _claim(self, thing) -> bool:
+        """
+        Claim :code:`thing` for processing.
 
-            # Create n_jobs CommentsThreads
-            for i in range(self._n_jobs):
-                t = BotQueueWorker(name='CommentThread-t-{}'.format(i),
-                                   jobs=comments_queue,
-                                   target=self._process_comment)
-                t.start()
-                threads.append(t)
+        :return: False if it was processed already, or is queued or being processed
+        """
+        with self._in_flight_lock:
+            if thing.fullname in self._in_flight or thing.fullname in self._seen:
+                return False
+            self._in_flight.add(thing.fullname)
+            return True
+
+    def _release(self, thing):
+        """Release the claim on :code:`thing` without marking it as processed, e.g. if it was dropped."""
+        with self._in_flight_lock:
+            self._in_flight.discard(thing.fullname)
+
+    def _processed(self, thing):
+        """Mark :code:`thing` as processed, even if its handler failed, so it is not retried."""
+        with self._in_flight_lock:
+            self._seen.add(thing.fullname)
+            self._in_flight.discard(thing.fullname)
+
+    @staticmethod
+    def _picklable(thing, kind: str):
+        """Copy of :code:`thing` to send to the process pool. Records are picklable already."""
+        return thing if isinstance(thing, ItemRecord) else snapshot(thing, kind)
+
+    def _apply(self, result, thing):
+        """Execute the actions a handler returned, or enqueue them in the outbox."""
+        actions = iter_actions(result)
+
+        # Records cannot write, act on the PRAW object instead
+        if actions and isinstance(thing, ItemRecord):
+            thing = thing.rehydrate()
+
+        if self._outbox is None:
+            apply_actions(actions, thing)
+        else:
+            self._outbox.put_all(thing, actions)
+
+    def _dispatch_batch(self, kind: str, func: Callable, things: List, *args):
+        """
+        Call :code:`func(things, *args)` with a batch of items and execute the actions it returns.
 
-            # Iterate over all comments in the comment stream
-            for comment in self._reddit.subreddit('+'.join(self._subs)).stream.comments():
+        :code:`func` may return a list with one result per item, each being :code:`None`, an
+        :class:`~bottr.actions.Action` or a list of actions. See :func:`~AbstractBot._dispatch`.
+        With a memo, :code:`func` is only called with the items whose content is not cached.
 
-                # Check for stopping
-                if self._stop:
-                    self._do_stop(comments_queue, threads)
-                    break
+        :param kind: :code:`'comment'`, :code:`'submission'` or :code:`'message'`
+        :param func: Batch handler function
+        :param things: PRAW objects to process
+        :param args: Additional handler arguments
+        """
+        try:
+            if self._memo is None:
+                results = self._call_batch(kind, func, things, *args)
+            else:
+                def compute(items, *items_args):
+                    computed = self._call_batch(kind, func, items, *items_args)
+                    if computed is None:
+                        return [[] for _ in items]
+                    return [iter_actions(result) for result in computed]
+
+                results = self._memo.call_batch(compute, things, kind, *args, handler=func)
+
+            if results is None:
+                return
+
+            for result, thing in zip(results, things):
+                self._apply(result, thing)
+        finally:
+            for thing in things:
+                self._processed(thing)
+
+    def _call_batch(self, kind: str, func: Callable, things: List, *args):
+        """Results of :code:`func(things, *args)`, called in the process pool if there is one."""
+        if self._pool is None:
+            return func(things, *args)
+        snapshots = [self._picklable(thing, kind) for thing in things]
+        return self._pool.submit(func, snapshots, *args).result()
+
+    def _set_rules(self, rules: Iterable[Rule], kind: str, *handlers):
+        """
+        Route items by :code:`rules` instead of the handler functions.
+
+        :param rules: List of :class:`~bottr.rules.Rule` objects or a :class:`~bottr.rules.RuleSet`
+        :param kind: :code:`'comment'`, :code:`'submission'` or :code:`'message'`
+        :param handlers: Handler functions passed to the bot, which must be :code:`None`
+        """
+        if rules is None:
+            return
+
+        if any(handler is not None for handler in handlers):
+            raise Exception('Pass either rules or a {} function, not both.'.format(kind))
+
+        self._rules = rules if isinstance(rules, RuleSet) else RuleSet(rules, kind)
+
+    def _process_match(self, job: tuple):
+        """
+        Process an item routed by the rules. Calls :code:`rule.handler(item, *rule.args)`.
+
+        :param job: Tuple of the matched :class:`~bottr.rules.Rule` and the item
+        """
+        rule, item = job
+        self._dispatch(self._rules.kind, rule.handler, item, *rule.args)
+
+    def _create_worker(self, name: str, jobs: Queue, target: Callable,
+                       batch_target: Callable = None,
+                       metrics: StreamMetrics = None,
+                       retire: Callable = None,
+                       idle_timeout: float = None) -> 'BotQueueWorker':
+        """Create a worker, batching the items of :code:`jobs` if a batch size was configured."""
+        if self._batch_size is not None and batch_target is not None:
+            return BatchQueueWorker(name=name, jobs=jobs, target=batch_target,
+                                    batch_size=self._batch_size, batch_wait=self._batch_wait,
+                                    metrics=metrics, retire=retire, idle_timeout=idle_timeout)
+
+        return BotQueueWorker(name=name, jobs=jobs, target=target, metrics=metrics,
+                              retire=retire, idle_timeout=idle_timeout)
+
+    def _job_codec(self, kind: str, wrap: Callable = None) -> tuple:
+        """
+        Functions storing jobs by fullname and fetching them again in batches, for queues that
+        keep jobs on disk.
+
+        :param kind: Name of the stream
+        :param wrap: Function turning items into jobs, see :func:`~AbstractBot._feed`
+        :return: Tuple of the :code:`dump(job)` and :code:`load(fullnames)` functions
+        """
+        def dump(job) -> str:
+            # Wrapped jobs are (rule, item) tuples
+            return (job if wrap is None else job[1]).fullname
+
+        def load(fullnames: List[str]) -> List:
+            things = {thing.fullname: thing for thing in self._reddit.info(fullnames)}
+            if self._hydrator is not None:
+                self._hydrate(list(things.values()))
+            jobs = []
+            for fullname in fullnames:
+                thing = self._project(things.get(fullname), kind)
+                jobs.append(thing if wrap is None or thing is None else wrap(thing))
+            return jobs
+
+        return dump, load
+
+    def _create_queue(self, kind: str, wrap: Callable = None) -> Queue:
+        """
+        Create the queue of a listener, persisted to :code:`queue_path`, scheduling fairly or
+        applying the overflow policy.
+
+        :param kind: Name of the stream used for metrics
+        :param wrap: Function turning items into jobs, see :func:`~AbstractBot._feed`
+        """
+        if self._queue_path is not None:
+            dump, load = self._job_codec(kind, wrap)
+            jobs = SQLiteQueue(self._queue_path, dump=dump, load=load)
+
+            # Jobs resumed from a previous run are in flight, streams must not queue them again
+            with self._in_flight_lock:
+                self._in_flight.update(jobs.payloads())
+            return jobs
+
+        # Wrapped jobs are (rule, item) tuples
+        def unwrap(job):
+            return job if wrap is None else job[1]
+
+        metrics = self._metrics.stream(kind)
+
+        def on_drop(job):
+            # Dropped items may be queued again if a stream yields them again
+            metrics.job_dropped(job)
+            self._release(unwrap(job))
+
+        fair = self._fair
+        if fair is not None:
+            def lane_priority(job):
+                return fair.priority(unwrap(job))
+
+            return FairQueue(key=lambda job: subreddit_of(unwrap(job)),
+                             weights=fair.weights,
+                             priority=lane_priority if fair.priority is not None else None,
+                             lane_size=fair.lane_size if fair.lane_size is not None else 0,
+                             maxsize=fair.maxsize,
+                             default_weight=fair.default_weight,
+                             on_drop=on_drop)
+
+        overflow = self._overflow
+        if overflow is None:
+            return Queue(maxsize=self._n_jobs * 4)
+
+        maxsize = overflow.maxsize if overflow.maxsize is not None else self._n_jobs * 4
+        if overflow.policy == BLOCK:
+            return Queue(maxsize=maxsize)
+
+        def priority(job):
+            return overflow.priority(unwrap(job))
+
+        dump, load = self._job_codec(kind, wrap)
+        return OverflowQueue(maxsize, overflow.policy,
+                             priority=priority if overflow.priority is not None else None,
+                             spill_path=overflow.spill_path,
+                             dump=dump,
+                             load=load,
+                             on_drop=on_drop,
+                             on_spill=metrics.job_spilled)
+
+    def _shards(self) -> List[List[str]]:
+        """
+        Split the subreddits into shards of at most :code:`shard_size` subreddits, each listened to
+        by its own stream.
+        """
+        if self._shard_size is None or len(self._subs) <= self._shard_size:
+            return [list(self._subs)]
+
+        # Drop duplicates, since reddit treats subreddit names case-insensitively
+        subs = list(OrderedDict((s.lower(), s) for s in self._subs).values())
+        return [subs[i:i + self._shard_size] for i in range(0, len(subs), self._shard_size)]
+
+    def _reshard(self, shards: List[List[str]], subreddits: List[str]) -> List[List[str]]:
+        """
+        Shards of :code:`subreddits` that differ as little as possible from :code:`shards`.
+
+        :param shards: Current shards
+        :param subreddits: New list of subreddits
+        """
+        if self._shard_size is None:
+            return [list(subreddits)]
+
+        # Drop duplicates, since reddit treats subreddit names case-insensitively
+        wanted = OrderedDict((s.lower(), s) for s in subreddits)
+        kept = [[s for s in shard if s.lower() in wanted] for shard in shards]
+        assigned = set(s.lower() for shard in kept for s in shard)
+        added = [s for name, s in wanted.items() if name not in assigned]
+
+        # Add subreddits to shards that are restarted anyway first
+        changed = [new != old for new, old in zip(kept, shards)]
+        for i in sorted(range(len(kept)), key=lambda i: not changed[i]):
+            room = self._shard_size - len(kept[i])
+            kept[i].extend(added[:room])
+            added = added[max(room, 0):]
+
+        kept = [shard for shard in kept if shard]
+        return kept + [added[i:i + self._shard_size] for i in range(0, len(added), self._shard_size)]
+
+    def _recorded(self, stream: Callable[[], Iterable], kind: str) -> Callable[[], Iterable]:
+        """:code:`stream`, recording its items if the bot has a recorder"""
+        return stream if self._recorder is None else self._recorder.wrap(stream, kind)
+
+    def _subreddit_stream(self, subs: List[str], kind: str) -> Iterable:
+        """Stream of new comments or submissions in :code:`subs`"""
+        stream = self._reddit.subreddit('+'.join(subs)).stream
+        if kind == 'comments':
+            return stream.comments(pause_after=0)
+        return stream.submissions(pause_after=0)
+
+    def _listen(self, streams: List[Callable[[], Iterable]], kind: str, worker_name: str,
+                target: Callable, batch_target: Callable = None):
+        """
+        Put all items of the :code:`streams` into a queue, processed by :code:`n_jobs` workers.
+
+        :param streams: Functions returning a PRAW stream. :code:`None` listens to the
+            subreddits, see :func:`~AbstractBot._feed_shards`.
+        :param kind: Name of the stream used for logging
+        :param worker_name: Name prefix of the worker threads
+        :param target: Function processing a single item
+        :param batch_target: Function processing a list of items, used in batch mode
+        """
+        # With rules, items are matched on the stream thread and only matches are queued
+        wrap = None
+        if self._rules is not None:
+            wrap, target, batch_target = self._rules.route, self._process_match, None
+
+        if streams is not None:
+            streams = [self._recorded(stream, kind) for stream in streams]
+
+        # Collect items in a queue
+        jobs = self._create_queue(kind, wrap)
+        metrics = self._metrics.stream(kind)
+        metrics.queue_depth.set_function(jobs.qsize)
+
+        def create(name, retire, idle_timeout):
+            return self._create_worker(name=name, jobs=jobs, target=target,
+                                       batch_target=batch_target, metrics=metrics,
+                                       retire=retire, idle_timeout=idle_timeout)
+
+        pool = WorkerPool(worker_name, jobs, create, self._autoscale, metrics)
+        done = threading.Event()
+        scaler = None  # type: BotThread
+        stage = None  # type: BatchQueueWorker
+        feed = jobs
+
+        try:
+            # Create n_jobs workers, or the minimum of the autoscaling policy
+            if self._autoscale is None:
+                pool.start(self._n_jobs)
+            else:
+                pool.start()
+                scaler = BotThread('{}-scaler'.format(worker_name), pool.run, done)
+                scaler.start()
+
+            # Hydrate batches of items on their way from the streams to the workers
+            if self._hydrator is not None:
+                feed = Queue(maxsize=self._hydrator.batch_size * 2)
+                stage = BatchQueueWorker(name='{}-hydrator'.format(worker_name), jobs=feed,
+                                         target=functools.partial(self._hydrate_jobs, jobs=jobs,
+                                                                  wrap=wrap),
+                                         batch_size=self._hydrator.batch_size,
+                                         batch_wait=self._hydrator.wait)
+                stage.start()
+
+            if streams is None:
+                self._feed_shards(kind, feed, wrap)
+            else:
+                self._feed_all(streams, feed, kind, wrap)
+        finally:
+            # Forward the items still being hydrated
+            if stage is not None:
+                if self._abandon.is_set():
+                    abandon(feed)
+                feed.put(None)
+                stage.join()
+
+            # Release the workers once the streams stopped or ended
+            done.set()
+            if scaler is not None:
+                scaler.join()
+            pool.stop(self._abandon)
+            metrics.queue_depth.set_function(None)
+            if isinstance(jobs, (OverflowQueue, SQLiteQueue)):
+                jobs.close()
+
+    def _feed_all(self, streams: List[Callable[[], Iterable]], jobs: Queue, kind: str,
+                  wrap: Callable = None):
+        """
+        Feed :code:`jobs` from all :code:`streams`, using one thread per stream if there is more
+        than one. Returns once all streams stopped. See :func:`~AbstractBot._feed`.
+        """
+        if len(streams) == 1:
+            self._feed(streams[0], jobs, kind, wrap)
+            return
+
+        feeders = []  # type: List[BotThread]
+        for i, stream in enumerate(streams):
+            t = BotThread('{}-{}-shard-{}-thread'.format(self._name, kind, i), self._feed,
+                          stream, jobs, kind, wrap)
+            t.start()
+            feeders.append(t)
+
+        for t in feeders:
+            t.join()
+
+    def _feed_shards(self, kind: str, jobs: Queue, wrap: Callable = None):
+        """
+        Feed :code:`jobs` from one stream per shard of the subreddits, each in its own thread,
+        until the bot is stopped. When :func:`~AbstractBot.set_subreddits` changed the shards,
+        the streams of removed shards are stopped and those of new shards started, while the
+        others keep running. See :func:`~AbstractBot._feed`.
+
+        :param kind: :code:`'comments'` or :code:`'submissions'`
+        """
+        feeders = {}  # type: Dict[tuple, threading.Event]
+        threads = []  # type: List[BotThread]
+        count = 0
+
+        with self._subs_changed:
+            while not self._stop:
+                shards = set(tuple(shard) for shard in self._shard_subs if shard)
+                for shard in set(feeders) - shards:
+                    feeders.pop(shard).set()
+
+                for shard in shards - set(feeders):
+                    stopped = threading.Event()
+                    stream = self._recorded(functools.partial(self._subreddit_stream, list(shard),
+                                                              kind), kind)
+                    t = BotThread('{}-{}-shard-{}-thread'.format(self._name, kind, count),
+                                  self._feed, stream, jobs, kind, wrap, stopped)
+                    t.start()
+                    feeders[shard] = stopped
+                    threads.append(t)
+                    count += 1
+
+                threads = [t for t in threads if t.is_alive()]
+                self._subs_changed.wait()
+
+        for stopped in feeders.values():
+            stopped.set()
+        for t in threads:
+            t.join()
+
+    def _feed(self, stream: Callable[[], Iterable], jobs: Queue, kind: str,
+              wrap: Callable = None, stopped: threading.Event = None):
+        """
+        Put all items of :code:`stream()` into :code:`jobs` until the bot is stopped or the stream
+        ends. The stream is restarted after an exception, while the workers keep running.
+
+        :param stream: Function returning a PRAW stream
+        :param jobs: Queue of the workers
+        :param kind: Name of the stream used for logging
+        :param wrap: Optional function applied to each item before it is queued. Items for
+            which it returns :code:`None` are skipped.
+        :param stopped: Event stopping only this stream, e.g. of a shard that was removed. It
+            must also be set when the bot is stopped.
+        """
+        attempt = 0
+        metrics = self._metrics.stream(kind)
+        waiter = stopped if stopped is not None else self._stop_event
+
+        while not self._stop and not waiter.is_set():
+            try:
+                idle = 0
+
+                # Iterate over all items in the stream
+                for item in stream():
+
+                    # Check for stopping
+                    if self._stop or waiter.is_set():
+                        break
+
+                    # Streams yield None after each poll without new items. Wait before polling
+                    # again, but wake up as soon as the bot is stopped.
+                    if item is None:
+                        waiter.wait(min(MAX_IDLE_WAIT, 2 ** idle / 2))
+                        idle += 1
+                        continue
+
+                    # Skip blacklisted subreddits with a set lookup, before claiming the item
+                    if self._blacklist and subreddit_of(item) in self._blacklist:
+                        continue
+
+                    attempt = 0
+                    idle = 0
+
+                    # Skip items already processed, or queued by another stream. This also skips
+                    # the newest items a restarted stream yields again. Items are not skipped by
+                    # id, since an older item, e.g. one approved late, may show up after newer ones.
+                    if not self._claim(item):
+                        continue
+                    metrics.item_received(item)
+
+                    item = self._project(item, kind)
+                    job = self._wrap(wrap, item, kind)
+                    if job is None:
+                        self._processed(item)
+                        continue
+                    metrics.job_queued(job)
+                    jobs.put(job)
+
+                self.log.debug('Listen {} stopped'.format(kind))
+                return
+            except Exception as e:
+                self.log.error('Exception while listening to {}:'.format(kind))
+                self.log.error(str(e))
+
+                delay = self._retry.delay(attempt, e)
+                if delay is None:
+                    self.log.error('Giving up on {} after {} attempts ({} error).'
+                                   .format(kind, attempt + 1, self._retry.classify(e)))
+                    return
+
+                self.log.error('Waiting for {:.1f} seconds and trying again.'.format(delay))
+                metrics.retries.inc()
+                attempt += 1
+                waiter.wait(delay)
+
+    def _wrap(self, wrap: Callable, item, kind: str):
+        """
+        Job of :code:`item`, or :code:`None` to skip it. Exceptions of :code:`wrap`, e.g. of a
+        rule predicate, skip the item instead of restarting the stream.
+        """
+        if wrap is None:
+            return item
 
-                comments_queue.put(comment)
+        try:
+            return wrap(item)
+        except Exception:
+            self.log.exception('Exception while routing {} of {}, skipping it'
+                               .format(item.fullname, kind))
+            return None
+
+    def _project(self, item, kind: str):
+        """Record of :code:`item` if the bot has a projection, otherwise :code:`item` itself."""
+        if self._projection is None or item is None:
+            return item
+        return self._projection.record(item, STREAM_KINDS[kind])
+
+    def _hydrate(self, items: List):
+        """Hydrate :code:`items`, leaving them lazy if that fails."""
+        try:
+            self._hydrator.hydrate(items)
+        except Exception:
+            self.log.exception('Failed to hydrate {} items, handlers will fetch them lazily'
+                               .format(len(items)))
 
-            self.log.debug('Listen comments stopped')
-        except Exception as e:
-            self._do_stop(comments_queue, threads)
-            self.log.error('Exception while listening to comments:')
-            self.log.error(str(e))
-            self.log.error('Waiting for 10 minutes and trying again.')
-            time.sleep(10 * 60)
+    def _hydrate_jobs(self, batch: List, jobs: Queue, wrap: Callable = None):
+        """Hydrate the items of a batch of jobs and queue them for the workers."""
+        # Wrapped jobs are (rule, item) tuples
+        self._hydrate([job if wrap is None else job[1] for job in batch])
+        for job in batch:
+            jobs.put(job)
+
+
+class AbstractCommentBot(AbstractBot):
+    @abstractmethod
+    def _process_comment(self, comment: praw.models.Comment):
+        """Process a single comment"""
+        pass
 
-            # Retry
-            self._listen_comments()
+    def _process_comments(self, comments: List[praw.models.Comment]):
+        """Process a batch of comments"""
+        for comment in comments:
+            self._process_comment(comment)
+
+    def _listen_comments(self):
+        """Start listening to comments, using a separate thread."""
+        self._listen(streams=None,
+                     kind='comments',
+                     worker_name='CommentThread',
+                     target=self._process_comment,
+                     batch_target=self._process_comments)
 
     def start(self):
         """
@@ -134,42 +830,18 @@ class AbstractSubmissionBot(AbstractBot):
         """Process a single submission"""
         pass
 
+    def _process_submissions(self, submissions: List[praw.models.Submission]):
+        """Process a batch of submissions"""
+        for submission in submissions:
+            self._process_submission(submission)
+
     def _listen_submissions(self):
         """Start listening to submissions, using a separate thread."""
-        # Collect submissions in a queue
-        subs_queue = Queue(maxsize=self._n_jobs * 4)
-
-        threads = []  # type: List[BotQueueWorker]
-
-        try:
-            # Create n_jobs SubmissionThreads
-            for i in range(self._n_jobs):
-                t = BotQueueWorker(name='SubmissionThread-t-{}'.format(i),
-                                   jobs=subs_queue,
-                                   target=self._process_submission)
-                t.start()
-                self._threads.append(t)
-
-            # Iterate over all comments in the comment stream
-            for submission in self._reddit.subreddit('+'.join(self._subs)).stream.submissions():
-
-                # Check for stopping
-                if self._stop:
-                    self._do_stop(subs_queue, threads)
-                    break
-
-                subs_queue.put(submission)
-
-            self.log.debug('Listen submissions stopped')
-        except Exception as e:
-            self._do_stop(subs_queue, threads)
-            self.log.error('Exception while listening to submissions:')
-            self.log.error(str(e))
-            self.log.error('Waiting for 10 minutes and trying again.')
-            time.sleep(10 * 60)
-
-            # Retry:
-            self._listen_submissions()
+        self._listen(streams=None,
+                     kind='submissions',
+                     worker_name='SubmissionThread',
+                     target=self._process_submission,
+                     batch_target=self._process_submissions)
 
     def start(self):
         """
@@ -188,14 +860,42 @@ class AbstractSubmissionBot(AbstractBot):
 class AbstractMessageBot(AbstractBot):
     def __init__(self, reddit: praw.Reddit,
                  name: str = "AbstractInboxBot",
-                 n_jobs=1):
+                 n_jobs=1,
+                 n_processes: int = None,
+                 seen: SeenSet = None,
+                 retry: RetryPolicy = None,
+                 outbox: Outbox = None,
+                 metrics: Registry = None,
+                 overflow: OverflowPolicy = None,
+                 queue_path: str = None,
+                 autoscale: AutoscalePolicy = None,
+                 hydrator: Hydrator = None,
+                 recorder: Recorder = None,
+                 projection: Projection = None,
+                 fair: FairPolicy = None):
         """
         Default constructor
 
         :param reddit: Reddit instance
         :param n_jobs: Number of jobs for parallelization
+        :param n_processes: Number of processes to run handlers in
+        :param seen: Set of the fullnames already processed
+        :param retry: Backoff policy for restarting a failed stream
+        :param outbox: Queue executing the actions returned by handlers
+        :param metrics: Registry to record the metrics of the bot in
+        :param overflow: What to do when the queue is full
+        :param queue_path: Path of a SQLite database keeping the queued items
+        :param autoscale: Bounds of a worker pool following the load
+        :param hydrator: Fetches related things in bulk before queueing messages
+        :param recorder: Records all messages the stream yields
+        :param projection: Queue compact records of the messages
+        :param fair: Serve the queued messages by priority and subreddit
         """
-        super().__init__(reddit=reddit, name=name, n_jobs=n_jobs)
+        super().__init__(reddit=reddit, name=name, n_jobs=n_jobs, n_processes=n_processes,
+                         seen=seen, retry=retry, outbox=outbox, metrics=metrics,
+                         overflow=overflow, queue_path=queue_path, autoscale=autoscale,
+                         hydrator=hydrator, recorder=recorder,
+                         projection=projection, fair=fair)
 
     @abstractmethod
     def _process_inbox_message(self, submission: praw.models.Message):
@@ -204,39 +904,10 @@ class AbstractMessageBot(AbstractBot):
 
     def _listen_inbox_messages(self):
         """Start listening to messages, using a separate thread."""
-        # Collect messages in a queue
-        inbox_queue = Queue(maxsize=self._n_jobs * 4)
-
-        threads = []  # type: List[BotQueueWorker]
-
-        try:
-            # Create n_jobs inbox threads
-            for i in range(self._n_jobs):
-                t = BotQueueWorker(name='InboxThread-t-{}'.format(i),
-                                   jobs=inbox_queue,
-                                   target=self._process_inbox_message)
-                t.start()
-                self._threads.append(t)
-
-            # Iterate over all messages in the messages stream
-            for message in self._reddit.inbox.stream():
-                # Check for stopping
-                if self._stop:
-                    self._do_stop(inbox_queue, threads)
-                    break
-
-                inbox_queue.put(message)
-
-            self.log.debug('Listen inbox stopped')
-        except Exception as e:
-            self._do_stop(inbox_queue, threads)
-            self.log.error('Exception while listening to inbox:')
-            self.log.error(str(e))
-            self.log.error('Waiting for 10 minutes and trying again.')
-            time.sleep(10 * 60)
-
-            # Retry:
-            self._listen_inbox_messages()
+        self._listen(streams=[lambda: self._reddit.inbox.stream(pause_after=0)],
+                     kind='inbox',
+                     worker_name='InboxThread',
+                     target=self._process_inbox_message)
 
     def start(self):
         """
@@ -271,6 +942,74 @@ class CommentBot(AbstractCommentBot):
     :param subreddits: List of subreddit names. Example: :code:`['AskReddit', 'Videos', ...]`
     :param n_jobs: Number of parallel threads that are started when calling
         :func:`~CommentBot.start` to process in the incoming comments.
+    :param func_comments: Batch function. If given, it is called instead of :code:`func_comment` as
+        :code:`func_comments(comments, *func_comment_args)` with a list of up to :code:`batch_size`
+        comments. It may return a list with one :class:`~bottr.actions.Action` (or list of actions,
+        or :code:`None`) per comment.
+    :param batch_size: Maximum number of comments passed to :code:`func_comments` at once.
+    :param batch_wait: Maximum number of seconds a worker waits to fill up a batch after it
+        received its first comment.
+    :param shard_size: Maximum number of subreddits per stream. With more :code:`subreddits`,
+        they are split into shards, each polled by its own stream thread, and comments are
+        de-duplicated by fullname. This avoids overlong multireddit URLs and busy subreddits
+        crowding quiet ones out of the newest 100 items of a poll.
+    :param seen: Set of the fullnames already processed. Items in it are skipped before they are
+        queued, e.g. when a restarted stream yields its newest items again. A fullname is added
+        once its handler returned or failed, so comments that were queued or in progress when the
+        bot crashed, or that were dropped from a full queue, are not in it. Pass a
+        :class:`~bottr.seen.SeenSet` with a :code:`path` or a :class:`~bottr.seen.SQLiteSeenSet`
+        to keep it across restarts of the bot.
+    :param retry: Backoff policy for restarting failed streams. A failed stream is restarted after
+        an exponentially growing, jittered delay, while the worker threads keep running. Items it
+        yields again are skipped by the :code:`seen` set. Defaults to
+        :class:`~bottr.retry.RetryPolicy` with its default arguments.
+    :param outbox: :class:`~bottr.actions.Outbox` executing the :class:`~bottr.actions.Action`
+        objects returned by :code:`func_comment` on a dedicated writer thread, so workers do not
+        wait for writes. It is started and drained together with the bot.
+    :param n_processes: Run :code:`func_comment` in a pool of this many processes, for CPU-heavy
+        handlers. :code:`func_comment` then needs to be picklable (a module-level function) and
+        receives a :class:`~bottr.process.Snapshot` of the comment. Replies must be returned as
+        :class:`~bottr.actions.Action` objects, which are executed in the bot process. Use at
+        least as many :code:`n_jobs` as processes to keep the pool busy.
+    :param rules: List of :class:`~bottr.rules.Rule` objects (or a :class:`~bottr.rules.RuleSet`)
+        used instead of :code:`func_comment`. The rules are compiled into a single regular
+        expression and matched on the stream thread, so only matching comments are queued. Each
+        is passed to the handler of the first rule it matches. Rule predicates run on the stream
+        thread, so they should only read loaded attributes and not make requests. Items whose
+        predicate raises an exception are skipped.
+    :param metrics: :class:`~bottr.metrics.Registry` recording counters of received, processed
+        and failed comments and stream retries, the queue depth and number of busy workers, and
+        histograms of the stream lag, queue wait and handler time, labeled with the bot
+        :code:`name`. Defaults to :data:`~bottr.metrics.default_registry`. Use
+        :func:`~bottr.metrics.Registry.serve` to expose it to Prometheus.
+    :param overflow: :class:`~bottr.queues.OverflowPolicy` for when handlers fall behind and the
+        queue is full. By default, the stream waits for room, stops polling and may miss items
+        that drop out of the newest 100 meanwhile. Instead, the oldest or lowest priority comments
+        can be dropped, or spilled to a file by fullname and fetched again in batches of 100
+        once the workers caught up. Dropped and spilled comments are counted in :code:`metrics`.
+    :param queue_path: Path of a SQLite database to queue comments in, instead of memory. Queued
+        comments and those being processed survive crashes and restarts: a restarted bot
+        processes them first, fetching them again by fullname. A comment is removed once its
+        handler returned, so it may be processed twice after a crash, but is not lost. Use a
+        persistent :code:`seen` set along with it.
+    :param autoscale: Run between :code:`min_jobs` and :code:`max_jobs` worker threads instead of
+        a fixed :code:`n_jobs`, see :class:`~bottr.pool.AutoscalePolicy`. Workers are added while
+        comments queue up or wait too long, and retire after being idle for a while.
+    :param hydrator: Fetch the related things that handlers read, e.g. the submission of each
+        comment, in bulk before comments are queued. See :class:`~bottr.hydrate.Hydrator`.
+    :param recorder: Record all comments the streams yield to a compressed file, to replay them
+        later with :class:`~bottr.replay.ReplayReddit`. See :class:`~bottr.replay.Recorder`.
+    :param projection: Queue compact :class:`~bottr.records.ItemRecord` objects with only the
+        fields the handlers read, instead of the full PRAW objects, see
+        :class:`~bottr.records.Projection`. Handlers receive the records, and returned actions are
+        executed on the rehydrated PRAW objects. Cannot be combined with :code:`hydrator`.
+    :param fair: Take the queued comments of each subreddit in turns, weighted per subreddit,
+        and those with a higher priority first, see :class:`~bottr.queues.FairPolicy`. A flood in
+        one subreddit then does not delay the comments of the others behind it. Combined with
+        :code:`shard_size`, a full lane only blocks the stream of its own shard.
+    :param memo: Call the handler only once per comment content, e.g. for copypasta, and execute
+        the actions it returned on every comment with the same content, see
+        :class:`~bottr.memo.Memo`. The handler must return its actions instead of acting itself.
 
     **Example usage**::
 
@@ -283,6 +1022,28 @@ class CommentBot(AbstractCommentBot):
         bot = CommentBot(reddit=reddit, func_comment=parse)
         bot.start()
 
+    **Example usage with a process pool**::
+
+        from bottr.actions import Reply
+
+        # Module-level function, returning the replies instead of sending them
+        def classify(comment):
+           if expensive_score(comment.body) > 0.9:
+               return Reply('This comment is bananas.')
+
+        bot = CommentBot(reddit=reddit, func_comment=classify, n_jobs=8, n_processes=4)
+        bot.start()
+
+    **Example usage with rules**::
+
+        from bottr.rules import Rule
+
+        def bananas(comment):
+           comment.reply('This comment is bananas.')
+
+        bot = CommentBot(reddit=reddit, rules=[Rule(bananas, keywords=['banana', 'plantain'])])
+        bot.start()
+
     """
 
     def __init__(self, reddit: praw.Reddit,
@@ -290,16 +1051,71 @@ class CommentBot(AbstractCommentBot):
                  func_comment: Callable[[praw.models.Comment], None] = None,
                  func_comment_args: List = None,
                  subreddits: Iterable = None,
-                 n_jobs=4):
-        super().__init__(reddit, subreddits, name, n_jobs)
+                 n_jobs=4,
+                 n_processes: int = None,
+                 func_comments: Callable[[List[praw.models.Comment]], None] = None,
+                 batch_size: int = 64,
+                 batch_wait: float = 1.0,
+                 shard_size: int = None,
+                 seen: SeenSet = None,
+                 retry: RetryPolicy = None,
+                 outbox: Outbox = None,
+                 rules: Iterable[Rule] = None,
+                 metrics: Registry = None,
+                 overflow: OverflowPolicy = None,
+                 queue_path: str = None,
+                 autoscale: AutoscalePolicy = None,
+                 hydrator: Hydrator = None,
+                 recorder: Recorder = None,
+                 projection: Projection = None,
+                 fair: FairPolicy = None,
+                 memo: Memo = None):
+        super().__init__(reddit=reddit, subreddits=subreddits, name=name, n_jobs=n_jobs,
+                         n_processes=n_processes, shard_size=shard_size, seen=seen, retry=retry,
+                         outbox=outbox, metrics=metrics, overflow=overflow, queue_path=queue_path,
+                         autoscale=autoscale, hydrator=hydrator, recorder=recorder,
+                         projection=projection, fair=fair, memo=memo)
+        self._set_rules(rules, 'comment', func_comment, func_comments)
+
+        # Enable batch processing if a batch method was given
+        if func_comments is not None:
+            if batch_size < 1:
+                raise Exception('The batch size needs to be at least one.')
+
+            self._batch_size = batch_size
+            self._batch_wait = batch_wait
+
+        # Functions and arguments are replaced together, see set_func_comment
+        self._comment_handler = (func_comment, func_comments, list(func_comment_args or []))
+
+    def set_func_comment(self, func_comment: Callable[[praw.models.Comment], None] = None,
+                         func_comment_args: List = None,
+                         func_comments: Callable[[List[praw.models.Comment]], None] = None):
+        """
+        Replace the comment function of a running bot, e.g. to deploy a fix without restarting
+        the streams and processing the queued comments again. Comments whose handler is running
+        finish with the old function, all others are passed to the new one.
 
-        # Enable comment processing if proper method was given
-        if func_comment is not None:
-            if func_comment_args is None:
-                func_comment_args = []
+        With :code:`n_processes`, functions are passed to the processes by name, so a changed
+        function needs a new name or module.
+
+        :param func_comment: New comment function
+        :param func_comment_args: New comment function arguments
+        :param func_comments: New batch function, required if the bot was created with one
+        """
+        if self._rules is not None:
+            raise Exception('This bot routes comments by rules, it has no comment function.')
 
-            self._func_comment = func_comment
-            self._func_comment_args = func_comment_args
+        if self._batch_size is not None and func_comments is None:
+            raise Exception('This bot processes batches, pass func_comments.')
+
+        if self._batch_size is None and func_comment is None:
+            raise Exception('Pass a comment function.')
+
+        self._comment_handler = (func_comment, func_comments, list(func_comment_args or []))
+        if self._memo is not None:
+            self._memo.clear()
+        self.log.info('Replaced the comment function of {}'.format(self._name))
 
     def _process_comment(self, comment: praw.models.Comment):
         """
@@ -307,7 +1123,17 @@ class CommentBot(AbstractCommentBot):
 
         :param comment: Comment to process
         """
-        self._func_comment(comment, *self._func_comment_args)
+        func_comment, _, args = self._comment_handler
+        self._dispatch('comment', func_comment, comment, *args)
+
+    def _process_comments(self, comments: List[praw.models.Comment]):
+        """
+        Process a batch of reddit comments. Calls `func_comments(comments, *func_comment_args)`.
+
+        :param comments: Comments to process
+        """
+        _, func_comments, args = self._comment_handler
+        self._dispatch_batch('comment', func_comments, comments, *args)
 
 
 class MessageBot(AbstractMessageBot):
@@ -324,6 +1150,21 @@ class MessageBot(AbstractMessageBot):
     :param func_message_args: Message function arguments.
     :param n_jobs: Number of parallel threads that are started when calling
         :func:`~MessageBot.start` to process in the incoming messages.
+    :param n_processes: Run :code:`func_message` in a pool of this many processes, see
+        :class:`CommentBot`.
+    :param seen: Set of the fullnames already processed, see :class:`CommentBot`.
+    :param retry: Backoff policy for restarting failed streams, see :class:`CommentBot`.
+    :param outbox: Queue executing the actions returned by the handlers, see :class:`CommentBot`.
+    :param rules: Rules used instead of :code:`func_message`, see :class:`CommentBot`. They
+        search the subject and body.
+    :param metrics: Registry to record the metrics in, see :class:`CommentBot`.
+    :param overflow: What to do when the queue is full, see :class:`CommentBot`.
+    :param queue_path: Path of a SQLite database to queue items in, see :class:`CommentBot`.
+    :param autoscale: Bounds of a worker pool following the load, see :class:`CommentBot`.
+    :param hydrator: Fetches related things in bulk before queueing items, see :class:`CommentBot`.
+    :param recorder: Records all items the streams yield, see :class:`CommentBot`.
+    :param projection: Queue compact records of the items, see :class:`CommentBot`.
+    :param fair: Serve the queued items by priority and subreddit, see :class:`CommentBot`.
 
     **Example usage**::
 
@@ -341,16 +1182,43 @@ class MessageBot(AbstractMessageBot):
                  name: str = "InboxBot",
                  func_message: Callable[[praw.models.Message], None] = None,
                  func_message_args: List = None,
-                 n_jobs=1):
-        super().__init__(reddit=reddit, name=name, n_jobs=n_jobs)
+                 n_jobs=1,
+                 n_processes: int = None,
+                 seen: SeenSet = None,
+                 retry: RetryPolicy = None,
+                 outbox: Outbox = None,
+                 rules: Iterable[Rule] = None,
+                 metrics: Registry = None,
+                 overflow: OverflowPolicy = None,
+                 queue_path: str = None,
+                 autoscale: AutoscalePolicy = None,
+                 hydrator: Hydrator = None,
+                 recorder: Recorder = None,
+                 projection: Projection = None,
+                 fair: FairPolicy = None):
+        super().__init__(reddit=reddit, name=name, n_jobs=n_jobs, n_processes=n_processes,
+                         seen=seen, retry=retry, outbox=outbox, metrics=metrics,
+                         overflow=overflow, queue_path=queue_path, autoscale=autoscale,
+                         hydrator=hydrator, recorder=recorder,
+                         projection=projection, fair=fair)
+        self._set_rules(rules, 'message', func_message)
+
+        # Functions and arguments are replaced together, see set_func_message
+        self._message_handler = (func_message, list(func_message_args or []))
+
+    def set_func_message(self, func_message: Callable[[praw.models.Message], None],
+                         func_message_args: List = None):
+        """
+        Replace the message function of a running bot, see :func:`CommentBot.set_func_comment`.
 
-        # Enable comment processing if proper method was given
-        if func_message is not None:
-            if func_message_args is None:
-                func_message_args = []
+        :param func_message: New message function
+        :param func_message_args: New message function arguments
+        """
+        if self._rules is not None:
+            raise Exception('This bot routes messages by rules, it has no message function.')
 
-            self._func_message = func_message
-            self._func_message_args = func_message_args
+        self._message_handler = (func_message, list(func_message_args or []))
+        self.log.info('Replaced the message function of {}'.format(self._name))
 
     def _process_inbox_message(self, message: praw.models.Message):
         """
@@ -358,7 +1226,8 @@ class MessageBot(AbstractMessageBot):
 
         :param message: Item to process
         """
-        self._func_message(message, *self._func_message_args)
+        func_message, args = self._message_handler
+        self._dispatch('message', func_message, message, *args)
 
 
 class SubmissionBot(AbstractSubmissionBot):
@@ -380,6 +1249,30 @@ class SubmissionBot(AbstractSubmissionBot):
     :param subreddits: List of subreddit names. Example: :code:`['AskReddit', 'Videos', ...]`
     :param n_jobs: Number of parallel threads that are started when calling
         :func:`~SubmissionBot.start` to process in the incoming submissions.
+    :param func_submissions: Batch function. If given, it is called instead of :code:`func_submission` as
+        :code:`func_submissions(submissions, *func_submission_args)` with a list of up to :code:`batch_size`
+        submissions. It may return a list with one :class:`~bottr.actions.Action` (or list of actions,
+        or :code:`None`) per submission.
+    :param batch_size: Maximum number of submissions passed to :code:`func_submissions` at once.
+    :param batch_wait: Maximum number of seconds a worker waits to fill up a batch after it
+        received its first submission.
+    :param shard_size: Maximum number of subreddits per stream, see :class:`CommentBot`.
+    :param seen: Set of the fullnames already processed, see :class:`CommentBot`.
+    :param retry: Backoff policy for restarting failed streams, see :class:`CommentBot`.
+    :param outbox: Queue executing the actions returned by the handlers, see :class:`CommentBot`.
+    :param n_processes: Run :code:`func_submission` in a pool of this many processes, see
+        :class:`CommentBot`.
+    :param rules: Rules used instead of :code:`func_submission`, see :class:`CommentBot`. They
+        search the title and selftext.
+    :param metrics: Registry to record the metrics in, see :class:`CommentBot`.
+    :param overflow: What to do when the queue is full, see :class:`CommentBot`.
+    :param queue_path: Path of a SQLite database to queue items in, see :class:`CommentBot`.
+    :param autoscale: Bounds of a worker pool following the load, see :class:`CommentBot`.
+    :param hydrator: Fetches related things in bulk before queueing items, see :class:`CommentBot`.
+    :param recorder: Records all items the streams yield, see :class:`CommentBot`.
+    :param projection: Queue compact records of the items, see :class:`CommentBot`.
+    :param fair: Serve the queued items by priority and subreddit, see :class:`CommentBot`.
+    :param memo: Cache of handler results by submission content, see :class:`CommentBot`.
 
 
     **Example usage**::
@@ -400,16 +1293,68 @@ class SubmissionBot(AbstractSubmissionBot):
                  func_submission: Callable[[praw.models.Comment], None] = None,
                  func_submission_args: List = None,
                  subreddits: Iterable = None,
-                 n_jobs=4):
-        super().__init__(reddit, subreddits, name, n_jobs)
+                 n_jobs=4,
+                 n_processes: int = None,
+                 func_submissions: Callable[[List[praw.models.Submission]], None] = None,
+                 batch_size: int = 64,
+                 batch_wait: float = 1.0,
+                 shard_size: int = None,
+                 seen: SeenSet = None,
+                 retry: RetryPolicy = None,
+                 outbox: Outbox = None,
+                 rules: Iterable[Rule] = None,
+                 metrics: Registry = None,
+                 overflow: OverflowPolicy = None,
+                 queue_path: str = None,
+                 autoscale: AutoscalePolicy = None,
+                 hydrator: Hydrator = None,
+                 recorder: Recorder = None,
+                 projection: Projection = None,
+                 fair: FairPolicy = None,
+                 memo: Memo = None):
+        super().__init__(reddit=reddit, subreddits=subreddits, name=name, n_jobs=n_jobs,
+                         n_processes=n_processes, shard_size=shard_size, seen=seen, retry=retry,
+                         outbox=outbox, metrics=metrics, overflow=overflow, queue_path=queue_path,
+                         autoscale=autoscale, hydrator=hydrator, recorder=recorder,
+                         projection=projection, fair=fair, memo=memo)
+        self._set_rules(rules, 'submission', func_submission, func_submissions)
+
+        # Enable batch processing if a batch method was given
+        if func_submissions is not None:
+            if batch_size < 1:
+                raise Exception('The batch size needs to be at least one.')
+
+            self._batch_size = batch_size
+            self._batch_wait = batch_wait
+
+        # Functions and arguments are replaced together, see set_func_submission
+        self._submission_handler = (func_submission, func_submissions,
+                                    list(func_submission_args or []))
+
+    def set_func_submission(self, func_submission: Callable[[praw.models.Submission], None] = None,
+                            func_submission_args: List = None,
+                            func_submissions: Callable[[List[praw.models.Submission]], None] = None):
+        """
+        Replace the submission function of a running bot, see :func:`CommentBot.set_func_comment`.
 
-        # Enable comment processing if proper method was given
-        if func_submission is not None:
-            if func_submission_args is None:
-                func_submission_args = []
+        :param func_submission: New submission function
+        :param func_submission_args: New submission function arguments
+        :param func_submissions: New batch function, required if the bot was created with one
+        """
+        if self._rules is not None:
+            raise Exception('This bot routes submissions by rules, it has no submission function.')
+
+        if self._batch_size is not None and func_submissions is None:
+            raise Exception('This bot processes batches, pass func_submissions.')
 
-            self._func_submission = func_submission
-            self._func_submission_args = func_submission_args
+        if self._batch_size is None and func_submission is None:
+            raise Exception('Pass a submission function.')
+
+        self._submission_handler = (func_submission, func_submissions,
+                                    list(func_submission_args or []))
+        if self._memo is not None:
+            self._memo.clear()
+        self.log.info('Replaced the submission function of {}'.format(self._name))
 
     def _process_submission(self, submission: praw.models.Submission):
         """
@@ -417,7 +1362,187 @@ class SubmissionBot(AbstractSubmissionBot):
 
         :param submission: Comment to process
         """
-        self._func_submission(submission, *self._func_submission_args)
+        func_submission, _, args = self._submission_handler
+        self._dispatch('submission', func_submission, submission, *args)
+
+    def _process_submissions(self, submissions: List[praw.models.Submission]):
+        """
+        Process a batch of reddit submissions. Calls
+        `func_submissions(submissions, *func_submission_args)`.
+
+        :param submissions: Submissions to process
+        """
+        _, func_submissions, args = self._submission_handler
+        self._dispatch_batch('submission', func_submissions, submissions, *args)
+
+
+class CombinedBot(AbstractBot):
+    """
+    This bot listens to new comments and submissions in the given :code:`subreddits` and to new
+    inbox messages at the same time, calling :code:`func_comment`, :code:`func_submission` and
+    :code:`func_message` respectively. Only the streams with a given function are listened to.
+
+    Unlike running a :class:`CommentBot`, a :class:`SubmissionBot` and a :class:`MessageBot`
+    side by side, all streams share one pool of :code:`n_jobs` worker threads. A scheduler picks
+    the next item by weighted round robin over the streams with pending items, so capacity not
+    needed by a quiet stream serves the busy ones.
+
+    :param reddit: :class:`praw.Reddit` instance. Check :ref:`setup` on how to create it.
+    :param name: Bot name
+    :param func_comment: Comment function, see :class:`CommentBot`.
+    :param func_comment_args: Comment function arguments.
+    :param func_submission: Submission function, see :class:`SubmissionBot`.
+    :param func_submission_args: Submission function arguments.
+    :param func_message: Message function, see :class:`MessageBot`.
+    :param func_message_args: Message function arguments.
+    :param subreddits: List of subreddit names. Example: :code:`['AskReddit', 'Videos', ...]`
+    :param n_jobs: Number of worker threads shared by all streams.
+    :param n_processes: Run the functions in a pool of this many processes, see :class:`CommentBot`.
+    :param weights: Share of the workers each stream gets while several streams have pending
+        items, keyed by :code:`'comments'`, :code:`'submissions'` and :code:`'inbox'`. Defaults to
+        equal weights.
+    :param shard_size: Maximum number of subreddits per stream, see :class:`CommentBot`.
+    :param seen: Set of the fullnames already processed, see :class:`CommentBot`.
+    :param retry: Backoff policy for restarting failed streams, see :class:`CommentBot`.
+    :param outbox: Queue executing the actions returned by the handlers, see :class:`CommentBot`.
+    :param metrics: Registry to record the metrics in, see :class:`CommentBot`. Items are counted
+        per stream when they are received, and under the stream :code:`'all'` once the shared
+        workers pick them up.
+    :param recorder: Records all items the streams yield, see :class:`CommentBot`.
+    :param projection: Queue compact records of the items, see :class:`CommentBot`.
+
+    **Example usage**::
+
+        bot = CombinedBot(reddit=reddit,
+                          func_comment=parse_comment,
+                          func_message=parse_message,
+                          subreddits=['AskReddit'],
+                          n_jobs=8,
+                          weights={'comments': 3, 'inbox': 1})
+        bot.start()
+
+    """
+
+    def __init__(self, reddit: praw.Reddit,
+                 name: str = "CombinedBot",
+                 func_comment: Callable[[praw.models.Comment], None] = None,
+                 func_comment_args: List = None,
+                 func_submission: Callable[[praw.models.Submission], None] = None,
+                 func_submission_args: List = None,
+                 func_message: Callable[[praw.models.Message], None] = None,
+                 func_message_args: List = None,
+                 subreddits: Iterable = None,
+                 n_jobs=4,
+                 n_processes: int = None,
+                 weights: Dict[str, int] = None,
+                 shard_size: int = None,
+                 seen: SeenSet = None,
+                 retry: RetryPolicy = None,
+                 outbox: Outbox = None,
+                 metrics: Registry = None,
+                 recorder: Recorder = None,
+                 projection: Projection = None):
+        super().__init__(reddit=reddit, subreddits=subreddits, name=name, n_jobs=n_jobs,
+                         n_processes=n_processes, shard_size=shard_size, seen=seen, retry=retry,
+                         outbox=outbox, metrics=metrics, recorder=recorder, projection=projection)
+
+        self._handlers = {}  # type: Dict[str, tuple]
+        if func_comment is not None:
+            self._handlers['comments'] = ('comment', func_comment, func_comment_args or [])
+        if func_submission is not None:
+            self._handlers['submissions'] = ('submission', func_submission, func_submission_args or [])
+        if func_message is not None:
+            self._handlers['inbox'] = ('message', func_message, func_message_args or [])
+
+        self._weights = weights
+
+    def set_func(self, kind: str, func: Callable, func_args: List = None):
+        """
+        Replace the function of a stream of a running bot, see
+        :func:`CommentBot.set_func_comment`.
+
+        :param kind: :code:`'comment'`, :code:`'submission'` or :code:`'message'`
+        :param func: New function
+        :param func_args: New function arguments
+        """
+        streams = {handler[0]: stream for stream, handler in self._handlers.items()}
+        if kind not in streams:
+            raise Exception('This bot does not listen to {} items.'.format(kind))
+
+        self._handlers[streams[kind]] = (kind, func, list(func_args or []))
+        self.log.info('Replaced the {} function of {}'.format(kind, self._name))
+
+    def _process_job(self, job: tuple):
+        """
+        Process a :code:`(stream, item)` job with the function of its stream.
+
+        :param job: Stream name and item
+        """
+        stream, item = job
+        kind, func, args = self._handlers[stream]
+        self._dispatch(kind, func, item, *args)
+
+    def _listen_all(self):
+        """Start listening to all streams, feeding one queue processed by a shared worker pool."""
+        jobs = WeightedQueue(key=lambda job: job[0], weights=self._weights,
+                             lane_size=self._n_jobs * 4)
+        metrics = self._metrics.stream('all')
+        metrics.queue_depth.set_function(jobs.qsize)
+
+        def create(name, retire, idle_timeout):
+            return BotQueueWorker(name=name, jobs=jobs, target=self._process_job, metrics=metrics)
+
+        pool = WorkerPool('Worker', jobs, create, metrics=metrics)
+        feeders = []  # type: List[BotThread]
+
+        try:
+            # Create n_jobs workers shared by all streams
+            pool.start(self._n_jobs)
+
+            # Create one thread per stream, tagging its items with the stream name
+            for stream in self._handlers:
+                tag = functools.partial(_tag, stream)
+                if stream == 'inbox':
+                    inbox = self._recorded(lambda: self._reddit.inbox.stream(pause_after=0), stream)
+                    t = BotThread('{}-{}-stream-thread'.format(self._name, stream), self._feed_all,
+                                  [inbox], jobs, stream, tag)
+                else:
+                    t = BotThread('{}-{}-stream-thread'.format(self._name, stream),
+                                  self._feed_shards, stream, jobs, tag)
+                t.start()
+                feeders.append(t)
+                self.log.info('Starting {} stream ...'.format(stream))
+
+            for t in feeders:
+                t.join()
+        finally:
+            # Release the workers once all streams stopped or ended
+            pool.stop(self._abandon)
+            metrics.queue_depth.set_function(None)
+
+    def start(self):
+        """
+        Starts this bot in a separate thread. Therefore, this call is non-blocking.
+
+        It will listen to the streams of all given functions.
+        """
+        super().start()
+        scheduler_thread = BotThread(name='{}-scheduler-thread'.format(self._name),
+                                     target=self._listen_all)
+        scheduler_thread.start()
+        self._threads.append(scheduler_thread)
+
+
+def _job_key(job) -> str:
+    """
+    Fullname of the item of a job, which stays the same when the job is stored and loaded again.
+    Jobs are items, or :code:`(rule, item)` and :code:`(stream, item)` tuples.
+    """
+    return (job[1] if isinstance(job, tuple) else job).fullname
+
+
+def _tag(stream: str, item) -> tuple:
+    return stream, item
 
 
 class BotThread(threading.Thread, ABC):
@@ -445,28 +1570,141 @@ class BotQueueWorker(BotThread):
     it.
     """
 
-    def __init__(self, name: str, jobs: Queue = None, target: classmethod = None, *args):
+    def __init__(self, name: str, jobs: Queue = None, target: classmethod = None, *args,
+                 metrics: StreamMetrics = None, retire: Callable[['BotQueueWorker'], bool] = None,
+                 idle_timeout: float = None):
         """
         Initialize this worker.
         :param name: Name
         :param jobs: Job queue
         :param bot: Bot object
         :param args: Additional arguments
+        :param metrics: Optional metrics of the stream feeding the queue
+        :param retire: Function asked whether this worker may exit after it waited
+            :code:`idle_timeout` seconds for a job, see :class:`~bottr.pool.WorkerPool`
+        :param idle_timeout: Seconds to wait for a job before calling :code:`retire`
         """
-        super().__init__(name=name, target=target, *args)
+        super().__init__(name, target, *args)
         self._jobs = jobs
+        self._metrics = metrics
+        self._retire = retire
+        self._idle_timeout = idle_timeout
+
+    def _next_job(self):
+        """
+        Block until a job is available. Returns :code:`None` if the worker should exit, either
+        because it got the stop sentinel or because it was idle and allowed to retire. Errors of
+        the queue are logged, so they do not end the worker.
+        """
+        while True:
+            try:
+                if self._retire is None:
+                    return self._jobs.get()
+                return self._jobs.get(timeout=self._idle_timeout)
+            except Empty:
+                if self._retire(self):
+                    return None
+            except Exception:
+                self.log.exception('{} failed to take a job'.format(self.name))
+                time.sleep(QUEUE_ERROR_WAIT)
+
+    def _process(self, jobs: List, target_arg, *args):
+        """
+        Call the target on :code:`target_arg`, recording the metrics of :code:`jobs`. Exceptions
+        are logged, so a failing handler does not end the worker.
+        """
+        if self._metrics is None:
+            started = None
+        else:
+            for job in jobs:
+                self._metrics.job_dequeued(job)
+            started = self._metrics.handler_started()
+
+        failed = False
+        try:
+            self._target(target_arg, *args)
+        except Exception:
+            failed = True
+            self.log.exception('{} failed to process {} element(s)'.format(self.name, len(jobs)))
+        finally:
+            if started is not None:
+                self._metrics.handler_finished(started, len(jobs), failed)
+            for _ in jobs:
+                self._jobs.task_done()
 
     def _call(self, *args):
         while True:
 
             # Blocks if no item available
-            e = self._jobs.get()
-            self.log.debug('{} processing element: {}'.format(self._name, e))
+            e = self._next_job()
+            self.log.debug('{} processing element: {}'.format(self.name, e))
 
             # If None is in queue, exit
             if e is None:
                 break
 
             # Process the element
-            self._target(e, *args)
-            self._jobs.task_done()
+            self._process([e], e, *args)
+
+
+class BatchQueueWorker(BotQueueWorker):
+    """
+    A worker thread that polls batches of jobs from a given queue. A batch is processed as soon as
+    it holds :code:`batch_size` jobs, or :code:`batch_wait` seconds after its first job arrived.
+    """
+
+    def __init__(self, name: str, jobs: Queue = None, target: classmethod = None,
+                 batch_size: int = 64, batch_wait: float = 1.0, *args,
+                 metrics: StreamMetrics = None, retire: Callable[['BotQueueWorker'], bool] = None,
+                 idle_timeout: float = None):
+        """
+        Initialize this worker.
+        :param name: Name
+        :param jobs: Job queue
+        :param target: Function called with a list of jobs
+        :param batch_size: Maximum number of jobs per batch
+        :param batch_wait: Maximum number of seconds to wait for a batch to fill up
+        :param args: Additional arguments
+        :param metrics: Optional metrics of the stream feeding the queue
+        :param retire: See :class:`BotQueueWorker`
+        :param idle_timeout: See :class:`BotQueueWorker`
+        """
+        super().__init__(name, jobs, target, *args, metrics=metrics, retire=retire,
+                         idle_timeout=idle_timeout)
+        self._batch_size = batch_size
+        self._batch_wait = batch_wait
+
+    def _call(self, *args):
+        stopped = False
+        while not stopped:
+
+            # Blocks if no item available
+            e = self._next_job()
+
+            # If None is in queue, exit
+            if e is None:
+                break
+
+            batch = [e]
+            deadline = time.monotonic() + self._batch_wait
+            while len(batch) < self._batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                try:
+                    e = self._jobs.get(timeout=remaining)
+                except Empty:
+                    break
+
+                # Process the collected batch before exiting
+                if e is None:
+                    stopped = True
+                    break
+
+                batch.append(e)
+
+            self.log.debug('{} processing batch of {} elements'.format(self.name, len(batch)))
+
+            # Process the batch
+            self._process(batch, batch, *args)
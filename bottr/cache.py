@@ -0,0 +1,70 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class TTLCache(object):
+    """
+    Bounded, thread-safe mapping whose entries expire :code:`ttl` seconds after they were set.
+
+    Once :code:`maxsize` entries are stored, the least recently used one is evicted. Counts hits
+    and misses of :func:`~TTLCache.get`.
+
+    :param maxsize: Maximum number of entries
+    :param ttl: Seconds an entry stays valid. :code:`None` keeps entries until they are evicted.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = None):
+        if maxsize < 1:
+            raise Exception('The cache needs to hold at least one entry.')
+
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._entries = OrderedDict()  # type: OrderedDict
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Value of :code:`key`, or :code:`default` if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any):
+        """Set :code:`key` to :code:`value`, evicting the least recently used entry if full."""
+        expires = None if self._ttl is None else time.monotonic() + self._ttl
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and (entry[1] is None or entry[1] > time.monotonic())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of :func:`~TTLCache.get` calls that found a valid entry"""
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
@@ -0,0 +1,106 @@
+import copy
+import itertools
+import logging
+import threading
+from typing import Dict, Iterable, List
+
+import praw
+
+from bottr import ratelimit
+from bottr.util import init_reddit
+
+
+class ClientPool(object):
+    """
+    Several reddit accounts, each with its own :class:`praw.Reddit` instance and
+    :class:`~bottr.ratelimit.RateLimiter`, so writes are not limited by the budget of one account.
+
+    :func:`~ClientPool.choose` returns the client with the most tokens left in its rate limiter,
+    taking turns on ties, or the client of a given account where the account matters, e.g. to reply
+    as the account that was mentioned. :func:`~ClientPool.bind` returns a copy of a PRAW object
+    that acts through another client.
+
+    Pass a pool to an :class:`~bottr.actions.Outbox` to spread its actions over all accounts.
+
+    :param clients: Reddit instances, one per account
+
+    **Example usage**::
+
+        clients = ClientPool.from_files(['alice.props', 'bob.props'])
+        outbox = Outbox(clients=clients)
+
+        def parse(comment):
+            if 'u/bob' in comment.body:
+                return Reply('Bob here.', account='bob')
+            return Reply('Hello.')
+
+        bot = CommentBot(reddit=clients.choose(), func_comment=parse, outbox=outbox)
+    """
+
+    def __init__(self, clients: Iterable[praw.Reddit]):
+        self.clients = list(clients)  # type: List[praw.Reddit]
+        if not self.clients:
+            raise Exception('The pool needs at least one client.')
+
+        self._accounts = {}  # type: Dict[str, praw.Reddit]
+        for client in self.clients:
+            name = self.username(client)
+            if name is not None:
+                self._accounts[name.lower()] = client
+
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+        self.log = logging.getLogger(__name__)
+
+    @classmethod
+    def from_files(cls, creds_paths: Iterable[str]) -> 'ClientPool':
+        """
+        Create a pool with one client per credentials file, see :func:`~bottr.util.init_reddit`.
+
+        :param creds_paths: Paths of properties files with the credentials
+        """
+        return cls(init_reddit(path) for path in creds_paths)
+
+    @staticmethod
+    def username(client: praw.Reddit) -> str:
+        """Name of the account of :code:`client`, from its configuration, or :code:`None`."""
+        return getattr(getattr(client, 'config', None), 'username', None)
+
+    def choose(self, account: str = None) -> praw.Reddit:
+        """
+        Client to make the next write with.
+
+        :param account: Name of the account that has to make the write. :code:`None` chooses the
+            client with the most rate limiter tokens left.
+        """
+        if account is not None:
+            client = self._accounts.get(account.lower())
+            if client is None:
+                raise Exception('No client of the account {} in the pool.'.format(account))
+            return client
+
+        # Rotate the start, so clients with equal budgets take turns
+        with self._lock:
+            start = next(self._turn) % len(self.clients)
+        ordered = self.clients[start:] + self.clients[:start]
+        return max(ordered, key=lambda client: ratelimit.for_reddit(client).available)
+
+    @staticmethod
+    def bind(thing, client: praw.Reddit):
+        """
+        Copy of the PRAW object :code:`thing` that makes its requests with :code:`client`. Only
+        its fullname is needed for writes like replies, so the copy is not fetched again.
+
+        :param thing: PRAW object, e.g. a :class:`praw.models.Comment`
+        :param client: Reddit instance of the account to act as
+        """
+        if getattr(thing, '_reddit', None) is client:
+            return thing
+
+        bound = copy.copy(thing)
+        # Bypass __setattr__ of PRAW models
+        vars(bound)['_reddit'] = client
+        return bound
+
+    def __len__(self) -> int:
+        return len(self.clients)
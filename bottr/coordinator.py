@@ -0,0 +1,184 @@
+import bisect
+import hashlib
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Callable, Iterable, List
+
+
+def _hash(key: str) -> int:
+    return int(hashlib.md5(key.encode('utf-8')).hexdigest()[:16], 16)
+
+
+class HashRing(object):
+    """
+    Consistent hash ring mapping keys to members. Adding or removing a member only moves the keys
+    of that member, about :code:`1 / len(members)` of all keys.
+
+    :param members: Member names
+    :param replicas: Points per member on the ring. More points spread keys more evenly.
+    """
+
+    def __init__(self, members: Iterable[str], replicas: int = 100):
+        self._points = sorted((_hash('{}#{}'.format(member, i)), member)
+                              for member in set(members) for i in range(replicas))
+        self._hashes = [point[0] for point in self._points]
+
+    def owner(self, key: str) -> str:
+        """Member owning :code:`key`, or :code:`None` if the ring is empty."""
+        if not self._points:
+            return None
+        i = bisect.bisect(self._hashes, _hash(key)) % len(self._points)
+        return self._points[i][1]
+
+
+class Coordinator(object):
+    """
+    Splits subreddits across several bot processes that share a SQLite database, without any
+    other service. Each process runs a coordinator with a unique :code:`member` name.
+
+    Every :code:`heartbeat_interval` seconds, a coordinator renews its membership, and assigns the
+    subreddits to the live members with a :class:`HashRing`. A subreddit is only listened to by
+    the process holding its lease. Leases of subreddits that moved to another member are released
+    first and taken over on the next heartbeat of the new owner, so no subreddit is processed twice
+    while processes join or leave. Members that stop sending heartbeats, e.g. after a crash, are
+    dropped after :code:`lease_timeout` seconds, and their subreddits are taken over.
+
+    The database must be on a local disk or a file system with working locks.
+
+    :param path: Path of the SQLite database shared by all processes
+    :param member: Unique name of this process. Defaults to the host name and process id.
+    :param heartbeat_interval: Seconds between two heartbeats
+    :param lease_timeout: Seconds a membership and its leases stay valid without a heartbeat
+    :param replicas: Points per member on the hash ring
+
+    **Example usage**::
+
+        bot = CommentBot(reddit=reddit, func_comment=parse, shard_size=100)
+        bot.start()
+
+        coordinator = Coordinator('/var/lib/bot/coordinator.db')
+        coordinator.start(get_subs(), on_change=bot.set_subreddits)
+    """
+
+    def __init__(self, path: str, member: str = None, heartbeat_interval: float = 5.0,
+                 lease_timeout: float = 20.0, replicas: int = 100):
+        if lease_timeout <= heartbeat_interval:
+            raise Exception('The lease timeout needs to be longer than the heartbeat interval.')
+
+        self.member = member if member is not None else '{}-{}'.format(socket.gethostname(),
+                                                                        os.getpid())
+        self._heartbeat_interval = heartbeat_interval
+        self._lease_timeout = lease_timeout
+        self._replicas = replicas
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None,
+                                   check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS members '
+                         '(member TEXT PRIMARY KEY, expires REAL NOT NULL)')
+        self._db.execute('CREATE TABLE IF NOT EXISTS leases '
+                         '(subreddit TEXT PRIMARY KEY, member TEXT NOT NULL, expires REAL NOT NULL)')
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None  # type: threading.Thread
+        self.subreddits = []  # type: List[str]
+        self.log = logging.getLogger(__name__)
+
+    def members(self) -> List[str]:
+        """Names of the live members"""
+        with self._lock:
+            rows = self._db.execute('SELECT member FROM members WHERE expires > ? ORDER BY member',
+                                    (time.time(),))
+            return [row[0] for row in rows]
+
+    def rebalance(self, subreddits: Iterable[str]) -> List[str]:
+        """
+        Send a heartbeat, release the leases of subreddits owned by other members and take the
+        free leases of the subreddits owned by this member.
+
+        :param subreddits: All subreddits, the same list in every process
+        :return: Subreddits this process holds the lease of
+        """
+        subs = sorted(set(s.lower() for s in subreddits))
+        with self._lock:
+            now = time.time()
+            expires = now + self._lease_timeout
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                self._db.execute('INSERT OR REPLACE INTO members (member, expires) VALUES (?, ?)',
+                                 (self.member, expires))
+                self._db.execute('DELETE FROM members WHERE expires <= ?', (now,))
+                self._db.execute('DELETE FROM leases WHERE expires <= ?', (now,))
+
+                members = [row[0] for row in self._db.execute('SELECT member FROM members')]
+                ring = HashRing(members, self._replicas)
+                wanted = set(s for s in subs if ring.owner(s) == self.member)
+
+                held = set(row[0] for row in self._db.execute(
+                    'SELECT subreddit FROM leases WHERE member = ?', (self.member,)))
+                self._db.executemany('DELETE FROM leases WHERE subreddit = ? AND member = ?',
+                                     [(s, self.member) for s in held - wanted])
+
+                taken = set(row[0] for row in self._db.execute('SELECT subreddit FROM leases'))
+                self._db.executemany('INSERT OR REPLACE INTO leases (subreddit, member, expires) '
+                                     'VALUES (?, ?, ?)',
+                                     [(s, self.member, expires) for s in wanted
+                                      if s in held or s not in taken])
+                self._db.execute('COMMIT')
+            except Exception:
+                self._db.execute('ROLLBACK')
+                raise
+
+            rows = self._db.execute('SELECT subreddit FROM leases WHERE member = ? '
+                                    'ORDER BY subreddit', (self.member,))
+            return [row[0] for row in rows]
+
+    def start(self, subreddits: Iterable[str], on_change: Callable[[List[str]], None]):
+        """
+        Rebalance every :code:`heartbeat_interval` seconds in a background thread, starting now.
+
+        :param subreddits: All subreddits, e.g. from :func:`~bottr.util.get_subs`
+        :param on_change: Called with the subreddits of this process whenever they changed, e.g.
+            :func:`~bottr.bot.AbstractBot.set_subreddits` of a bot.
+        """
+        subreddits = list(subreddits)
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, args=(subreddits, on_change),
+                                        name='coordinator-thread')
+        self._thread.start()
+
+    def _run(self, subreddits: List[str], on_change: Callable[[List[str]], None]):
+        while True:
+            try:
+                held = self.rebalance(subreddits)
+                if held != self.subreddits:
+                    self.log.info('{} now listens to {} of {} subreddits'
+                                  .format(self.member, len(held), len(subreddits)))
+                    self.subreddits = held
+                    on_change(held)
+            except Exception:
+                self.log.exception('Rebalancing {} failed'.format(self.member))
+
+            if self._stop_event.wait(self._heartbeat_interval):
+                return
+
+    def stop(self):
+        """Stop the heartbeats and leave, releasing all leases right away."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            self._db.execute('DELETE FROM leases WHERE member = ?', (self.member,))
+            self._db.execute('DELETE FROM members WHERE member = ?', (self.member,))
+            self._db.execute('COMMIT')
+        self.subreddits = []
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,360 @@
+import gzip
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, List, Dict
+
+fake_logger = logging.getLogger(__name__)
+
+"""Fullname prefixes of the reddit things the fake instance can serve"""
+PREFIXES = {'comment': 't1', 'submission': 't3', 'message': 't4'}
+
+
+class FakeThing(object):
+    """
+    Minimal stand-in for a PRAW model such as :class:`praw.models.Comment`.
+
+    All keyword arguments become attributes of the object, as do the items of :code:`_data`, like
+    in PRAW. Calls to :func:`~FakeThing.reply` are recorded in :attr:`FakeReddit.actions` instead
+    of being sent to reddit.
+    """
+
+    kind = None
+
+    def __init__(self, reddit: 'FakeReddit' = None, _data: dict = None, **attributes):
+        self._reddit = reddit
+        self.__dict__.update(_data or {})
+        self.__dict__.update(attributes)
+
+    @property
+    def fullname(self) -> str:
+        # Recorded things keep their fullname, e.g. comments in the inbox
+        name = vars(self).get('name')
+        return name if name is not None else '{}_{}'.format(PREFIXES[self.kind], self.id)
+
+    def reply(self, body: str):
+        """Record a reply to this thing."""
+        if self._reddit is not None:
+            self._reddit.record('reply', self, body)
+
+    def edit(self, body: str):
+        """Record an edit of this thing."""
+        if self._reddit is not None:
+            self._reddit.record('edit', self, body)
+
+    def __repr__(self):
+        return '{}(id={!r})'.format(self.__class__.__name__, self.id)
+
+
+class FakeComment(FakeThing):
+    kind = 'comment'
+
+    @property
+    def is_root(self) -> bool:
+        return self.parent_id.startswith('t3_')
+
+
+class FakeSubmission(FakeThing):
+    kind = 'submission'
+
+
+class FakeMessage(FakeThing):
+    kind = 'message'
+
+    def mark_read(self):
+        """Record marking this message as read."""
+        if self._reddit is not None:
+            self._reddit.record('mark_read', self)
+
+
+class FakeRedditor(object):
+    def __init__(self, reddit: 'FakeReddit', name: str):
+        self._reddit = reddit
+        self.name = name
+        self.fullname = 'u_{}'.format(name)
+
+    def message(self, subject: str, message: str):
+        """Record a private message to this redditor."""
+        self._reddit.record('message', self, subject, message)
+
+
+"""Model class for each kind of thing"""
+MODELS = {'comment': FakeComment, 'submission': FakeSubmission, 'message': FakeMessage}
+
+
+class FakeStream(object):
+    """Stream helper of a :class:`FakeSubreddit`, mirroring :class:`praw.models.reddit.subreddit.SubredditStream`."""
+
+    def __init__(self, reddit: 'FakeReddit', subreddits: Iterable[str]):
+        self._reddit = reddit
+        self._subs = set(s.lower() for s in subreddits)
+
+    def _accepts(self, item: FakeThing) -> bool:
+        return 'all' in self._subs or item.subreddit.lower() in self._subs
+
+    def comments(self, **stream_options):
+        """Yield the fake comments of the subreddits."""
+        return self._reddit.stream('comment', self._accepts, **stream_options)
+
+    def submissions(self, **stream_options):
+        """Yield the fake submissions of the subreddits."""
+        return self._reddit.stream('submission', self._accepts, **stream_options)
+
+
+class FakeSubreddit(object):
+    def __init__(self, reddit: 'FakeReddit', display_name: str):
+        self.display_name = display_name
+        self.stream = FakeStream(reddit, display_name.split('+'))
+
+
+class FakeInbox(object):
+    def __init__(self, reddit: 'FakeReddit'):
+        self._reddit = reddit
+
+    def stream(self, **stream_options):
+        """Yield the fake inbox messages."""
+        return self._reddit.stream('message', None, **stream_options)
+
+
+class FakeConfig(object):
+    def __init__(self, username: str = None):
+        self.username = username
+
+
+class FakeReddit(object):
+    """
+    Offline stand-in for :class:`praw.Reddit` that serves the streams used by the bots from
+    synthetic or recorded data.
+
+    :param comments: Comments served by :code:`subreddit(...).stream.comments()`
+    :param submissions: Submissions served by :code:`subreddit(...).stream.submissions()`
+    :param messages: Messages served by :code:`inbox.stream()`
+    :param rate: Items per second yielded by each stream. :code:`None` yields as fast as possible.
+    :param username: Name of the account, available as :code:`config.username`
+
+    Once a stream has yielded all of its items, it blocks (or yields :code:`None` if
+    :code:`pause_after` was given) until :func:`~FakeReddit.close` is called.
+
+    **Example usage**::
+
+        reddit = FakeReddit(comments=generate('comment', 1000, subreddits=['AskReddit']),
+                            rate=200)
+        bot = CommentBot(reddit=reddit, func_comment=parse, subreddits=['AskReddit'])
+        bot.start()
+    """
+
+    def __init__(self, comments: Iterable[FakeThing] = None,
+                 submissions: Iterable[FakeThing] = None,
+                 messages: Iterable[FakeThing] = None,
+                 rate: float = None,
+                 username: str = None):
+        self._items = {
+            'comment': list(comments or []),
+            'submission': list(submissions or []),
+            'message': list(messages or []),
+        }  # type: Dict[str, List[FakeThing]]
+        for items in self._items.values():
+            for item in items:
+                item._reddit = self
+
+        self._rate = rate
+        self.config = FakeConfig(username)
+        self._closed = threading.Event()
+        self._lock = threading.Lock()
+        self.inbox = FakeInbox(self)
+
+        # Time each item was yielded by a stream, keyed by fullname
+        self.emitted = {}  # type: Dict[str, float]
+
+        # Recorded write actions as (action, fullname, *args) tuples
+        self.actions = []  # type: List[tuple]
+
+        # Fullnames requested by each call of info()
+        self.info_calls = []  # type: List[List[str]]
+
+    @classmethod
+    def from_file(cls, path: str, rate: float = None) -> 'FakeReddit':
+        """
+        Create a fake instance from recorded items, stored as one JSON object per line.
+
+        Each object needs a :code:`kind` key (:code:`'comment'`, :code:`'submission'` or
+        :code:`'message'`). All other keys become attributes of the item. Files ending with
+        :code:`.gz` are read with gzip.
+
+        :param path: Path of the recording
+        :param rate: Items per second yielded by each stream
+        """
+        items = {'comment': [], 'submission': [], 'message': []}
+        for data in read_lines(path):
+            kind = data.pop('kind')
+            items[kind].append(MODELS[kind](**data))
+
+        return cls(comments=items['comment'],
+                   submissions=items['submission'],
+                   messages=items['message'],
+                   rate=rate)
+
+    def subreddit(self, display_name: str) -> FakeSubreddit:
+        return FakeSubreddit(self, display_name)
+
+    def redditor(self, name: str) -> FakeRedditor:
+        return FakeRedditor(self, name)
+
+    def info(self, fullnames: List[str] = None) -> Iterable[FakeThing]:
+        """Yield the items with the given fullnames. Each call is recorded in :attr:`info_calls`."""
+        with self._lock:
+            self.info_calls.append(list(fullnames))
+
+        wanted = set(fullnames)
+        for items in self._items.values():
+            for item in items:
+                if item.fullname in wanted:
+                    yield item
+
+    def record(self, action: str, thing: FakeThing, *args):
+        """Record a write action on :code:`thing`."""
+        with self._lock:
+            self.actions.append((action, thing.fullname) + args)
+
+    def _delay(self, item: FakeThing, count: int, start: float) -> float:
+        """
+        Seconds to wait before a stream yields :code:`item`.
+
+        :param item: Next item
+        :param count: Number of items the stream yielded before
+        :param start: :func:`time.perf_counter` when the stream started
+        """
+        if not self._rate:
+            return 0.0
+        return start + count / self._rate - time.perf_counter()
+
+    def close(self):
+        """Let all streams return once they have yielded their items."""
+        self._closed.set()
+
+    def stream(self, kind: str, accepts=None, pause_after: int = None):
+        """
+        Yield all items of :code:`kind` accepted by :code:`accepts`, paced by the configured rate.
+
+        :param kind: :code:`'comment'`, :code:`'submission'` or :code:`'message'`
+        :param accepts: Optional predicate selecting the items to yield
+        :param pause_after: Yield :code:`None` while idle, like :func:`praw.models.util.stream_generator`
+        """
+        start = time.perf_counter()
+        count = 0
+        for item in self._items[kind]:
+            if accepts is not None and not accepts(item):
+                continue
+
+            delay = self._delay(item, count, start)
+            if delay > 0:
+                time.sleep(delay)
+
+            count += 1
+            self.emitted[item.fullname] = time.perf_counter()
+            yield item
+
+        # Idle until closed, like a stream without new items
+        while not self._closed.wait(0.1):
+            if pause_after is not None:
+                yield None
+
+
+def wait_until(predicate: Callable[[], bool], timeout: float = 5.0) -> bool:
+    """
+    Poll :code:`predicate` until it holds or :code:`timeout` seconds have passed.
+
+    :return: Whether :code:`predicate` held
+    """
+    deadline = time.time() + timeout
+    while not predicate():
+        if time.time() >= deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@contextmanager
+def running(bot, reddit: FakeReddit):
+    """
+    Context manager running :code:`bot` on the fake instance :code:`reddit`. On exit, the streams
+    of :code:`reddit` are closed and the bot is stopped.
+
+    **Example usage**::
+
+        with running(bot, reddit):
+            wait_until(lambda: len(seen) == 10)
+            bot.set_subreddits(['a', 'b', 'c'])
+            wait_until(lambda: len(seen) == 20)
+    """
+    bot.start()
+    try:
+        yield bot
+    finally:
+        reddit.close()
+        bot.stop()
+
+
+def run_until(bot, reddit: FakeReddit, predicate: Callable[[], bool], timeout: float = 5.0) -> bool:
+    """
+    Run :code:`bot` on the fake instance :code:`reddit` until :code:`predicate` holds or
+    :code:`timeout` seconds have passed, then stop it, see :func:`running`.
+
+    :return: Whether :code:`predicate` held
+    """
+    with running(bot, reddit):
+        return wait_until(predicate, timeout)
+
+
+def read_lines(path: str) -> Iterable[dict]:
+    """
+    Yield the JSON objects of a file with one object per line, read with gzip if :code:`path`
+    ends with :code:`.gz`.
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        try:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        except (EOFError, ValueError):
+            # The last lines of a recording cut off by a crash are incomplete
+            fake_logger.warning('{} ends with an incomplete line'.format(path))
+
+
+def generate(kind: str, n: int, subreddits: Iterable[str] = ('test',),
+             body: str = 'Lorem ipsum dolor sit amet') -> List[FakeThing]:
+    """
+    Generate :code:`n` synthetic items of the given kind, spread round-robin over
+    :code:`subreddits`.
+
+    :param kind: :code:`'comment'`, :code:`'submission'` or :code:`'message'`
+    :param n: Number of items
+    :param subreddits: Subreddit names
+    :param body: Text of each item
+    :return: List of fake items
+    """
+    subreddits = list(subreddits)
+    now = time.time()
+    items = []
+    for i in range(n):
+        item_id = '{:x}'.format(i + 1)
+        attributes = {
+            'id': item_id,
+            'author': 'user{}'.format(i % 97),
+            'subreddit': subreddits[i % len(subreddits)],
+            'created_utc': now,
+        }
+        if kind == 'comment':
+            attributes.update(body=body, link_id='t3_{}'.format(item_id), parent_id='t3_{}'.format(item_id))
+        elif kind == 'submission':
+            attributes.update(title=body, selftext=body)
+        else:
+            attributes.update(subject=body, body=body)
+
+        attributes['name'] = '{}_{}'.format(PREFIXES[kind], item_id)
+        items.append(MODELS[kind](**attributes))
+
+    return items
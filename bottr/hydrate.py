@@ -0,0 +1,114 @@
+import logging
+from typing import Dict, Iterable, List
+
+import praw
+
+from bottr.cache import TTLCache
+
+"""Related things a :class:`Hydrator` can resolve, mapped to the attribute holding their fullname"""
+RELATIONS = {
+    'submission': 'link_id',
+    'subreddit': 'subreddit_id',
+    'parent': 'parent_id',
+}
+
+
+class Hydrator(object):
+    """
+    Fetches the things related to stream items in bulk, before the handlers run.
+
+    Handlers that read e.g. :code:`comment.submission.title` make one request per comment, since
+    the submission of a streamed comment is a lazy object. A hydrator collects the fullnames of
+    the related things of up to :code:`batch_size` items, fetches the ones it does not have
+    cached with :func:`praw.Reddit.info` in batches of 100, and attaches them to the items. Later
+    attribute access is answered from the fetched data.
+
+    :code:`'submission'` and :code:`'subreddit'` replace the attributes of the same name.
+    Parents are only cached, since :func:`praw.models.Comment.parent` is a method, use
+    :func:`~Hydrator.parent` to read them. Authors cannot be fetched by fullname and are not
+    supported.
+
+    :param fields: Related things the handlers need, keys of :data:`RELATIONS`
+    :param reddit: Reddit instance to fetch with. Defaults to the one of the items.
+    :param batch_size: Maximum number of items hydrated together
+    :param wait: Maximum number of seconds a bot waits for a batch to fill up
+    :param maxsize: Maximum number of related things to cache
+    :param ttl: Seconds a fetched thing stays cached
+
+    **Example usage**::
+
+        def parse(comment):
+            if 'banana' in comment.submission.title:
+                comment.reply('On topic.')
+
+        bot = CommentBot(..., func_comment=parse, hydrator=Hydrator(['submission']))
+    """
+
+    def __init__(self, fields: Iterable[str], reddit: praw.Reddit = None, batch_size: int = 100,
+                 wait: float = 0.2, maxsize: int = 10000, ttl: float = 60):
+        self.fields = list(fields)
+        for field in self.fields:
+            if field not in RELATIONS:
+                raise Exception('Cannot hydrate {}, use one of {}.'.format(field, sorted(RELATIONS)))
+
+        self._reddit = reddit
+        self.batch_size = batch_size
+        self.wait = wait
+        self._cache = TTLCache(maxsize, ttl)
+        self.log = logging.getLogger(__name__)
+
+    def related(self, item) -> Dict[str, str]:
+        """Fullnames of the related things of :code:`item`, keyed by field."""
+        # Read the loaded data directly, attribute access on a lazy object would fetch it
+        data = vars(item)
+        fullnames = {}
+        for field in self.fields:
+            fullname = data.get(RELATIONS[field])
+            if isinstance(fullname, str):
+                fullnames[field] = fullname
+        return fullnames
+
+    def get(self, fullname: str):
+        """Cached thing with the given fullname, or :code:`None`."""
+        return self._cache.get(fullname)
+
+    def parent(self, comment: praw.models.Comment):
+        """Parent of :code:`comment`, from the cache if it was hydrated."""
+        parent = self.get(vars(comment).get('parent_id'))
+        return parent if parent is not None else comment.parent()
+
+    def hydrate(self, items: List):
+        """
+        Fetch the missing related things of all :code:`items` and attach them.
+
+        :param items: PRAW objects, e.g. a batch of stream items
+        """
+        if not items:
+            return
+
+        related = [self.related(item) for item in items]
+        missing = sorted(set(fullname for fullnames in related for fullname in fullnames.values()
+                             if fullname not in self._cache))
+
+        reddit = self._reddit or items[0]._reddit
+        for i in range(0, len(missing), 100):
+            for thing in reddit.info(missing[i:i + 100]):
+                self._cache.set(thing.fullname, thing)
+
+        for item, fullnames in zip(items, related):
+            for field, fullname in fullnames.items():
+                thing = self._cache.get(fullname)
+                if thing is not None and field != 'parent':
+                    _attach(item, field, thing)
+
+        self.log.debug('Hydrated {} items with {} requests'
+                       .format(len(items), (len(missing) + 99) // 100))
+
+
+def _attach(item, attribute: str, thing):
+    if isinstance(getattr(type(item), attribute, None), property):
+        # E.g. Comment.submission, whose setter links the comment to the submission
+        setattr(item, attribute, thing)
+    else:
+        # Bypass __setattr__ of PRAW models, which turns names into lazy objects
+        vars(item)[attribute] = thing
@@ -0,0 +1,182 @@
+import hashlib
+import re
+import unicodedata
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from bottr.cache import TTLCache
+from bottr.records import loaded
+
+"""Attributes whose content identifies an item, per kind of thing"""
+MEMO_FIELDS = {
+    'comment': ('body',),
+    'submission': ('title', 'selftext', 'url'),
+    'message': ('subject', 'body'),
+}  # type: Dict[str, Tuple[str, ...]]
+
+"""Returned by :func:`Memo.get` for keys without a result"""
+MISSING = object()
+
+_separators = re.compile(r'[\W_]+')
+
+
+def _hashable(args: tuple):
+    """:code:`args` as part of a cache key, as their :func:`repr` if they are not hashable."""
+    try:
+        hash(args)
+        return args
+    except TypeError:
+        return repr(args)
+
+
+def normalize(text: str) -> str:
+    """
+    Normalize :code:`text` so that near-duplicates are equal: Unicode compatibility forms are
+    folded, case is ignored, and runs of whitespace and punctuation become a single space.
+    E.g. :code:`'This!!'` and :code:`' this'` are both :code:`'this'`.
+    """
+    text = unicodedata.normalize('NFKC', text).casefold()
+    return _separators.sub(' ', text).strip()
+
+
+class Memo(object):
+    """
+    Cache of handler results, keyed by a hash of the normalized content of the items, so duplicate
+    items such as copypasta, bot comments or "this" are only classified once.
+
+    A bot with a memo calls its handler only for the first item with a given content, and executes
+    the :class:`~bottr.actions.Action` objects it returned on every later item with the same
+    content, e.g. replying to each of them. Batch handlers are called with the items whose content
+    is not cached, each content once. Only memoize handlers that return their actions instead of
+    acting on the items themselves, and whose result only depends on the memoized fields.
+
+    Handlers may also use a memo directly, to reuse an expensive decision and act on each item
+    themselves, see :func:`~Memo.call`.
+
+    Results are cached per handler function and its arguments. At most :code:`maxsize` results are kept, the least
+    recently used are evicted first, and each expires :code:`ttl` seconds after it was computed.
+    Concurrent workers may compute the result of a new content more than once.
+
+    :param fields: Attributes to hash per kind, e.g. :code:`{'comment': ['body', 'subreddit']}`.
+        Kinds that are missing use :data:`MEMO_FIELDS`.
+    :param maxsize: Maximum number of cached results
+    :param ttl: Seconds a result stays valid. :code:`None` keeps results until they are evicted.
+    :param normalize: Function normalizing the text of each field, see :func:`normalize`
+
+    **Example usage**::
+
+        def classify(comment):
+            if expensive_score(comment.body) > 0.9:
+                return Reply('This comment is bananas.')
+
+        memo = Memo(maxsize=50000, ttl=3600)
+        bot = CommentBot(..., func_comment=classify, memo=memo)
+        ...
+        print(memo.hits, memo.misses, memo.hit_rate)
+    """
+
+    def __init__(self, fields: Dict[str, Iterable[str]] = None, maxsize: int = 10000,
+                 ttl: float = 3600, normalize: Callable[[str], str] = normalize):
+        self.fields = dict(MEMO_FIELDS)  # type: Dict[str, Tuple[str, ...]]
+        for kind, kind_fields in (fields or {}).items():
+            self.fields[kind] = tuple(kind_fields)
+
+        self._normalize = normalize
+        self._cache = TTLCache(maxsize, ttl)
+
+    def key(self, item, kind: str, func: Callable = None, args: tuple = ()) -> tuple:
+        """
+        Cache key of the result of :code:`func(item, *args)`.
+
+        :param item: PRAW object or :class:`~bottr.records.ItemRecord`
+        :param kind: :code:`'comment'`, :code:`'submission'` or :code:`'message'`
+        :param func: Function computing the result
+        :param args: Additional arguments of :code:`func`, e.g. the arguments of a
+            :class:`~bottr.rules.Rule`. Results for different arguments are cached separately.
+        """
+        data = loaded(item)
+        content = '\0'.join(self._normalize(str(data.get(field) or ''))
+                            for field in self.fields[kind])
+        return func, _hashable(args), kind, hashlib.sha1(content.encode('utf-8')).digest()
+
+    def get(self, key: tuple):
+        """Cached result of :code:`key`, or :data:`MISSING`."""
+        return self._cache.get(key, MISSING)
+
+    def set(self, key: tuple, result):
+        """Cache :code:`result` as the result of :code:`key`."""
+        self._cache.set(key, result)
+
+    def call(self, func: Callable, item, kind: str, *args, handler: Callable = None):
+        """
+        Result of :code:`func(item, *args)`, computed once per content of :code:`item`.
+
+        :param func: Function computing the result, e.g. a classifier
+        :param item: PRAW object or :class:`~bottr.records.ItemRecord`
+        :param kind: :code:`'comment'`, :code:`'submission'` or :code:`'message'`
+        :param args: Additional arguments of :code:`func`
+        :param handler: Function the results are cached for. Defaults to :code:`func`.
+        """
+        key = self.key(item, kind, handler if handler is not None else func, args)
+        result = self.get(key)
+        if result is MISSING:
+            result = func(item, *args)
+            self.set(key, result)
+        return result
+
+    def call_batch(self, func: Callable, items: List, kind: str, *args,
+                   handler: Callable = None) -> List:
+        """
+        Results of :code:`func(items, *args)`, which returns one result per item. :code:`func` is
+        only called with the items whose content is not cached, each content once, and not at all
+        if all are cached. Raises an exception if it returns another number of results.
+
+        :param func: Function computing a list of results
+        :param items: PRAW objects or :class:`~bottr.records.ItemRecord` objects
+        :param kind: :code:`'comment'`, :code:`'submission'` or :code:`'message'`
+        :param args: Additional arguments of :code:`func`
+        :param handler: Function the results are cached for. Defaults to :code:`func`.
+        """
+        keys = [self.key(item, kind, handler if handler is not None else func, args)
+                for item in items]
+        results = {}
+        missing = {}
+        for key, item in zip(keys, items):
+            result = self.get(key) if key not in missing else MISSING
+            if result is MISSING:
+                missing.setdefault(key, item)
+            else:
+                results[key] = result
+
+        if missing:
+            computed = list(func(list(missing.values()), *args))
+            if len(computed) != len(missing):
+                raise Exception('{} returned {} results for {} items.'
+                                .format(getattr(func, '__name__', func), len(computed),
+                                        len(missing)))
+            for key, result in zip(missing, computed):
+                results[key] = result
+                self.set(key, result)
+
+        return [results[key] for key in keys]
+
+    def clear(self):
+        """Forget all results, e.g. after the handler changed."""
+        self._cache.clear()
+
+    @property
+    def hits(self) -> int:
+        """Number of lookups that found a cached result"""
+        return self._cache.hits
+
+    @property
+    def misses(self) -> int:
+        """Number of lookups that computed the result"""
+        return self._cache.misses
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of lookups that found a cached result"""
+        return self._cache.hit_rate
+
+    def __len__(self) -> int:
+        return len(self._cache)
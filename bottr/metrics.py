@@ -0,0 +1,457 @@
+import bisect
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Tuple
+
+metrics_logger = logging.getLogger(__name__)
+
+"""Maximum number of queued jobs whose enqueue time is kept per bot"""
+MAX_ENQUEUED = 100000
+
+"""Default upper bounds of histogram buckets, in seconds"""
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+                   300.0)
+
+
+class MetricsServer(ThreadingMixIn, HTTPServer):
+    """HTTP server answering each request on its own thread"""
+    daemon_threads = True
+
+
+class CounterValue(object):
+    """Value of a counter for one set of label values"""
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def samples(self) -> List[Tuple[str, Dict, float]]:
+        return [('', {}, self._value)]
+
+
+class GaugeValue(CounterValue):
+    """Value of a gauge for one set of label values"""
+
+    def __init__(self):
+        super().__init__()
+        self._function = None  # type: Callable[[], float]
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    def set(self, value: float):
+        with self._lock:
+            self._value = value
+
+    def set_function(self, function: Callable[[], float]):
+        """
+        Read the value from :code:`function()` whenever it is collected, e.g. the size of a queue.
+        :code:`None` goes back to the last value set.
+        """
+        self._function = function
+
+    @property
+    def value(self) -> float:
+        function = self._function
+        return float(function()) if function is not None else self._value
+
+    def samples(self) -> List[Tuple[str, Dict, float]]:
+        return [('', {}, self.value)]
+
+
+class HistogramValue(object):
+    """Observations of a histogram for one set of label values"""
+
+    def __init__(self, buckets: Iterable[float]):
+        self._bounds = sorted(buckets)
+        self._counts = [0] * (len(self._bounds) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self._counts[bisect.bisect_left(self._bounds, value)] += 1
+            self._sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self._counts)
+
+    @property
+    def sum(self) -> float:
+        return self._sum
+
+    def percentile(self, p: float) -> float:
+        """
+        Upper bound of the bucket holding the :code:`p`-th percentile, between 0 and 100, or
+        :code:`None` if nothing was observed. Observations above the largest bucket give
+        :code:`float('inf')`.
+        """
+        with self._lock:
+            counts = list(self._counts)
+        total = sum(counts)
+        if total == 0:
+            return None
+
+        seen = 0
+        for bound, count in zip(self._bounds + [float('inf')], counts):
+            seen += count
+            if seen >= total * p / 100:
+                return bound
+        return float('inf')
+
+    def samples(self) -> List[Tuple[str, Dict, float]]:
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self._bounds + [float('inf')], counts):
+            cumulative += count
+            samples.append(('_bucket', {'le': _format_value(bound)}, cumulative))
+        samples.append(('_sum', {}, total))
+        samples.append(('_count', {}, cumulative))
+        return samples
+
+
+class Metric(ABC):
+    """
+    A named metric with one value per combination of label values.
+
+    Metrics without label names can be used directly, e.g. :code:`counter.inc()`. Otherwise, get
+    the value of a combination with :func:`~Metric.labels`, e.g.
+    :code:`counter.labels(bot='CommentBot', stream='comments').inc()`.
+
+    :param name: Metric name, e.g. :code:`'bottr_items_processed_total'`
+    :param help: Description of the metric
+    :param labelnames: Names of the labels
+    """
+
+    type = None
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # type: Dict[Tuple[str, ...], object]
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _new_value(self):
+        """Value of a new combination of label values"""
+        pass
+
+    def labels(self, **values):
+        """Value for the given label values, created on first use."""
+        if set(values) != set(self.labelnames):
+            raise Exception('Metric {} needs the labels {}.'.format(self.name, self.labelnames))
+
+        key = tuple(str(values[name]) for name in self.labelnames)
+        with self._lock:
+            value = self._values.get(key)
+            if value is None:
+                value = self._new_value()
+                self._values[key] = value
+            return value
+
+    def __getattr__(self, attr):
+        # Metrics without labels forward to their only value
+        if attr.startswith('_') or self.__dict__.get('labelnames'):
+            raise AttributeError(attr)
+        return getattr(self.labels(), attr)
+
+    def collect(self) -> List[Tuple[str, Dict, float]]:
+        """List of :code:`(name, labels, value)` samples"""
+        with self._lock:
+            values = list(self._values.items())
+
+        samples = []
+        for key, value in values:
+            labels = dict(zip(self.labelnames, key))
+            for suffix, extra, sample in value.samples():
+                samples.append((self.name + suffix, dict(labels, **extra), sample))
+        return samples
+
+
+class Counter(Metric):
+    """Value that only goes up, e.g. the number of processed items"""
+    type = 'counter'
+
+    def _new_value(self):
+        return CounterValue()
+
+
+class Gauge(Metric):
+    """Value that goes up and down, e.g. the number of queued items"""
+    type = 'gauge'
+
+    def _new_value(self):
+        return GaugeValue()
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values, e.g. handler times, counted in buckets.
+
+    :param buckets: Upper bounds of the buckets
+    """
+    type = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new_value(self):
+        return HistogramValue(self.buckets)
+
+
+class Registry(object):
+    """
+    Collection of metrics, rendered in the Prometheus text format by :func:`~Registry.render`.
+
+    Asking for a metric that already exists returns the existing one, so several bots can share
+    a registry and tell their values apart by label.
+    """
+
+    def __init__(self):
+        self._metrics = {}  # type: Dict[str, Metric]
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args) -> Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, *args)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls):
+                raise Exception('Metric {} is a {}.'.format(name, metric.type))
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labelnames, buckets)
+
+    def get(self, name: str) -> Metric:
+        """Metric called :code:`name`, or :code:`None`"""
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+
+        lines = []
+        for metric in metrics:
+            lines.append('# HELP {} {}'.format(metric.name, metric.help))
+            lines.append('# TYPE {} {}'.format(metric.name, metric.type))
+            for name, labels, value in metric.collect():
+                lines.append('{}{} {}'.format(name, _format_labels(labels), _format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port: int = 9120, host: str = '127.0.0.1') -> MetricsServer:
+        """
+        Serve :func:`~Registry.render` over HTTP on a daemon thread, e.g. for Prometheus to scrape.
+
+        :param port: Port to listen on, 0 picks a free one
+        :param host: Address to listen on. Defaults to local connections only.
+        :return: The server. Call :code:`shutdown()` on it to stop serving.
+        """
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                metrics_logger.debug(format % args)
+
+        server = MetricsServer((host, port), Handler)
+        thread = threading.Thread(name='metrics-http-thread', target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        metrics_logger.info('Serving metrics on http://{}:{}/metrics'
+                            .format(host, server.server_address[1]))
+        return server
+
+
+"""Registry used by all bots that are not given one"""
+default_registry = Registry()
+
+
+def _format_labels(labels: Dict) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(k, str(v).replace('\\', r'\\').replace('"', r'\"')
+                                           .replace('\n', r'\n'))
+                          for k, v in labels.items()) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class EnqueueTimes(object):
+    """
+    Time each queued job was put into its queue, to observe how long it waited.
+
+    Jobs are identified by :code:`key(job)`, so a job that is stored and loaded again as another
+    object, e.g. by a :class:`~bottr.queues.SQLiteQueue`, is still found. At most
+    :code:`maxsize` times are kept, the oldest are forgotten first, so jobs that are never taken,
+    e.g. because they were abandoned, do not pile up.
+
+    :param key: Function identifying a job. Defaults to its :func:`id`.
+    :param maxsize: Maximum number of times kept
+    """
+
+    def __init__(self, key: Callable[[Any], Hashable] = id, maxsize: int = MAX_ENQUEUED):
+        self._key = key
+        self._maxsize = maxsize
+        self._times = OrderedDict()  # type: OrderedDict
+        self._lock = threading.Lock()
+
+    def add(self, job):
+        """Remember that :code:`job` was queued now."""
+        with self._lock:
+            self._times[self._key(job)] = time.monotonic()
+            while len(self._times) > self._maxsize:
+                self._times.popitem(last=False)
+
+    def pop(self, job) -> float:
+        """Forget :code:`job` and return the :func:`time.monotonic` it was queued at, or :code:`None`."""
+        with self._lock:
+            return self._times.pop(self._key(job), None)
+
+    def __len__(self) -> int:
+        return len(self._times)
+
+
+class StreamMetrics(object):
+    """
+    Metrics of one stream of a bot, labeled with the bot and stream name. Created by
+    :func:`BotMetrics.stream`.
+    """
+
+    def __init__(self, registry: Registry, bot: str, stream: str, enqueued: EnqueueTimes):
+        labelnames = ('bot', 'stream')
+        labels = {'bot': bot, 'stream': stream}
+        self._enqueued = enqueued
+
+        self.received = registry.counter('bottr_items_received_total',
+                                         'New items yielded by the stream', labelnames).labels(**labels)
+        self.processed = registry.counter('bottr_items_processed_total',
+                                          'Items processed without an error', labelnames).labels(**labels)
+        self.failed = registry.counter('bottr_items_failed_total',
+                                       'Items whose handler raised an exception',
+                                       labelnames).labels(**labels)
+        self.dropped = registry.counter('bottr_items_dropped_total',
+                                        'Items dropped from the full queue',
+                                        labelnames).labels(**labels)
+        self.spilled = registry.counter('bottr_items_spilled_total',
+                                        'Items spilled to disk from the full queue',
+                                        labelnames).labels(**labels)
+        self.retries = registry.counter('bottr_stream_retries_total',
+                                        'Restarts of the stream after an error',
+                                        labelnames).labels(**labels)
+        self.queue_depth = registry.gauge('bottr_queue_depth', 'Items waiting in the queue',
+                                          labelnames).labels(**labels)
+        self.busy_workers = registry.gauge('bottr_busy_workers', 'Workers running a handler',
+                                           labelnames).labels(**labels)
+        self.workers = registry.gauge('bottr_workers', 'Worker threads polling the queue',
+                                      labelnames).labels(**labels)
+        self.lag = registry.histogram('bottr_stream_lag_seconds',
+                                      'Age of items when the stream yields them',
+                                      labelnames).labels(**labels)
+        self.queue_wait = registry.histogram('bottr_queue_wait_seconds',
+                                             'Time items spend in the queue',
+                                             labelnames).labels(**labels)
+        self.handler_time = registry.histogram('bottr_handler_seconds',
+                                               'Time spent in handlers, per item or batch',
+                                               labelnames).labels(**labels)
+
+    def item_received(self, item):
+        """Count a new item of the stream and observe its age, if it has a creation time."""
+        self.received.inc()
+        created = vars(item).get('created_utc')
+        if created is not None:
+            self.lag.observe(max(0.0, time.time() - created))
+
+    def job_queued(self, job):
+        self._enqueued.add(job)
+
+    def job_dropped(self, job):
+        self._enqueued.pop(job)
+        self.dropped.inc()
+
+    def job_spilled(self, job):
+        # The job is loaded again later, its wait includes the time on disk
+        self.spilled.inc()
+
+    def job_dequeued(self, job):
+        queued = self._enqueued.pop(job)
+        if queued is not None:
+            self.queue_wait.observe(time.monotonic() - queued)
+
+    def handler_started(self) -> float:
+        self.busy_workers.inc()
+        return time.monotonic()
+
+    def handler_finished(self, started: float, n_items: int = 1, failed: bool = False):
+        self.busy_workers.dec()
+        self.handler_time.observe(time.monotonic() - started)
+        (self.failed if failed else self.processed).inc(n_items)
+
+
+class BotMetrics(object):
+    """
+    Metrics of a bot, with one :class:`StreamMetrics` per stream.
+
+    :param registry: Registry to create the metrics in
+    :param bot: Bot name, used as label
+    :param job_key: Function identifying a queued job, also after it was stored and loaded
+        again, see :class:`EnqueueTimes`
+    """
+
+    def __init__(self, registry: Registry, bot: str, job_key: Callable[[Any], Hashable] = id):
+        self.registry = registry
+        self._bot = bot
+
+        # Shared by all streams of the bot, since a queue may be fed by several streams
+        self._enqueued = EnqueueTimes(job_key)
+        self._streams = {}  # type: Dict[str, StreamMetrics]
+        self._lock = threading.Lock()
+
+    def stream(self, name: str) -> StreamMetrics:
+        with self._lock:
+            metrics = self._streams.get(name)
+            if metrics is None:
+                metrics = StreamMetrics(self.registry, self._bot, name, self._enqueued)
+                self._streams[name] = metrics
+            return metrics
@@ -0,0 +1,204 @@
+import logging
+import threading
+from queue import Full, Queue
+from typing import Callable, List
+
+from bottr.metrics import StreamMetrics
+from bottr.queues import abandon
+
+
+class AutoscalePolicy(object):
+    """
+    Bounds and thresholds of a worker pool that follows the load of its queue, see
+    :class:`WorkerPool`.
+
+    Every :code:`interval` seconds, the pool grows by half its size (at least one worker, at most
+    up to :code:`max_jobs`) if more than :code:`max_depth` jobs per worker are waiting, or if jobs
+    waited :code:`max_wait` seconds on average since the last check. Workers that did not get a
+    job for :code:`idle_timeout` seconds retire, down to :code:`min_jobs`.
+
+    :param min_jobs: Number of workers the pool starts with and never goes below
+    :param max_jobs: Maximum number of workers
+    :param max_depth: Queued jobs per worker above which the pool grows
+    :param max_wait: Average queue wait in seconds above which the pool grows. :code:`None` only
+        looks at the queue depth.
+    :param idle_timeout: Seconds a worker waits for a job before it retires
+    :param interval: Seconds between two checks of the queue
+    """
+
+    def __init__(self, min_jobs: int = 1, max_jobs: int = 16, max_depth: float = 2.0,
+                 max_wait: float = 1.0, idle_timeout: float = 30.0, interval: float = 1.0):
+        if min_jobs < 1:
+            raise Exception('You need at least one worker thread.')
+
+        if max_jobs < min_jobs:
+            raise Exception('max_jobs must not be smaller than min_jobs.')
+
+        self.min_jobs = min_jobs
+        self.max_jobs = max_jobs
+        self.max_depth = max_depth
+        self.max_wait = max_wait
+        self.idle_timeout = idle_timeout
+        self.interval = interval
+
+    def desired(self, n_workers: int, depth: int, wait: float = None) -> int:
+        """
+        Number of workers the pool should have.
+
+        :param n_workers: Current number of workers
+        :param depth: Number of queued jobs
+        :param wait: Average queue wait since the last check, :code:`None` if no job was dequeued
+        """
+        backlog = depth > self.max_depth * n_workers
+        slow = self.max_wait is not None and wait is not None and wait > self.max_wait
+        if backlog or slow:
+            return min(self.max_jobs, n_workers + max(1, n_workers // 2))
+        return max(self.min_jobs, n_workers)
+
+    def may_retire(self, n_workers: int) -> bool:
+        """Check whether one of :code:`n_workers` idle workers may retire."""
+        return n_workers > self.min_jobs
+
+
+class WorkerPool(object):
+    """
+    Worker threads of one queue, scaled between the bounds of an :class:`AutoscalePolicy`.
+
+    Without a policy, the pool keeps the workers it was started with. With a policy,
+    :func:`~WorkerPool.run` adds workers while the queue is backed up, and idle workers ask
+    :func:`~WorkerPool.retire` whether they may exit, which they only do between jobs.
+
+    :param name: Prefix of the worker names
+    :param jobs: Queue the workers poll
+    :param create: Function creating an unstarted worker, called as
+        :code:`create(name, retire, idle_timeout)`
+    :param policy: Autoscaling policy, :code:`None` for a fixed pool
+    :param metrics: Metrics of the stream feeding the queue, used for the queue wait and to
+        report the pool size
+    """
+
+    def __init__(self, name: str, jobs: Queue, create: Callable, policy: AutoscalePolicy = None,
+                 metrics: StreamMetrics = None):
+        self._name = name
+        self._jobs = jobs
+        self._create = create
+        self._policy = policy
+        self._metrics = metrics
+        self._lock = threading.Lock()
+        self._size = 0
+        self._created = 0
+        self._wait = (0.0, 0)
+        self.threads = []  # type: List[threading.Thread]
+        self.log = logging.getLogger(__name__)
+
+    @property
+    def size(self) -> int:
+        """Number of workers that did not retire"""
+        return self._size
+
+    def start(self, n_workers: int = None):
+        """
+        Start the initial workers.
+
+        :param n_workers: Number of workers. Defaults to :code:`min_jobs` of the policy.
+        """
+        if n_workers is None:
+            n_workers = self._policy.min_jobs
+        for _ in range(n_workers):
+            self._add()
+
+    def _add(self):
+        with self._lock:
+            name = '{}-t-{}'.format(self._name, self._created)
+            self._created += 1
+            self._size += 1
+            self._report()
+
+        if self._policy is not None:
+            t = self._create(name, self.retire, self._policy.idle_timeout)
+        else:
+            t = self._create(name, None, None)
+        t.start()
+
+        # Forget retired workers, so a long-running pool does not collect them
+        self.threads = [w for w in self.threads if w.is_alive()] + [t]
+
+    def retire(self, worker: threading.Thread) -> bool:
+        """
+        Called by idle workers. Returns whether :code:`worker` may exit, in which case it no longer
+        counts towards the size of the pool.
+        """
+        with self._lock:
+            if not self._policy.may_retire(self._size):
+                return False
+            self._size -= 1
+            self._report()
+
+        self.log.debug('{} retired, {} workers left'.format(worker.name, self._size))
+        return True
+
+    def _report(self):
+        if self._metrics is not None:
+            self._metrics.workers.set(self._size)
+
+    def _queue_wait(self) -> float:
+        """Average queue wait since the last call, :code:`None` if no job was dequeued."""
+        if self._metrics is None:
+            return None
+
+        total, count = self._metrics.queue_wait.sum, self._metrics.queue_wait.count
+        last_total, last_count = self._wait
+        self._wait = (total, count)
+        if count <= last_count:
+            return None
+        return (total - last_total) / (count - last_count)
+
+    def scale(self):
+        """Check the queue once and add the workers the policy asks for."""
+        n_workers = self._size
+        desired = self._policy.desired(n_workers, self._jobs.qsize(), self._queue_wait())
+        if desired > n_workers:
+            self.log.debug('Growing {} from {} to {} workers'.format(self._name, n_workers, desired))
+            for _ in range(desired - n_workers):
+                self._add()
+
+    def run(self, done: threading.Event):
+        """Scale the pool every :code:`interval` seconds until :code:`done` is set."""
+        while not done.wait(self._policy.interval):
+            self.scale()
+
+    def stop(self, abandon: threading.Event = None):
+        """
+        Stop all workers once the jobs queued before are done, and wait for them.
+
+        :param abandon: Event that, once set, removes the jobs that were not taken yet instead,
+            see :func:`~bottr.queues.abandon`. Running jobs are finished either way.
+        """
+        abandoned = False
+
+        # One sentinel per worker that may still poll, workers retiring meanwhile leave theirs
+        for _ in self.threads:
+            while True:
+                if abandon is not None and abandon.is_set() and not abandoned:
+                    abandoned = self._abandon()
+                try:
+                    self._jobs.put(None, timeout=0.1)
+                    break
+                except Full:
+                    pass
+
+        for t in self.threads:
+            while t.is_alive():
+                if abandon is not None and abandon.is_set() and not abandoned:
+                    abandoned = self._abandon()
+                t.join(0.1)
+
+        with self._lock:
+            self._size = 0
+            self._report()
+
+    def _abandon(self) -> bool:
+        n = abandon(self._jobs)
+        if n > 0:
+            self.log.warning('{} abandoned {} queued jobs'.format(self._name, n))
+        return True
@@ -0,0 +1,49 @@
+from typing import Dict, Tuple
+
+"""Attributes copied into a snapshot for each kind of thing"""
+SNAPSHOT_FIELDS = {
+    'comment': ('id', 'name', 'body', 'author', 'subreddit', 'created_utc', 'link_id', 'parent_id',
+                'permalink', 'score'),
+    'submission': ('id', 'name', 'title', 'selftext', 'url', 'author', 'subreddit', 'created_utc',
+                   'permalink', 'score', 'is_self'),
+    'message': ('id', 'name', 'subject', 'body', 'author', 'created_utc', 'was_comment'),
+}  # type: Dict[str, Tuple[str, ...]]
+
+
+class Snapshot(object):
+    """
+    Picklable, trimmed copy of a reddit thing that can be sent to another process.
+
+    Only plain values are kept. Related objects such as :code:`author` or :code:`subreddit` are
+    reduced to their names. Attributes missing on the original thing are :code:`None`.
+    """
+
+    def __init__(self, kind: str, **fields):
+        self.kind = kind
+        self.__dict__.update(fields)
+
+    @property
+    def fullname(self) -> str:
+        return self.name
+
+    def __repr__(self):
+        return 'Snapshot({}, id={!r})'.format(self.kind, self.id)
+
+
+def _plain(value):
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def snapshot(thing, kind: str) -> Snapshot:
+    """
+    Create a :class:`Snapshot` of a PRAW object.
+
+    Only attributes already loaded are read, so taking a snapshot never triggers a request.
+
+    :param thing: PRAW object, e.g. a :class:`praw.models.Comment`
+    :param kind: :code:`'comment'`, :code:`'submission'` or :code:`'message'`
+    """
+    data = vars(thing)
+    return Snapshot(kind, **{f: _plain(data.get(f)) for f in SNAPSHOT_FIELDS[kind]})
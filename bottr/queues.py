@@ -0,0 +1,944 @@
+import base64
+import heapq
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque, OrderedDict
+from queue import Empty, Queue, Full
+from typing import Callable, Dict, Hashable, Any, List, Tuple
+
+from bottr.records import loaded
+from bottr.retry import RetryPolicy
+
+queues_logger = logging.getLogger(__name__)
+
+
+class WeightedQueue(Queue):
+    """
+    A queue multiplexing several lanes, e.g. one per stream, into one consumer side.
+
+    Items are put into the lane :code:`key(item)`. :func:`~queue.Queue.get` picks the next lane
+    by smooth weighted round robin over all non-empty lanes, so a lane with weight 3 is served three
+    times as often as a lane with weight 1 while both have items, and an idle lane leaves its
+    share to the others.
+
+    Each lane holds at most :code:`lane_size` items. Putting into a full lane blocks only that
+    producer. All lanes together hold at most :code:`maxsize` items. :code:`None` is the stop
+    sentinel of the :class:`~bottr.bot.BotQueueWorker` threads. It is only returned once all lanes
+    are empty.
+
+    :param key: Function returning the lane of an item
+    :param weights: Weight of each lane. Lanes without a weight get :code:`default_weight`.
+    :param lane_size: Maximum number of items per lane, :code:`0` for no limit
+    :param default_weight: Weight of lanes missing in :code:`weights`
+    :param maxsize: Maximum number of items in all lanes, :code:`0` for no limit
+    """
+
+    def __init__(self, key: Callable[[Any], Hashable],
+                 weights: Dict[Hashable, int] = None,
+                 lane_size: int = 0,
+                 default_weight: int = 1,
+                 maxsize: int = 0):
+        self._key = key
+        self._weights = dict(weights or {})
+        self._lane_size = lane_size
+        self._default_weight = default_weight
+        super().__init__(maxsize)
+
+    def _init(self, maxsize):
+        self._lanes = {}  # type: Dict[Hashable, deque]
+        self._current = {}  # type: Dict[Hashable, int]
+        self._sentinels = 0
+        self._size = 0
+
+    def _qsize(self):
+        return self._size + self._sentinels
+
+    def _lane_full(self, item) -> bool:
+        if item is None:
+            return False
+        if 0 < self.maxsize <= self._size:
+            return True
+        if self._lane_size <= 0:
+            return False
+        lane = self._lanes.get(self._key(item))
+        return lane is not None and len(lane) >= self._lane_size
+
+    def weight(self, lane: Hashable) -> int:
+        return self._weights.get(lane, self._default_weight)
+
+    def put(self, item, block=True, timeout=None):
+        """
+        Put :code:`item` into its lane. Blocks while the lane is full, see :func:`queue.Queue.put`.
+        """
+        with self.not_full:
+            if self._lane_full(item):
+                if not block:
+                    raise Full
+                elif timeout is None:
+                    while self._lane_full(item):
+                        self.not_full.wait()
+                elif timeout < 0:
+                    raise ValueError("'timeout' must be a non-negative number")
+                else:
+                    endtime = time.monotonic() + timeout
+                    while self._lane_full(item):
+                        remaining = endtime - time.monotonic()
+                        if remaining <= 0.0:
+                            raise Full
+                        self.not_full.wait(remaining)
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def _put(self, item):
+        if item is None:
+            self._sentinels += 1
+            return
+
+        lane = self._key(item)
+        if lane not in self._lanes:
+            self._lanes[lane] = deque()
+            self._current[lane] = 0
+        self._lanes[lane].append(item)
+        self._size += 1
+
+    def _candidates(self) -> List[Hashable]:
+        """Lanes the next item may be taken from"""
+        return [lane for lane, items in self._lanes.items() if items]
+
+    def _next_lane(self) -> Hashable:
+        """Smooth weighted round robin over the candidate lanes."""
+        total = 0
+        best = None
+        for lane in self._candidates():
+            weight = self.weight(lane)
+            self._current[lane] += weight
+            total += weight
+            if best is None or self._current[lane] > self._current[best]:
+                best = lane
+        self._current[best] -= total
+        return best
+
+    def _get(self):
+        if self._size == 0:
+            self._sentinels -= 1
+            return None
+
+        item = self._pop(self._next_lane())
+        self._size -= 1
+
+        # Producers wait for different lanes, so wake all of them
+        self.not_full.notify_all()
+        return item
+
+    def _pop(self, lane: Hashable):
+        return self._lanes[lane].popleft()
+
+    def abandon(self) -> int:
+        """Remove all items that were not taken yet, see :func:`abandon`."""
+        with self.mutex:
+            n = self._size
+            for lane in self._lanes.values():
+                lane.clear()
+            self._size = 0
+            _tasks_abandoned(self, n)
+        return n
+
+    def lane_sizes(self) -> Dict[Hashable, int]:
+        """Number of queued items per lane"""
+        with self.mutex:
+            return {lane: len(items) for lane, items in self._lanes.items()}
+
+
+def subreddit_of(item) -> str:
+    """Lowercase name of the subreddit of :code:`item`, or :code:`None`, e.g. for private messages."""
+    subreddit = loaded(item).get('subreddit')
+    return str(subreddit).lower() if subreddit is not None else None
+
+
+class FairQueue(WeightedQueue):
+    """
+    A queue serving the items of many subreddits fairly, with optional priority lanes.
+
+    Items are grouped by :code:`priority(item)` and by :code:`key(item)`, the subreddit by
+    default. :func:`~queue.Queue.get` takes the next item from the highest priority that has
+    items, and within it picks the subreddit by smooth weighted round robin, see
+    :class:`WeightedQueue`. A flood of items from one subreddit thus only delays the items of the
+    other subreddits by one item per round, instead of by all flooded items ahead of them.
+    Higher priorities are always served first, so keep them for rare, important items, such as
+    mentions or mod mail.
+
+    Putting never blocks, so the items behind a flood in the same stream reach their lanes right
+    away. Instead, items are shed: once a lane holds more than :code:`lane_size` items, its oldest
+    item is dropped, and once all lanes hold more than :code:`maxsize` items, the oldest item of
+    the largest lane of the lowest priority is dropped, which may be the new item.
+    :attr:`dropped` counts the shed items, and :code:`on_drop(item)` is called for each of them.
+
+    Lanes are created as items arrive and removed once they ran empty, so taking an item costs
+    time in the number of subreddits with queued items, not all subreddits ever seen. Lanes are
+    keyed by :code:`(priority, key)` tuples.
+
+    :param key: Function returning the subreddit, or another flow, of an item. Defaults to
+        :func:`subreddit_of`.
+    :param weights: Weight of each subreddit. Subreddits without a weight get
+        :code:`default_weight`.
+    :param priority: Function returning the priority of an item, higher first. :code:`None`
+        gives all items the same priority.
+    :param lane_size: Maximum number of items per subreddit and priority, :code:`0` for no limit
+    :param maxsize: Maximum number of items in all lanes, :code:`0` for no limit
+    :param default_weight: Weight of subreddits missing in :code:`weights`
+    :param on_drop: Function called with each shed item
+    """
+
+    def __init__(self, key: Callable[[Any], Hashable] = subreddit_of,
+                 weights: Dict[Hashable, int] = None,
+                 priority: Callable[[Any], float] = None,
+                 lane_size: int = 0,
+                 maxsize: int = 0,
+                 default_weight: int = 1,
+                 on_drop: Callable[[Any], None] = None):
+        self._flow = key
+        self._priority = priority
+        self._on_drop = on_drop
+        self.dropped = 0
+        super().__init__(key=self._lane, weights=weights, lane_size=lane_size,
+                         default_weight=default_weight, maxsize=maxsize)
+
+    def put(self, item, block=True, timeout=None):
+        """
+        Put :code:`item` into its lane, shedding an item if the lane or the queue is full. Never
+        blocks, the arguments are only accepted for compatibility with :func:`queue.Queue.put`.
+        """
+        with self.not_full:
+            self._put(item)
+            self.unfinished_tasks += 1
+            if item is not None:
+                lane = self._lane(item)
+                if 0 < self._lane_size < len(self._lanes[lane]):
+                    self._shed(lane)
+                elif 0 < self.maxsize < self._size:
+                    self._shed(self._largest_lane())
+            self.not_empty.notify()
+
+    def _largest_lane(self) -> tuple:
+        """Largest lane of the lowest priority"""
+        return min(self._lanes, key=lambda lane: (lane[0], -len(self._lanes[lane])))
+
+    def _shed(self, lane: tuple):
+        """Drop the oldest item of :code:`lane`. Must hold the mutex."""
+        item = self._pop(lane)
+        self._size -= 1
+        self.dropped += 1
+        _tasks_abandoned(self, 1)
+        if self._on_drop is not None:
+            self._on_drop(item)
+
+    def _lane(self, item) -> tuple:
+        return (self._priority(item) if self._priority is not None else 0), self._flow(item)
+
+    def weight(self, lane: tuple) -> int:
+        return self._weights.get(lane[1], self._default_weight)
+
+    def _candidates(self) -> List[tuple]:
+        lanes = super()._candidates()
+        top = max(lane[0] for lane in lanes)
+        return [lane for lane in lanes if lane[0] == top]
+
+    def _pop(self, lane: tuple):
+        items = self._lanes[lane]
+        item = items.popleft()
+
+        # Subreddits come and go, forget the lanes that ran empty
+        if not items:
+            del self._lanes[lane]
+            del self._current[lane]
+        return item
+
+
+"""Overflow policies of :class:`OverflowQueue`"""
+BLOCK = 'block'
+DROP_OLDEST = 'drop_oldest'
+DROP_PRIORITY = 'drop_priority'
+SPILL = 'spill'
+POLICIES = (BLOCK, DROP_OLDEST, DROP_PRIORITY, SPILL)
+
+
+def abandon(q: Queue) -> int:
+    """
+    Remove the items of :code:`q` that were not taken yet, so its workers stop without processing
+    them. Stop sentinels are kept. Queues that keep items on disk keep them for the next run, see
+    :func:`OverflowQueue.abandon` and :func:`SQLiteQueue.abandon`.
+
+    :param q: A :class:`queue.Queue` or one of the queues of this module
+    :return: Number of abandoned items
+    """
+    if hasattr(q, 'abandon'):
+        return q.abandon()
+
+    with q.mutex:
+        sentinels = sum(1 for item in q.queue if item is None)
+        n = len(q.queue) - sentinels
+        q.queue.clear()
+        q.queue.extend([None] * sentinels)
+        _tasks_abandoned(q, n)
+    return n
+
+
+def _tasks_abandoned(q: Queue, n: int):
+    """Count :code:`n` removed items of :code:`q` as done. Must hold the mutex."""
+    q.unfinished_tasks -= n
+    if q.unfinished_tasks <= 0:
+        q.all_tasks_done.notify_all()
+    q.not_full.notify_all()
+
+
+def _pickle_dump(item) -> str:
+    return base64.b64encode(pickle.dumps(item)).decode('ascii')
+
+
+def _pickle_load(lines: List[str]) -> List:
+    return [pickle.loads(base64.b64decode(line)) for line in lines]
+
+
+class SpillBuffer(object):
+    """
+    File of text lines, appended to and read back in order. Lines left over from a previous run
+    are read first. The file is truncated whenever all lines were read.
+
+    :param path: Path of the file
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, 'a+')
+        self._file.seek(0)
+        self._offset = 0
+        self._size = 0
+        while self._file.readline():
+            self._size += 1
+
+    def append(self, line: str):
+        self._file.seek(0, os.SEEK_END)
+        self._file.write(line + '\n')
+        self._file.flush()
+        self._size += 1
+
+    def peek(self, n: int) -> List[str]:
+        """Read up to :code:`n` of the oldest lines, without removing them."""
+        self._file.seek(self._offset)
+        lines = []
+        while len(lines) < n:
+            line = self._file.readline()
+            if not line:
+                break
+            lines.append(line.rstrip('\n'))
+        return lines
+
+    def drop(self, n: int):
+        """Remove the :code:`n` oldest lines."""
+        self._file.seek(self._offset)
+        for _ in range(n):
+            if not self._file.readline():
+                break
+        self._offset = self._file.tell()
+        self._size -= n
+
+        if self._size <= 0:
+            self._file.truncate(0)
+            self._offset = 0
+            self._size = 0
+
+    def read(self, n: int) -> List[str]:
+        """Read and remove up to :code:`n` of the oldest lines."""
+        lines = self.peek(n)
+        self.drop(len(lines))
+        return lines
+
+    def close(self):
+        self._file.close()
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class _LoadingQueue(Queue, ABC):
+    """
+    Base of the queues keeping items as text, which are turned back into items with a
+    :code:`load(lines)` function, e.g. fetching them by fullname.
+
+    Loading may make requests, so it is done without holding the mutex, and producers and other
+    consumers are not blocked meanwhile. If :code:`load` raises, the error is logged, the items stay
+    stored, and loading is retried after the delay of :code:`retry`. Consumers wait meanwhile.
+
+    Subclasses implement :func:`_needs_load`, :func:`_next_batch` and :func:`_loaded`, which are
+    called with the mutex held.
+
+    :param maxsize: Maximum number of items in memory, :code:`0` for no limit
+    :param load: Function returning the items of a list of lines, with :code:`None` for items that
+        are no longer available
+    :param retry: Backoff for loading again after :code:`load` failed. :code:`None` waits 1 to 60
+        seconds.
+    """
+
+    def __init__(self, maxsize: int, load: Callable[[List[str]], List], retry: RetryPolicy):
+        self._load = load
+        self._load_retry = retry if retry is not None else RetryPolicy(base=1.0, max_delay=60.0)
+        self._load_failures = 0
+        self._load_at = 0.0
+        self._loading = False
+        super().__init__(maxsize)
+
+    @abstractmethod
+    def _needs_load(self) -> bool:
+        """Whether the next item has to be loaded"""
+
+    @abstractmethod
+    def _next_batch(self) -> Tuple[Any, List[str]]:
+        """Batch of stored items to load next, and their lines"""
+
+    @abstractmethod
+    def _loaded(self, batch, items: List):
+        """Take the loaded :code:`items` of :code:`batch`, with :code:`None` for missing items."""
+
+    def _load_stored(self):
+        """Load stored items until the next item is in memory. Must hold the mutex."""
+        while not self._loading and self._needs_load() and time.monotonic() >= self._load_at:
+            batch, lines = self._next_batch()
+            self._loading = True
+            self.mutex.release()
+            try:
+                items = self._load(lines)
+                error = None
+            except Exception as e:
+                items = None
+                error = e
+            finally:
+                self.mutex.acquire()
+                self._loading = False
+
+            if error is not None:
+                # The items are still stored, so keep retrying even if the policy gives up
+                delay = self._load_retry.delay(self._load_failures, error)
+                delay = delay if delay is not None else self._load_retry.max_delay
+                self._load_failures += 1
+                self._load_at = time.monotonic() + delay
+                queues_logger.error('Failed to load {} stored items, retrying in {:.1f}s: {}'
+                                    .format(len(lines), delay, error))
+                break
+
+            self._load_failures = 0
+            self._loaded(batch, items)
+
+            # Consumers may have waited while this thread was loading
+            self.not_empty.notify_all()
+
+    def _load_wait(self) -> float:
+        """Seconds until loading can be retried, or :code:`None` if there is nothing to load"""
+        if self._loading or not self._needs_load():
+            return None
+        return max(0.0, self._load_at - time.monotonic())
+
+    def get(self, block=True, timeout=None):
+        """
+        Remove and return the next item, see :func:`queue.Queue.get`. Waiting consumers retry
+        loading stored items once the delay after a failure passed.
+        """
+        if timeout is not None and timeout < 0:
+            raise ValueError("'timeout' must be a non-negative number")
+
+        with self.not_empty:
+            endtime = time.monotonic() + timeout if timeout is not None else None
+            while not self._qsize():
+                if not block:
+                    raise Empty
+                wait = self._load_wait()
+                if endtime is not None:
+                    remaining = endtime - time.monotonic()
+                    if remaining <= 0.0:
+                        raise Empty
+                    wait = remaining if wait is None else min(wait, remaining)
+                self.not_empty.wait(wait)
+            item = self._get()
+            self.not_full.notify()
+            return item
+
+
+class OverflowQueue(_LoadingQueue):
+    """
+    A FIFO queue holding at most :code:`maxsize` items in memory, with a choice of what happens
+    when an item is put into the full queue:
+
+    * :data:`BLOCK`: wait for a free slot, like :class:`queue.Queue`
+    * :data:`DROP_OLDEST`: drop the oldest queued item to make room
+    * :data:`DROP_PRIORITY`: drop the item with the lowest :code:`priority(item)`, which may be
+      the new one. Items with equal priority are dropped oldest first.
+    * :data:`SPILL`: append the item to a file at :code:`spill_path` as :code:`dump(item)`. Once
+      the in-memory items are used up, up to :code:`load_batch` lines at a time are read back
+      with :code:`load(lines)`. Lines left in the file from a previous run are read back as
+      well. Items that cannot be loaded count as dropped. If :code:`load` fails, the lines stay
+      in the file and are loaded again after a delay, see :code:`retry`.
+
+    Except for :data:`BLOCK`, putting never blocks, so a producer such as a stream thread keeps
+    up under load spikes. :attr:`dropped` and :attr:`spilled` count the affected items, and
+    :code:`on_drop(item)` and :code:`on_spill(item)` are called for each of them.
+
+    :code:`None` is the stop sentinel of the :class:`~bottr.bot.BotQueueWorker` threads. It is
+    never dropped and returned once no items are left in memory. Spilled items are not loaded
+    anymore once it was put, but stay in the file for the next run.
+
+    :param maxsize: Maximum number of items in memory
+    :param policy: One of :data:`POLICIES`
+    :param priority: Function returning the priority of an item, required for
+        :data:`DROP_PRIORITY`
+    :param spill_path: Path of the spill file, required for :data:`SPILL`
+    :param dump: Function returning an item as a single line of text. Defaults to pickle.
+    :param load: Function returning the items of a list of lines, with :code:`None` for items that
+        are no longer available. Defaults to pickle.
+    :param load_batch: Maximum number of lines loaded at once
+    :param on_drop: Function called with each dropped item
+    :param on_spill: Function called with each spilled item
+    :param retry: Backoff for loading again after :code:`load` failed. Defaults to
+        :class:`~bottr.retry.RetryPolicy` waiting 1 to 60 seconds.
+    """
+
+    def __init__(self, maxsize: int,
+                 policy: str = BLOCK,
+                 priority: Callable[[Any], float] = None,
+                 spill_path: str = None,
+                 dump: Callable[[Any], str] = _pickle_dump,
+                 load: Callable[[List[str]], List] = _pickle_load,
+                 load_batch: int = 100,
+                 on_drop: Callable[[Any], None] = None,
+                 on_spill: Callable[[Any], None] = None,
+                 retry: RetryPolicy = None):
+        if policy not in POLICIES:
+            raise Exception('Unknown overflow policy {}, use one of {}.'.format(policy, POLICIES))
+
+        if maxsize < 1:
+            raise Exception('The queue needs to hold at least one item.')
+
+        if policy == DROP_PRIORITY and priority is None:
+            raise Exception('Dropping by priority needs a priority function.')
+
+        if policy == SPILL and spill_path is None:
+            raise Exception('Spilling needs a spill path.')
+
+        self._policy = policy
+        self._priority = priority
+        self._spill_path = spill_path
+        self._dump = dump
+        self._load_batch = load_batch
+        self._on_drop = on_drop
+        self._on_spill = on_spill
+        self.dropped = 0
+        self.spilled = 0
+        super().__init__(maxsize, load, retry)
+
+    def _init(self, maxsize):
+        self._items = OrderedDict()  # type: OrderedDict
+        self._heap = []  # type: List[Tuple[float, int]]
+        self._seq = 0
+        self._sentinels = 0
+        self._spill = SpillBuffer(self._spill_path) if self._policy == SPILL else None
+
+    def _qsize(self):
+        self._load_stored()
+        return len(self._items) + self._sentinels
+
+    def _needs_load(self) -> bool:
+        # Load spilled items once the in-memory ones are used up. Once stopping, leave them in
+        # the file for the next run.
+        return not self._items and self._sentinels == 0 and self.spill_size > 0
+
+    def _next_batch(self) -> Tuple[List[str], List[str]]:
+        lines = self._spill.peek(self._load_batch)
+        return lines, lines
+
+    def qsize(self) -> int:
+        """Number of queued items, including spilled ones"""
+        with self.mutex:
+            return len(self._items) + self._sentinels + self.spill_size
+
+    @property
+    def spill_size(self) -> int:
+        """Number of items in the spill file"""
+        return len(self._spill) if self._spill is not None else 0
+
+    def _full(self) -> bool:
+        return len(self._items) >= self.maxsize
+
+    def put(self, item, block=True, timeout=None):
+        """
+        Put :code:`item` into the queue, applying the overflow policy if it is full. Only blocks
+        with :data:`BLOCK`, see :func:`queue.Queue.put`.
+        """
+        if self._policy == BLOCK:
+            return super().put(item, block, timeout)
+
+        with self.not_full:
+            if item is not None:
+                if self._policy == SPILL and (self._full() or self.spill_size > 0):
+                    # Keep the order: once spilling, new items go behind the spilled ones
+                    self._spill.append(self._dump(item))
+                    self.spilled += 1
+                    if self._on_spill is not None:
+                        self._on_spill(item)
+                elif self._full():
+                    victim = self._evict(item)
+                    self.dropped += 1
+                    if self._on_drop is not None:
+                        self._on_drop(victim)
+                    if victim is item:
+                        return
+                    self.unfinished_tasks -= 1
+                    self._put(item)
+                else:
+                    self._put(item)
+            else:
+                self._put(item)
+
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def _evict(self, item):
+        """Remove the item to drop from the full queue and return it, or return :code:`item`."""
+        if self._policy == DROP_OLDEST:
+            return self._items.popitem(last=False)[1]
+
+        # Skip heap entries of items that were already taken
+        while self._heap[0][1] not in self._items:
+            heapq.heappop(self._heap)
+
+        if self._priority(item) < self._heap[0][0]:
+            return item
+        _, seq = heapq.heappop(self._heap)
+        return self._items.pop(seq)
+
+    def _put(self, item):
+        if item is None:
+            self._sentinels += 1
+            return
+
+        self._seq += 1
+        self._items[self._seq] = item
+        if self._policy == DROP_PRIORITY:
+            heapq.heappush(self._heap, (self._priority(item), self._seq))
+
+    def _loaded(self, lines: List[str], items: List):
+        # The lines stay in the file if stopping while they were loaded
+        if self._sentinels > 0:
+            return
+
+        self._spill.drop(len(lines))
+        items = [item for item in items if item is not None]
+        for item in items:
+            self._put(item)
+
+        # Items that could not be loaded are done
+        missing = len(lines) - len(items)
+        if missing > 0:
+            self.dropped += missing
+            self.unfinished_tasks -= missing
+            if self.unfinished_tasks <= 0:
+                self.all_tasks_done.notify_all()
+
+    def _get(self):
+        if not self._items:
+            self._sentinels -= 1
+            return None
+
+        item = self._items.popitem(last=False)[1]
+        if self._policy == DROP_PRIORITY and len(self._heap) > 2 * len(self._items) + 16:
+            # Drop heap entries of items that were already taken
+            self._heap = [entry for entry in self._heap if entry[1] in self._items]
+            heapq.heapify(self._heap)
+        return item
+
+    def abandon(self) -> int:
+        """
+        Remove all items that were not taken yet, see :func:`abandon`. With :data:`SPILL`, the
+        in-memory items are appended to the spill file, behind the items already spilled.
+        """
+        with self.mutex:
+            items = list(self._items.values())
+            self._items.clear()
+            self._heap = []
+            if self._spill is not None:
+                for item in items:
+                    self._spill.append(self._dump(item))
+            _tasks_abandoned(self, len(items))
+        return len(items)
+
+    def close(self):
+        """Close the spill file. Spilled items that were not taken stay in it."""
+        if self._spill is not None:
+            self._spill.close()
+
+
+
+class SQLiteQueue(_LoadingQueue):
+    """
+    Unbounded FIFO queue persisted to a SQLite database, so queued and in-flight jobs survive
+    crashes and restarts. It can be used in place of the in-memory queue of the
+    :class:`~bottr.bot.BotQueueWorker` threads.
+
+    Jobs are stored as :code:`dump(job)` when they are put. :func:`~queue.Queue.get` leases a job
+    to the calling thread for :code:`visibility_timeout` seconds, and
+    :func:`~SQLiteQueue.task_done` acknowledges the oldest job leased by the calling thread and
+    deletes it. A job whose lease expires, e.g. because its worker hangs, is handed out again, so
+    jobs are processed at least once.
+
+    Writes are committed every :code:`commit_every` operations, after :code:`commit_interval`
+    seconds, once the queue ran empty, and on :func:`~SQLiteQueue.flush`. A crash loses only
+    uncommitted writes: new jobs are lost and acknowledged jobs are processed again.
+
+    Jobs left from a previous run, including those in progress when it stopped, come first. They
+    are loaded with :code:`load(lines)` in batches of :code:`load_batch` once they are reached. Up
+    to :code:`memory_size` new jobs are also kept in memory, so they need not be loaded again. If
+    :code:`load` fails, the jobs stay pending and are loaded again after a delay, see
+    :code:`retry`.
+
+    A database file is meant to be used by one queue at a time.
+
+    :param path: Path of the SQLite database file
+    :param dump: Function returning a job as text. Defaults to pickle.
+    :param load: Function returning the jobs of a list of lines, with :code:`None` for jobs that
+        are no longer available. Defaults to pickle.
+    :param visibility_timeout: Seconds a job may be in progress before it is handed out again
+    :param commit_every: Maximum number of uncommitted writes
+    :param commit_interval: Maximum seconds between commits while jobs are put or acknowledged
+    :param load_batch: Maximum number of jobs loaded at once
+    :param memory_size: Maximum number of jobs kept in memory
+    :param retry: Backoff for loading again after :code:`load` failed. Defaults to
+        :class:`~bottr.retry.RetryPolicy` waiting 1 to 60 seconds.
+    """
+
+    def __init__(self, path: str,
+                 dump: Callable[[Any], str] = _pickle_dump,
+                 load: Callable[[List[str]], List] = _pickle_load,
+                 visibility_timeout: float = 300.0,
+                 commit_every: int = 100,
+                 commit_interval: float = 1.0,
+                 load_batch: int = 100,
+                 memory_size: int = 1000,
+                 retry: RetryPolicy = None):
+        self._path = path
+        self._dump = dump
+        self._visibility_timeout = visibility_timeout
+        self._commit_every = commit_every
+        self._commit_interval = commit_interval
+        self._load_batch = load_batch
+        self._memory_size = memory_size
+        self.dropped = 0
+        super().__init__(0, load, retry)
+
+        # Jobs of a previous run are unfinished until they are acknowledged
+        self.unfinished_tasks = len(self._pending)
+
+    def _init(self, maxsize):
+        self._db = sqlite3.connect(self._path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS jobs '
+                         '(id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL)')
+        self._db.commit()
+
+        rows = self._db.execute('SELECT id FROM jobs ORDER BY id')
+        self._pending = deque(row[0] for row in rows)  # type: deque
+        self._jobs = {}  # type: Dict[int, Any]
+        self._leases = {}  # type: Dict[int, float]
+        self._local = threading.local()
+        self._sentinels = 0
+        self._uncommitted = 0
+        self._committed_at = time.monotonic()
+
+        if self._pending:
+            queues_logger.info('Resuming {} jobs from {}'.format(len(self._pending), self._path))
+
+    def _written(self, force: bool = False):
+        self._uncommitted += 1
+        if force or self._uncommitted >= self._commit_every or \
+                time.monotonic() - self._committed_at >= self._commit_interval:
+            self._commit()
+
+    def _commit(self):
+        self._db.commit()
+        self._uncommitted = 0
+        self._committed_at = time.monotonic()
+
+    def _qsize(self):
+        self._expire_leases()
+        self._load_stored()
+        return (len(self._pending) if not self._needs_load() else 0) + self._sentinels
+
+    def _expire_leases(self):
+        """Hand out jobs again whose lease expired."""
+        now = time.monotonic()
+        expired = sorted((i for i, deadline in self._leases.items() if deadline <= now),
+                         reverse=True)
+        for i in expired:
+            del self._leases[i]
+            self._pending.appendleft(i)
+            self.unfinished_tasks += 1
+        if expired:
+            queues_logger.warning('Handing out {} jobs again after their lease expired'
+                                  .format(len(expired)))
+
+    def _needs_load(self) -> bool:
+        # The next jobs are only stored in the database
+        return bool(self._pending) and self._pending[0] not in self._jobs
+
+    def _next_batch(self) -> Tuple[Tuple[List[int], set], List[str]]:
+        ids = []
+        for i in self._pending:
+            if len(ids) >= self._load_batch:
+                break
+            if i not in self._jobs:
+                ids.append(i)
+
+        rows = dict(self._db.execute('SELECT id, payload FROM jobs WHERE id IN ({})'
+                                     .format(','.join('?' * len(ids))), ids).fetchall())
+        found = [i for i in ids if i in rows]
+        return (found, set(ids) - set(found)), [rows[i] for i in found]
+
+    def _loaded(self, batch: Tuple[List[int], set], jobs: List):
+        found, missing = batch
+
+        # Jobs abandoned while they were loaded stay in the database
+        pending = set(self._pending)
+        for i, job in zip(found, jobs):
+            if job is None:
+                missing.add(i)
+            elif i in pending:
+                self._jobs[i] = job
+
+        # Jobs that cannot be loaded are done
+        missing &= pending
+        if missing:
+            self._pending = deque(i for i in self._pending if i not in missing)
+            self._db.executemany('DELETE FROM jobs WHERE id = ?', [(i,) for i in missing])
+            self._commit()
+            self.dropped += len(missing)
+            self.unfinished_tasks -= len(missing)
+            if self.unfinished_tasks <= 0:
+                self.all_tasks_done.notify_all()
+
+    def _put(self, job):
+        if job is None:
+            # Stop sentinels are not tasks, workers do not acknowledge them
+            self._sentinels += 1
+            self.unfinished_tasks -= 1
+            return
+
+        cursor = self._db.execute('INSERT INTO jobs (payload) VALUES (?)', (self._dump(job),))
+        self._pending.append(cursor.lastrowid)
+        if len(self._jobs) < self._memory_size:
+            self._jobs[cursor.lastrowid] = job
+        self._written()
+
+    def _get(self):
+        # Jobs that could not be loaded yet are left for the next run when stopping
+        if not self._pending or self._needs_load():
+            self._sentinels -= 1
+            return None
+
+        i = self._pending.popleft()
+        self._leases[i] = time.monotonic() + self._visibility_timeout
+        if not hasattr(self._local, 'leased'):
+            self._local.leased = deque()
+        self._local.leased.append(i)
+        return self._jobs[i]
+
+    def task_done(self):
+        """
+        Acknowledge the oldest job taken by the calling thread, deleting it from the database.
+        See :func:`queue.Queue.task_done`.
+        """
+        with self.mutex:
+            leased = getattr(self._local, 'leased', None)
+            if leased:
+                i = leased.popleft()
+                self._leases.pop(i, None)
+                self._jobs.pop(i, None)
+                self._db.execute('DELETE FROM jobs WHERE id = ?', (i,))
+                self._written(force=not self._pending)
+        super().task_done()
+
+    def abandon(self) -> int:
+        """
+        Stop handing out the jobs that were not taken yet, see :func:`abandon`. They stay in the
+        database for the next run.
+        """
+        with self.mutex:
+            n = len(self._pending)
+            self._pending.clear()
+            self._jobs = {i: job for i, job in self._jobs.items() if i in self._leases}
+            _tasks_abandoned(self, n)
+        return n
+
+    def payloads(self) -> List[str]:
+        """Stored text of all jobs that were not acknowledged yet"""
+        with self.mutex:
+            return [row[0] for row in self._db.execute('SELECT payload FROM jobs ORDER BY id')]
+
+    def flush(self):
+        """Commit all writes."""
+        with self.mutex:
+            self._commit()
+
+    def close(self):
+        """Commit all writes and close the database. Jobs that were not acknowledged stay in it."""
+        with self.mutex:
+            self._commit()
+            self._db.close()
+
+
+class OverflowPolicy(object):
+    """
+    What a bot does when its queue is full, see :class:`OverflowQueue`.
+
+    :param policy: One of :data:`POLICIES`
+    :param priority: Function returning the priority of an item, for :data:`DROP_PRIORITY`
+    :param spill_path: Path of the spill file, for :data:`SPILL`
+    :param maxsize: Maximum number of items in memory. :code:`None` uses four per worker thread.
+    """
+
+    def __init__(self, policy: str = BLOCK, priority: Callable[[Any], float] = None,
+                 spill_path: str = None, maxsize: int = None):
+        if policy not in POLICIES:
+            raise Exception('Unknown overflow policy {}, use one of {}.'.format(policy, POLICIES))
+
+        self.policy = policy
+        self.priority = priority
+        self.spill_path = spill_path
+        self.maxsize = maxsize
+
+
+class FairPolicy(object):
+    """
+    How a bot shares its workers between subreddits and priorities, see :class:`FairQueue`.
+
+    :param weights: Weight of each subreddit, by name. Subreddits without a weight get
+        :code:`default_weight`.
+    :param priority: Function returning the priority of an item, higher first, e.g. to process
+        mentions before all other messages. :code:`None` gives all items the same priority.
+    :param lane_size: Maximum number of queued items per subreddit and priority, the oldest are
+        dropped beyond it. :code:`None` for no limit.
+    :param maxsize: Maximum number of queued items in all lanes, items of the largest lane of the
+        lowest priority are dropped beyond it. :code:`0` for no limit.
+    :param default_weight: Weight of subreddits missing in :code:`weights`
+    """
+
+    def __init__(self, weights: Dict[str, int] = None, priority: Callable[[Any], float] = None,
+                 lane_size: int = None, maxsize: int = 0, default_weight: int = 1):
+        if lane_size is not None and lane_size < 1:
+            raise Exception('A lane needs to hold at least one item.')
+
+        # Subreddit names are case-insensitive
+        self.weights = {sub.lower(): weight for sub, weight in (weights or {}).items()}
+        self.priority = priority
+        self.lane_size = lane_size
+        self.maxsize = maxsize
+        self.default_weight = default_weight
@@ -0,0 +1,168 @@
+import logging
+import threading
+import time
+import weakref
+
+ratelimit_logger = logging.getLogger(__name__)
+
+
+class RateLimiter(object):
+    """
+    Token bucket pacing the write calls of all workers and bots that share one
+    :class:`praw.Reddit` instance. Use :func:`for_reddit` to get the shared instance.
+
+    Tokens refill at :code:`rate` per second, up to :code:`burst`. On top of that, the limiter
+    follows reddit's feedback:
+
+    * :func:`~RateLimiter.block` pauses all callers after a :code:`RATELIMIT` error, instead of
+      each worker running into the same error and sleeping on its own.
+    * :func:`~RateLimiter.update` reads the remaining request budget that PRAW tracks from the
+      :code:`x-ratelimit-*` response headers and slows down before it runs out.
+
+    :param rate: Tokens per second
+    :param burst: Maximum number of tokens
+    :param reddit: Optional :class:`praw.Reddit` instance whose request budget is followed
+    """
+
+    def __init__(self, rate: float = 1.0, burst: float = 5.0, reddit=None):
+        if rate <= 0 or burst < 1:
+            raise Exception('The rate needs to be positive and the burst at least one.')
+
+        self._base_rate = rate
+        self._rate = rate
+        self._burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._reddit = weakref.ref(reddit) if reddit is not None else None
+        self._cond = threading.Condition()
+
+    def _refill(self, now: float):
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def _wait_time(self, tokens: float, now: float) -> float:
+        """Seconds until :code:`tokens` are available, 0 if they are available now."""
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if self._tokens >= tokens:
+            return 0.0
+        return (tokens - self._tokens) / self._rate
+
+    def acquire(self, tokens: float = 1.0, timeout: float = None) -> bool:
+        """
+        Take :code:`tokens` from the bucket, waiting until they are available.
+
+        :param tokens: Number of tokens, i.e. requests, to take
+        :param timeout: Maximum seconds to wait. :code:`None` waits as long as needed.
+        :return: True if the tokens were taken, False on timeout
+        """
+        self.update()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._wait_time(tokens, now)
+                if wait <= 0:
+                    self._tokens -= tokens
+                    return True
+
+                if deadline is not None:
+                    if now >= deadline:
+                        return False
+                    wait = min(wait, deadline - now)
+                self._cond.wait(wait)
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """
+        Take :code:`tokens` only if they are available right now. Handlers can use this to defer a
+        write and go on with other work instead of blocking.
+
+        :param tokens: Number of tokens to take
+        :return: True if the tokens were taken
+        """
+        return self.acquire(tokens, timeout=0)
+
+    def wait_time(self, tokens: float = 1.0) -> float:
+        """
+        Seconds until :code:`tokens` can be taken, :code:`0` if they can be taken now, e.g. to
+        defer a write that :func:`~RateLimiter.try_acquire` refused.
+
+        :param tokens: Number of tokens
+        """
+        self.update()
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            return self._wait_time(tokens, now)
+
+    def block(self, seconds: float):
+        """
+        Let no caller acquire tokens for the next :code:`seconds`, e.g. after reddit answered with
+        a :code:`RATELIMIT` error.
+
+        :param seconds: Seconds to pause
+        """
+        with self._cond:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = 0
+        ratelimit_logger.warning('Pausing writes for {:.0f} seconds'.format(seconds))
+
+    @property
+    def available(self) -> float:
+        """Tokens that can be taken right now, 0 while blocked"""
+        self.update()
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            return 0.0 if now < self._blocked_until else self._tokens
+
+    @property
+    def blocked_for(self) -> float:
+        """Seconds until callers may acquire tokens again after :func:`~RateLimiter.block`"""
+        return max(0.0, self._blocked_until - time.monotonic())
+
+    def update(self):
+        """
+        Follow the request budget PRAW tracked from the last response headers: when fewer
+        requests remain than tokens, drop the surplus, and refill no faster than the remaining
+        requests spread over the time until the budget resets.
+        """
+        reddit = self._reddit() if self._reddit is not None else None
+        core = getattr(reddit, '_core', None)
+        limiter = getattr(core, '_rate_limiter', None)
+        remaining = getattr(limiter, 'remaining', None)
+        reset = getattr(limiter, 'reset_timestamp', None)
+        if remaining is None or reset is None:
+            return
+
+        with self._cond:
+            self._tokens = min(self._tokens, remaining)
+            seconds_to_reset = max(reset - time.time(), 1.0)
+            self._rate = min(self._base_rate, max(remaining, 1.0) / seconds_to_reset)
+
+
+"""Rate limiters shared per reddit instance"""
+_limiters = weakref.WeakKeyDictionary()  # type: weakref.WeakKeyDictionary
+_limiters_lock = threading.Lock()
+
+"""Rate limiter for calls that cannot be attributed to a reddit instance"""
+default_limiter = RateLimiter()
+
+
+def for_reddit(reddit) -> RateLimiter:
+    """
+    Get the :class:`RateLimiter` shared by everything using :code:`reddit`.
+
+    :param reddit: :class:`praw.Reddit` instance, or :code:`None` for :data:`default_limiter`
+    """
+    if reddit is None:
+        return default_limiter
+
+    with _limiters_lock:
+        limiter = _limiters.get(reddit)
+        if limiter is None:
+            limiter = RateLimiter(reddit=reddit)
+            _limiters[reddit] = limiter
+        return limiter
@@ -0,0 +1,167 @@
+import threading
+from typing import Dict, Iterable, Tuple
+
+from bottr.process import SNAPSHOT_FIELDS, _plain
+
+# Record classes by kind, model and fields, shared by all projections
+_classes = {}  # type: Dict[tuple, type]
+_classes_lock = threading.Lock()
+
+
+class ItemRecord(object):
+    """
+    Compact copy of a reddit thing, holding only the projected fields in :code:`__slots__`.
+
+    Records are created by a :class:`Projection`. Related objects such as :code:`author` or
+    :code:`subreddit` are reduced to their names, fields missing on the original thing are
+    :code:`None`. Records are picklable and keep no reference to the reddit instance when pickled,
+    so they can be sent to a process pool as they are.
+
+    Attributes that were not projected, and methods like :code:`reply`, are looked up on the PRAW
+    object returned by :func:`~ItemRecord.rehydrate`, which is created on first use.
+    """
+
+    __slots__ = ('_reddit', '_thing')
+
+    """Kind of the original thing"""
+    kind = None  # type: str
+
+    """Names of the projected fields"""
+    fields = ()  # type: Tuple[str, ...]
+
+    """Class of the original thing, used to rehydrate it"""
+    model = None  # type: type
+
+    def __init__(self, reddit, values: Iterable):
+        self._reddit = reddit
+        self._thing = None
+        for field, value in zip(self.fields, values):
+            setattr(self, field, value)
+
+    @property
+    def fullname(self) -> str:
+        return self.name if self.name is not None else self.rehydrate().fullname
+
+    def rehydrate(self, reddit=None):
+        """
+        PRAW object with the projected fields of this record, e.g. to write with. It is created
+        once, without a request, and acts through :code:`reddit`, or the reddit instance of the
+        original thing if :code:`None`.
+
+        :param reddit: Reddit instance
+        """
+        if self._thing is None or (reddit is not None and self._thing._reddit is not reddit):
+            reddit = reddit if reddit is not None else self._reddit
+            if reddit is None:
+                raise Exception('Rehydrating {} needs a reddit instance.'.format(self.fullname))
+
+            data = {field: value for field, value in self.values().items() if value is not None}
+            self._thing = self.model(reddit, _data=data)
+        return self._thing
+
+    def values(self) -> dict:
+        """Projected fields and their values"""
+        return {field: getattr(self, field) for field in self.fields}
+
+    def __getattr__(self, attribute):
+        # Only called for attributes that are not projected
+        if attribute.startswith('_'):
+            raise AttributeError(attribute)
+        return getattr(self.rehydrate(), attribute)
+
+    def __reduce__(self):
+        return _restore, (self.kind, self.model, self.fields,
+                          tuple(getattr(self, field) for field in self.fields))
+
+    def __repr__(self):
+        return '{}Record(id={!r})'.format(self.kind.capitalize(), self.id)
+
+
+def loaded(thing) -> dict:
+    """
+    Attributes of :code:`thing` that can be read without a request: the loaded attributes of a
+    PRAW object, or the projected fields of a record.
+    """
+    return thing.values() if isinstance(thing, ItemRecord) else vars(thing)
+
+
+def record_class(kind: str, model: type, fields: Tuple[str, ...]) -> type:
+    """
+    Subclass of :class:`ItemRecord` with a slot for each of :code:`fields`. Classes are created
+    once per kind, model and fields.
+
+    :param kind: :code:`'comment'`, :code:`'submission'` or :code:`'message'`
+    :param model: Class of the original things, e.g. :class:`praw.models.Comment`
+    :param fields: Names of the projected fields
+    """
+    key = (kind, model, fields)
+    with _classes_lock:
+        cls = _classes.get(key)
+        if cls is None:
+            cls = type('{}Record'.format(model.__name__), (ItemRecord,),
+                       {'__slots__': fields, 'kind': kind, 'fields': fields, 'model': model})
+            _classes[key] = cls
+        return cls
+
+
+def _restore(kind: str, model: type, fields: Tuple[str, ...], values: tuple) -> ItemRecord:
+    return record_class(kind, model, fields)(None, values)
+
+
+class Projection(object):
+    """
+    Turns the items of a stream into :class:`ItemRecord` objects holding only the fields the
+    handlers read.
+
+    A PRAW object carries its reddit instance, its lazy-loading state and every attribute reddit
+    returned, often more than 80. A record holds the projected fields in slots, so queued items
+    take a fraction of the memory, and pickling them for a process pool or a spill file is
+    cheaper. Records are built once on the stream thread from the attributes already loaded, so
+    projecting never makes a request.
+
+    Handlers receive the records instead of the PRAW objects. Actions they return are executed on
+    the rehydrated PRAW object. Reading a field that was not projected rehydrates the record too,
+    and fails if the field was not loaded either, so project all fields the handlers and rules
+    read.
+
+    :param fields: Fields to keep per kind, e.g. :code:`{'comment': ['body', 'author']}`. The
+        :code:`id` and :code:`name` fields are always kept. Kinds that are missing keep the fields
+        of :data:`~bottr.process.SNAPSHOT_FIELDS`.
+
+    **Example usage**::
+
+        def parse(comment):
+            if 'banana' in comment.body:
+                return Reply('Bananas!')
+
+        projection = Projection({'comment': ['body', 'author', 'subreddit']})
+        bot = CommentBot(..., func_comment=parse, projection=projection)
+    """
+
+    def __init__(self, fields: Dict[str, Iterable[str]] = None):
+        self.fields = dict(SNAPSHOT_FIELDS)  # type: Dict[str, Tuple[str, ...]]
+        for kind, kind_fields in (fields or {}).items():
+            if kind not in SNAPSHOT_FIELDS:
+                raise Exception('Cannot project {} items, use one of {}.'
+                                .format(kind, sorted(SNAPSHOT_FIELDS)))
+
+            kind_fields = set(kind_fields) | {'id', 'name'}
+            invalid = [f for f in kind_fields if f.startswith('_') or hasattr(ItemRecord, f)]
+            if invalid:
+                raise Exception('Cannot project the fields {}.'.format(sorted(invalid)))
+            self.fields[kind] = tuple(sorted(kind_fields))
+
+    def record(self, thing, kind: str) -> ItemRecord:
+        """
+        Record of the loaded attributes of :code:`thing`.
+
+        :param thing: PRAW object, e.g. a :class:`praw.models.Comment`
+        :param kind: :code:`'comment'`, :code:`'submission'` or :code:`'message'`
+        """
+        if isinstance(thing, ItemRecord):
+            return thing
+
+        fields = self.fields[kind]
+        data = vars(thing)
+        cls = record_class(kind, type(thing), fields)
+        return cls(data.get('_reddit'), [_plain(data.get(field)) for field in fields])
@@ -0,0 +1,138 @@
+import gzip
+import json
+import threading
+import time
+from typing import Callable, Iterable
+
+from bottr.fake import FakeReddit, FakeThing, MODELS, read_lines
+
+"""Kind of the items of each stream of the bots"""
+STREAM_KINDS = {'comments': 'comment', 'submissions': 'submission', 'inbox': 'message'}
+
+
+def _value(value):
+    # Lazy PRAW objects such as authors and subreddits are recorded by name
+    if value is None or isinstance(value, (str, int, float, bool, list, dict)):
+        return value
+    return str(value)
+
+
+class Recorder(object):
+    """
+    Appends the items yielded by the streams of a bot to a gzip-compressed file with one JSON
+    object per line, e.g. to reproduce a traffic spike later with :class:`ReplayReddit`.
+
+    Each line holds the kind of the item, the time it was yielded as :code:`recorded_utc`, and the
+    loaded data of the item. Attributes that are PRAW objects, such as the author, are recorded as
+    their name. Recording into an existing file appends to it. Lines are flushed every
+    :code:`flush_interval` seconds, so a crash loses at most that many seconds of items.
+
+    :param path: Path of the recording, usually ending with :code:`.jsonl.gz`
+    :param fields: Attributes to record. :code:`None` records all loaded attributes.
+    :param flush_interval: Maximum seconds between two flushes
+
+    **Example usage**::
+
+        recorder = Recorder('comments.jsonl.gz')
+        bot = CommentBot(..., recorder=recorder)
+        bot.start()
+        ...
+        bot.stop()
+        recorder.close()
+    """
+
+    def __init__(self, path: str, fields: Iterable[str] = None, flush_interval: float = 1.0):
+        self._file = gzip.open(path, 'at', encoding='utf-8')
+        self._fields = set(fields) | {'id', 'name'} if fields is not None else None
+        self._flush_interval = flush_interval
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+        self.recorded = 0
+
+    def _data(self, item, kind: str) -> dict:
+        data = {'kind': kind, 'recorded_utc': time.time()}
+        for key, value in vars(item).items():
+            if key.startswith('_') or (self._fields is not None and key not in self._fields):
+                continue
+            data[key] = _value(value)
+        return data
+
+    def record(self, item, kind: str):
+        """
+        Append :code:`item` to the recording.
+
+        :param item: PRAW object
+        :param kind: :code:`'comment'`, :code:`'submission'` or :code:`'message'`
+        """
+        line = json.dumps(self._data(item, kind), separators=(',', ':'), default=str)
+        with self._lock:
+            self._file.write(line + '\n')
+            self.recorded += 1
+            if time.monotonic() - self._flushed_at >= self._flush_interval:
+                self._file.flush()
+                self._flushed_at = time.monotonic()
+
+    def wrap(self, stream: Callable[[], Iterable], kind: str) -> Callable[[], Iterable]:
+        """
+        Function returning the items of :code:`stream()`, recording each of them.
+
+        :param stream: Function returning a PRAW stream
+        :param kind: Name of the stream, one of :data:`STREAM_KINDS`
+        """
+        def recorded():
+            for item in stream():
+                if item is not None:
+                    self.record(item, STREAM_KINDS[kind])
+                yield item
+
+        return recorded
+
+    def close(self):
+        """Flush and close the recording."""
+        with self._lock:
+            self._file.close()
+
+
+class ReplayReddit(FakeReddit):
+    """
+    Offline stand-in for :class:`praw.Reddit` that serves a recording of :class:`Recorder` to the
+    bots, keeping the recorded time between items.
+
+    Streams yield the items at :code:`speed` times the recorded pace, counted from the first
+    recorded item, e.g. 10 replays an hour of traffic in six minutes. Writes are recorded in
+    :attr:`~bottr.fake.FakeReddit.actions` instead of being sent to reddit.
+
+    :param path: Path of the recording
+    :param speed: Speedup of the replay. :code:`None` yields all items as fast as possible.
+
+    **Example usage**::
+
+        reddit = ReplayReddit('comments.jsonl.gz', speed=10)
+        bot = CommentBot(reddit=reddit, func_comment=parse, subreddits=['all'])
+        bot.start()
+    """
+
+    def __init__(self, path: str, speed: float = 1.0):
+        if speed is not None and speed <= 0:
+            raise Exception('The speed needs to be positive.')
+
+        items = {'comment': [], 'submission': [], 'message': []}  # type: dict
+        for data in read_lines(path):
+            kind = data.pop('kind')
+            items[kind].append(MODELS[kind](**data))
+
+        # All streams share the timeline of the recording, starting with its first item
+        times = [vars(item).get('recorded_utc', 0.0) for kind_items in items.values()
+                 for item in kind_items]
+        self._origin = min(times) if times else 0.0
+        self._speed = speed
+        super().__init__(comments=items['comment'],
+                         submissions=items['submission'],
+                         messages=items['message'])
+
+    def _delay(self, item: FakeThing, count: int, start: float) -> float:
+        if self._speed is None:
+            return 0.0
+
+        offset = vars(item).get('recorded_utc', self._origin) - self._origin
+        return start + offset / self._speed - time.perf_counter()
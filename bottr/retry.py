@@ -0,0 +1,83 @@
+import random
+
+import prawcore
+
+from bottr.util import parse_wait_time
+
+"""Error classes returned by :func:`RetryPolicy.classify`"""
+TRANSIENT = 'transient'
+RATELIMIT = 'ratelimit'
+FATAL = 'fatal'
+
+"""Exceptions that will not go away by retrying, e.g. a private subreddit or invalid credentials"""
+FATAL_EXCEPTIONS = (prawcore.exceptions.Forbidden,
+                    prawcore.exceptions.NotFound,
+                    prawcore.exceptions.Redirect,
+                    prawcore.exceptions.OAuthException,
+                    prawcore.exceptions.InsufficientScope,
+                    prawcore.exceptions.InvalidInvocation,
+                    prawcore.exceptions.UnavailableForLegalReasons)
+
+
+class RetryPolicy(object):
+    """
+    Exponential backoff with jitter for restarting failed streams.
+
+    The delay before attempt :code:`n` (starting at 0) is :code:`base * factor ** n`, capped at
+    :code:`max_delay`, and reduced by a random share of up to :code:`jitter`, so that several
+    streams failing at once do not reconnect in lockstep.
+
+    :param base: Delay in seconds before the first retry
+    :param factor: Growth factor of the delay per failed attempt
+    :param max_delay: Maximum delay in seconds
+    :param jitter: Maximum share of the delay, between 0 and 1, removed at random
+    :param max_attempts: Give up after this many consecutive failures. :code:`None` retries forever.
+    """
+
+    def __init__(self, base: float = 1.0, factor: float = 2.0, max_delay: float = 600.0,
+                 jitter: float = 0.5, max_attempts: int = None):
+        if not 0 <= jitter <= 1:
+            raise Exception('The jitter needs to be between 0 and 1.')
+
+        self.base = base
+        self.factor = factor
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.max_attempts = max_attempts
+
+    def classify(self, exception: Exception) -> str:
+        """
+        Classify an exception as :data:`TRANSIENT`, :data:`RATELIMIT` or :data:`FATAL`.
+
+        :param exception: Exception raised while listening to a stream
+        """
+        if isinstance(exception, FATAL_EXCEPTIONS):
+            return FATAL
+
+        if 'RATELIMIT' in str(exception):
+            return RATELIMIT
+
+        return TRANSIENT
+
+    def delay(self, attempt: int, exception: Exception = None) -> float:
+        """
+        Seconds to wait before the given attempt.
+
+        :param attempt: Number of consecutive failures so far, minus one
+        :param exception: The exception that caused the failure. Rate limit errors wait at least
+            as long as reddit asks for.
+        :return: Delay in seconds, or :code:`None` if no further attempt should be made
+        """
+        if self.max_attempts is not None and attempt >= self.max_attempts:
+            return None
+
+        if exception is not None and self.classify(exception) == FATAL:
+            return None
+
+        delay = min(self.max_delay, self.base * self.factor ** min(attempt, 64))
+        delay -= delay * self.jitter * random.random()
+
+        if exception is not None and self.classify(exception) == RATELIMIT:
+            delay = max(delay, parse_wait_time(str(exception)))
+
+        return delay
@@ -0,0 +1,163 @@
+import re
+from typing import Callable, Iterable, List, Tuple
+
+from bottr.records import loaded
+
+"""Attributes searched for keywords and patterns, per kind of thing"""
+DEFAULT_FIELDS = {
+    'comment': ('body',),
+    'submission': ('title', 'selftext'),
+    'message': ('subject', 'body'),
+}
+
+"""Constructs that depend on the position of a pattern, i.e. inline flags and group references"""
+_POSITIONAL = re.compile(r'\(\?[aiLmsux]+\)|\\[1-9]|\(\?P=|\(\?P<|\(\?\(')
+
+
+class Rule(object):
+    """
+    A declarative filter routing matching items to :code:`handler`.
+
+    An item matches if its text contains one of the :code:`keywords` or matches :code:`regex`
+    (if any are given), and it was posted in one of the :code:`subreddits` by one of the
+    :code:`authors` (if given), and :code:`predicate(item)` is true (if given).
+
+    :param handler: Function called as :code:`handler(item, *args)` for matching items
+    :param keywords: Substrings to look for
+    :param regex: Regular expression to look for
+    :param subreddits: Subreddit names, compared case-insensitively
+    :param authors: Author names, compared case-insensitively
+    :param predicate: Any further condition, evaluated last. It runs on the stream thread of the
+        bot, so it should be cheap and not make requests, e.g. by reading attributes of a lazy
+        PRAW object that are not loaded yet.
+    :param args: Additional handler arguments
+    """
+
+    def __init__(self, handler: Callable,
+                 keywords: Iterable[str] = None,
+                 regex: str = None,
+                 subreddits: Iterable[str] = None,
+                 authors: Iterable[str] = None,
+                 predicate: Callable[[object], bool] = None,
+                 args: List = None):
+        self.handler = handler
+        self.keywords = list(keywords or [])
+        self.regex = regex
+        self.subreddits = set(s.lower() for s in subreddits) if subreddits is not None else None
+        self.authors = set(a.lower() for a in authors) if authors is not None else None
+        self.predicate = predicate
+        self.args = args or []
+
+    @property
+    def pattern(self) -> str:
+        """Regular expression of the keywords and :code:`regex`, :code:`None` if there are none"""
+        patterns = [re.escape(k) for k in self.keywords]
+        if self.regex is not None:
+            patterns.append('(?:{})'.format(self.regex))
+        return '|'.join(patterns) if patterns else None
+
+    @property
+    def combinable(self) -> bool:
+        """
+        Whether :code:`regex` keeps its meaning inside a combined pattern. Inline flags such as
+        :code:`(?i)`, backreferences, named and conditional groups depend on the position of the
+        pattern, so such rules are searched for on their own.
+        """
+        return self.regex is None or _POSITIONAL.search(self.regex) is None
+
+    def accepts(self, item) -> bool:
+        """Check the conditions of this rule that do not depend on the text of :code:`item`."""
+        data = loaded(item)
+        if self.subreddits is not None and str(data.get('subreddit')).lower() not in self.subreddits:
+            return False
+        if self.authors is not None and str(data.get('author')).lower() not in self.authors:
+            return False
+        return self.predicate is None or self.predicate(item)
+
+
+class RuleSet(object):
+    """
+    Ordered list of :class:`Rule` objects, compiled into a single regular expression.
+
+    Most items match no rule at all. They are rejected with one search of the combined pattern
+    over their text. For the other items, one more match finds all rules whose text patterns
+    match, and the first of them whose other conditions hold is returned.
+
+    Patterns with inline flags such as :code:`(?i)`, backreferences, named or conditional groups
+    would change their meaning in the combined pattern. They are compiled on their own and
+    searched for separately, see :attr:`Rule.combinable`.
+
+    :param rules: Rules, in order of precedence
+    :param kind: :code:`'comment'`, :code:`'submission'` or :code:`'message'`
+    :param fields: Attributes to search. Defaults to :data:`DEFAULT_FIELDS` of :code:`kind`.
+    :param ignore_case: Match keywords and patterns case-insensitively
+    """
+
+    def __init__(self, rules: Iterable[Rule], kind: str, fields: Iterable[str] = None,
+                 ignore_case: bool = False):
+        self.rules = list(rules)
+        self.kind = kind
+        self._fields = tuple(fields) if fields is not None else DEFAULT_FIELDS[kind]
+
+        flags = re.DOTALL | (re.IGNORECASE if ignore_case else 0)
+        patterns = []  # type: List[Tuple[int, str]]
+
+        # Rules whose regex is searched for on its own
+        self._separate = []  # type: List[tuple]
+        for i, rule in enumerate(self.rules):
+            if rule.regex is not None:
+                try:
+                    compiled = re.compile(rule.regex, flags)
+                except re.error as e:
+                    raise Exception('Invalid regular expression {!r} of rule {}: {}'
+                                    .format(rule.regex, i, e))
+                if not rule.combinable:
+                    self._separate.append((i, compiled))
+                    if rule.keywords:
+                        patterns.append((i, '|'.join(re.escape(k) for k in rule.keywords)))
+                    continue
+
+            if rule.pattern is not None:
+                patterns.append((i, rule.pattern))
+
+        # Rules without text conditions always pass the text check
+        self._textless = [i for i, rule in enumerate(self.rules) if rule.pattern is None]
+
+        # Any rule: one search rejects most items
+        self._any = re.compile('|'.join('(?:{})'.format(p) for _, p in patterns), flags) \
+            if patterns else None
+
+        # Which rules: one optional lookahead per rule, each capturing if its pattern occurs
+        self._which = re.compile(''.join('(?=(?:.*?(?P<r{}>{}))?)'.format(i, p)
+                                         for i, p in patterns), flags) if patterns else None
+
+    def _text(self, item) -> str:
+        data = loaded(item)
+        return '\n'.join(str(data.get(f) or '') for f in self._fields)
+
+    def match(self, item) -> Rule:
+        """
+        First rule matching :code:`item`, or :code:`None`.
+
+        :param item: PRAW object
+        """
+        candidates = list(self._textless)
+        if self._any is not None or self._separate:
+            text = self._text(item)
+            if self._any is not None and self._any.search(text) is not None:
+                groups = self._which.match(text).groupdict()
+                candidates.extend(int(name[1:]) for name, value in groups.items() if value is not None)
+            candidates.extend(i for i, regex in self._separate if regex.search(text) is not None)
+
+        for i in sorted(set(candidates)):
+            if self.rules[i].accepts(item):
+                return self.rules[i]
+        return None
+
+    def route(self, item) -> Tuple[Rule, object]:
+        """
+        Job for the workers: :code:`(rule, item)` for the first matching rule, or :code:`None` if
+        no rule matches.
+        """
+        rule = self.match(item)
+        return (rule, item) if rule is not None else None
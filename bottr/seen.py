@@ -0,0 +1,140 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+class SeenSet(object):
+    """
+    Bounded, thread-safe set of fullnames, e.g. :code:`'t1_dv2xvbz'`, used to skip items that were
+    already dispatched, e.g. when a restarted stream yields its newest 100 items again or several
+    streams yield the same item.
+
+    Once :code:`capacity` fullnames are stored, the least recently added one is forgotten.
+
+    If :code:`path` is given, the set is loaded from that file and written back to it every
+    :code:`flush_every` new fullnames and on :func:`~SeenSet.flush`, so a restarted bot does not
+    reprocess its backlog.
+
+    :param capacity: Maximum number of fullnames to remember
+    :param path: Optional file to persist the set to, one fullname per line
+    :param flush_every: Number of new fullnames after which the set is written to :code:`path`
+    """
+
+    def __init__(self, capacity: int = 10000, path: str = None, flush_every: int = 100):
+        if capacity < 1:
+            raise Exception('The capacity needs to be at least one.')
+
+        self._capacity = capacity
+        self._path = path
+        self._flush_every = flush_every
+        self._unflushed = 0
+        self._fullnames = OrderedDict()  # type: OrderedDict
+        self._lock = threading.Lock()
+
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    fullname = line.strip()
+                    if fullname:
+                        self._remember(fullname)
+
+    def _remember(self, fullname: str):
+        self._fullnames[fullname] = None
+        if len(self._fullnames) > self._capacity:
+            self._fullnames.popitem(last=False)
+
+    def add(self, fullname: str) -> bool:
+        """
+        Add :code:`fullname` to the set.
+
+        :param fullname: Fullname of a reddit thing
+        :return: True if :code:`fullname` was not in the set before
+        """
+        with self._lock:
+            if fullname in self._fullnames:
+                self._fullnames.move_to_end(fullname)
+                return False
+
+            self._remember(fullname)
+            self._unflushed += 1
+            if self._path is not None and self._unflushed >= self._flush_every:
+                self._write()
+            return True
+
+    def _write(self):
+        # Write to a temporary file first, so a crash never leaves a truncated file behind
+        tmp_path = self._path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(''.join(fullname + '\n' for fullname in self._fullnames))
+        os.replace(tmp_path, self._path)
+        self._unflushed = 0
+
+    def flush(self):
+        """Write the set to its file, if it has one."""
+        with self._lock:
+            if self._path is not None and self._unflushed > 0:
+                self._write()
+
+    def close(self):
+        self.flush()
+
+    def __contains__(self, fullname: str) -> bool:
+        with self._lock:
+            return fullname in self._fullnames
+
+    def __len__(self) -> int:
+        return len(self._fullnames)
+
+
+class SQLiteSeenSet(SeenSet):
+    """
+    A :class:`SeenSet` persisted to a SQLite database.
+
+    New fullnames are inserted right away and committed in batches of :code:`flush_every`, so at
+    most that many are lost on a crash. Lookups are served from memory. The table is trimmed to the
+    :code:`capacity` most recent fullnames on :func:`~SQLiteSeenSet.flush`.
+
+    :param path: Path of the SQLite database file
+    :param capacity: Maximum number of fullnames to remember
+    :param flush_every: Number of new fullnames per commit
+    """
+
+    def __init__(self, path: str, capacity: int = 10000, flush_every: int = 100):
+        super().__init__(capacity=capacity, flush_every=flush_every)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS seen '
+                         '(id INTEGER PRIMARY KEY AUTOINCREMENT, fullname TEXT UNIQUE)')
+        self._db.commit()
+
+        rows = self._db.execute('SELECT fullname FROM seen ORDER BY id DESC LIMIT ?', (capacity,))
+        for (fullname,) in reversed(rows.fetchall()):
+            self._remember(fullname)
+
+    def add(self, fullname: str) -> bool:
+        with self._lock:
+            if fullname in self._fullnames:
+                self._fullnames.move_to_end(fullname)
+                return False
+
+            self._remember(fullname)
+            self._db.execute('INSERT OR IGNORE INTO seen (fullname) VALUES (?)', (fullname,))
+            self._unflushed += 1
+            if self._unflushed >= self._flush_every:
+                self._write()
+            return True
+
+    def _write(self):
+        self._db.execute('DELETE FROM seen WHERE id <= (SELECT MAX(id) FROM seen) - ?',
+                         (self._capacity,))
+        self._db.commit()
+        self._unflushed = 0
+
+    def flush(self):
+        """Commit all new fullnames."""
+        with self._lock:
+            self._write()
+
+    def close(self):
+        self.flush()
+        self._db.close()
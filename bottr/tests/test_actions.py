@@ -0,0 +1,103 @@
+import time
+from unittest import TestCase
+
+from bottr.actions import Action, Outbox, Reply
+from bottr.bot import CommentBot
+from bottr.fake import FakeReddit, generate, run_until
+from bottr.retry import RetryPolicy
+
+
+class TestAction(TestCase):
+    def test_apply_is_abstract(self):
+        class Incomplete(Action):
+            pass
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+        self.assertEqual(Reply('x'), Reply('x'))
+
+
+class TestOutbox(TestCase):
+    def setUp(self):
+        self.reddit = FakeReddit(comments=generate('comment', 3))
+        self.comments = self.reddit._items['comment']
+
+    def test_executes_and_dedupes(self):
+        outbox = Outbox()
+        outbox.start()
+        self.assertTrue(outbox.reply(self.comments[0], 'a'))
+        self.assertFalse(outbox.reply(self.comments[0], 'a'))
+        outbox.edit(self.comments[1], 'b')
+        outbox.send_message(self.comments[2], 'someone', 'hi', 'there')
+        outbox.stop()
+        self.assertEqual(self.reddit.actions, [('reply', 't1_1', 'a'), ('edit', 't1_2', 'b'),
+                                               ('message', 'u_someone', 'hi', 'there')])
+
+    def test_retries_failed_actions(self):
+        attempts = []
+
+        class Flaky(Reply):
+            def apply(self, thing):
+                attempts.append(time.monotonic())
+                if len(attempts) < 3:
+                    raise Exception('server error')
+                return super().apply(thing)
+
+        outbox = Outbox(retry=RetryPolicy(base=0.01, max_attempts=5))
+        outbox.start()
+        outbox.put(self.comments[0], Flaky('x'))
+        outbox.reply(self.comments[1], 'y')
+        outbox.stop()
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual(self.reddit.actions, [('reply', 't1_2', 'y'), ('reply', 't1_1', 'x')])
+
+    def test_gives_up_on_rate_limited_actions(self):
+        attempts = []
+
+        class RateLimited(Reply):
+            def apply(self, thing):
+                attempts.append(thing.fullname)
+                raise Exception('RATELIMIT: try again in 0 seconds')
+
+        outbox = Outbox(retry=RetryPolicy(base=0.01, max_attempts=3))
+        outbox.start()
+        outbox.put(self.comments[0], RateLimited('x'))
+        self.assertTrue(outbox.join(5))
+        outbox.stop()
+        self.assertEqual(attempts, ['t1_1'] * 4)
+
+    def test_stop_abandons_after_timeout(self):
+        class RateLimited(Reply):
+            def apply(self, thing):
+                raise Exception('RATELIMIT: try again in 2 seconds')
+
+        outbox = Outbox(retry=RetryPolicy(base=0.01))
+        outbox.start()
+        outbox.put(self.comments[0], RateLimited('x'))
+        self.assertFalse(outbox.join(0.05))
+
+        started = time.monotonic()
+        self.assertFalse(outbox.stop(timeout=0.2))
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(len(outbox), 0)
+
+    def test_bot_stop_timeout_covers_outbox(self):
+        class RateLimited(Reply):
+            def apply(self, thing):
+                raise Exception('RATELIMIT: try again in 2 seconds')
+
+        bot = CommentBot(reddit=self.reddit, func_comment=lambda c: RateLimited('x'),
+                         subreddits=['test'], outbox=Outbox(retry=RetryPolicy(base=0.01)))
+        bot.start()
+        time.sleep(0.2)
+        self.reddit.close()
+        started = time.monotonic()
+        self.assertFalse(bot.stop(timeout=0.5))
+        self.assertLess(time.monotonic() - started, 1.5)
+
+    def test_bot_routes_returned_actions(self):
+        outbox = Outbox()
+        bot = CommentBot(reddit=self.reddit, func_comment=lambda c: Reply('ok'),
+                         subreddits=['test'], outbox=outbox)
+        run_until(bot, self.reddit, lambda: len(self.reddit.actions) >= 3)
+        self.assertEqual(len(self.reddit.actions), 3)
@@ -0,0 +1,63 @@
+import asyncio
+import threading
+import time
+from unittest import TestCase
+
+from bottr.async_bot import AsyncCommentBot, AsyncMessageBot, AsyncSubmissionBot
+from bottr.fake import FakeReddit, generate, run_until
+from bottr.retry import RetryPolicy
+
+
+class TestAsyncBot(TestCase):
+    def test_concurrent_coroutine_handlers(self):
+        reddit = FakeReddit(comments=generate('comment', 200))
+        done = threading.Event()
+        state = {'in_flight': 0, 'peak': 0, 'processed': 0}
+
+        async def parse(comment):
+            state['in_flight'] += 1
+            state['peak'] = max(state['peak'], state['in_flight'])
+            await asyncio.sleep(0.05)
+            state['in_flight'] -= 1
+            state['processed'] += 1
+            if state['processed'] == 200:
+                done.set()
+
+        bot = AsyncCommentBot(reddit=reddit, func_comment=parse, subreddits=['test'],
+                              max_concurrency=50)
+        self.assertTrue(run_until(bot, reddit, done.is_set))
+        self.assertGreater(state['peak'], 10)
+        self.assertLessEqual(state['peak'], 50)
+
+    def test_plain_handler(self):
+        reddit = FakeReddit(messages=generate('message', 20))
+        seen = []
+        done = threading.Event()
+
+        def parse(message):
+            seen.append(message.id)
+            if len(seen) == 20:
+                done.set()
+
+        bot = AsyncMessageBot(reddit=reddit, func_message=parse, max_concurrency=1)
+        self.assertTrue(run_until(bot, reddit, done.is_set))
+        self.assertEqual(len(seen), 20)
+
+    def test_stop_quiet_stream(self):
+        reddit = FakeReddit()
+        bot = AsyncSubmissionBot(reddit=reddit, func_submission=lambda s: None,
+                                 subreddits=['test'])
+        bot.start()
+        time.sleep(0.2)
+
+        # The stream yields no items and is not closed
+        started = time.monotonic()
+        bot.stop()
+        self.assertLess(time.monotonic() - started, 1)
+        reddit.close()
+
+    def test_retry_is_passed_through(self):
+        retry = RetryPolicy(base=0.01)
+        self.assertIs(AsyncMessageBot(reddit=None, retry=retry)._retry, retry)
+        self.assertIs(AsyncCommentBot(reddit=None, retry=retry)._retry, retry)
+        self.assertIs(AsyncSubmissionBot(reddit=None, retry=retry)._retry, retry)
@@ -1,6 +1,192 @@
+import threading
+import time
+from queue import Queue
 from unittest import TestCase
-from bottr.bot import BotThread
+
+from bottr.actions import Reply
+from bottr.bot import BotThread, BatchQueueWorker, BotQueueWorker, CommentBot, CombinedBot, \
+    MessageBot
+from bottr.fake import FakeReddit, generate, run_until, running, wait_until
+from bottr.queues import DROP_OLDEST, OverflowPolicy
+
 
 class Test(TestCase):
     def test_is_string(self):
-        self.assertTrue(True)
\ No newline at end of file
+        self.assertTrue(True)
+
+
+class TestBotQueueWorker(TestCase):
+    def test_survives_queue_errors(self):
+        class FailingQueue(Queue):
+            failed = False
+
+            def get(self, block=True, timeout=None):
+                if not self.failed:
+                    self.failed = True
+                    raise ConnectionError('Connection reset')
+                return super().get(block, timeout)
+
+        jobs = FailingQueue()
+        done = []
+        worker = BotQueueWorker(name='worker', jobs=jobs, target=done.append)
+        worker.start()
+        for job in [1, 2, None]:
+            jobs.put(job)
+        worker.join(5)
+        self.assertFalse(worker.is_alive())
+        self.assertEqual(done, [1, 2])
+
+
+class TestBatchQueueWorker(TestCase):
+    def test_batches_by_size_and_wait(self):
+        jobs = Queue()
+        batches = []
+        worker = BatchQueueWorker(name='batch', jobs=jobs, target=batches.append,
+                                  batch_size=3, batch_wait=0.05)
+        for i in range(5):
+            jobs.put(i)
+        worker.start()
+        time.sleep(0.2)
+        jobs.put(5)
+        jobs.put(None)
+        worker.join(1)
+        self.assertEqual(batches, [[0, 1, 2], [3, 4], [5]])
+
+    def test_comment_bot_batch_mode(self):
+        reddit = FakeReddit(comments=generate('comment', 10))
+        sizes = []
+
+        def classify(comments):
+            sizes.append(len(comments))
+            return [Reply('ok') if c.id == '3' else None for c in comments]
+
+        bot = CommentBot(reddit=reddit, func_comments=classify, subreddits=['test'],
+                         n_jobs=1, batch_size=4, batch_wait=0.5)
+        run_until(bot, reddit, lambda: sum(sizes) >= 10)
+        self.assertEqual(sum(sizes), 10)
+        self.assertLessEqual(max(sizes), 4)
+        self.assertEqual(reddit.actions, [('reply', 't1_3', 'ok')])
+
+
+class TestCombinedBot(TestCase):
+    def test_all_streams_share_workers(self):
+        reddit = FakeReddit(comments=generate('comment', 20),
+                            submissions=generate('submission', 10),
+                            messages=generate('message', 5))
+        seen = []
+
+        bot = CombinedBot(reddit=reddit,
+                          func_comment=lambda c: seen.append(('comment', c.id)),
+                          func_submission=lambda s: seen.append(('submission', s.id)),
+                          func_message=lambda m: seen.append(('message', m.id)),
+                          subreddits=['test'], n_jobs=2,
+                          weights={'comments': 2, 'submissions': 1, 'inbox': 1})
+        run_until(bot, reddit, lambda: len(seen) >= 35)
+        self.assertEqual(len(seen), 35)
+        self.assertEqual(len([s for s in seen if s[0] == 'message']), 5)
+
+
+class TestSharding(TestCase):
+    def test_shards(self):
+        bot = CommentBot(reddit=None, subreddits=['a', 'b', 'B', 'c', 'd'], shard_size=2)
+        self.assertEqual(bot._shards(), [['a', 'B'], ['c', 'd']])
+        self.assertEqual(CommentBot(reddit=None, subreddits=['a', 'b'])._shards(), [['a', 'b']])
+
+    def test_sharded_comment_bot(self):
+        reddit = FakeReddit(comments=generate('comment', 30, subreddits=['a', 'b', 'c']))
+        seen = []
+        bot = CommentBot(reddit=reddit, func_comment=lambda c: seen.append(c.id),
+                         subreddits=['a', 'b', 'c', 'all'], shard_size=1)
+        with running(bot, reddit):
+            wait_until(lambda: len(seen) >= 30)
+            time.sleep(0.1)
+        self.assertEqual(sorted(seen), sorted(c.id for c in reddit._items['comment']))
+
+
+    def test_reshard(self):
+        bot = CommentBot(reddit=None, subreddits=['a', 'b', 'c', 'd'], shard_size=2)
+        bot.set_subreddits(['a', 'b', 'c', 'e'])
+        self.assertEqual(bot._shard_subs, [['a', 'b'], ['c', 'e']])
+        bot.set_subreddits(['a', 'c', 'e', 'f', 'g', 'h'])
+        self.assertEqual(bot._shard_subs, [['a', 'f'], ['c', 'e'], ['g', 'h']])
+
+    def test_set_subreddits(self):
+        reddit = FakeReddit(comments=generate('comment', 30, subreddits=['a', 'b', 'c']))
+        seen = []
+        bot = CommentBot(reddit=reddit, func_comment=lambda c: seen.append(c.subreddit),
+                         subreddits=['a', 'b'], shard_size=1)
+        bot.set_blacklist(['B'])
+        started = []
+        stream = bot._subreddit_stream
+
+        def counted(subs, kind):
+            started.append(subs)
+            return stream(subs, kind)
+
+        bot._subreddit_stream = counted
+        with running(bot, reddit):
+            wait_until(lambda: len(seen) >= 10)
+
+            # Only the stream of the new subreddit is started
+            bot.set_subreddits(['a', 'b', 'c'])
+            wait_until(lambda: len(seen) >= 20)
+            time.sleep(0.1)
+
+        self.assertEqual(sorted(seen), ['a'] * 10 + ['c'] * 10)
+        self.assertEqual(sorted(started), [['a'], ['b'], ['c']])
+
+
+class TestStop(TestCase):
+    def test_stop_quiet_stream(self):
+        # The stream stays open, stopping must not wait for a new item
+        reddit = FakeReddit(messages=generate('message', 3))
+        seen = []
+        bot = MessageBot(reddit=reddit, func_message=lambda m: seen.append(m.id))
+        bot.start()
+        wait_until(lambda: len(seen) >= 3)
+
+        started = time.time()
+        self.assertTrue(bot.stop(timeout=5))
+        self.assertLess(time.time() - started, 2)
+        reddit.close()
+
+    def test_abandon_after_timeout(self):
+        reddit = FakeReddit(comments=generate('comment', 20))
+        release = threading.Event()
+        seen = []
+
+        def slow(comment):
+            release.wait(5)
+            seen.append(comment.id)
+
+        bot = CommentBot(reddit=reddit, func_comment=slow, subreddits=['test'], n_jobs=1,
+                         overflow=OverflowPolicy(DROP_OLDEST, maxsize=100))
+        bot.start()
+        wait_until(lambda: reddit.emitted.keys() == set(c.fullname for c in reddit._items['comment']))
+
+        # The only worker is stuck in its handler, the queued comments are abandoned
+        self.assertFalse(bot.stop(timeout=0.2))
+        time.sleep(0.3)
+        release.set()
+        for t in bot._threads:
+            t.join(5)
+        self.assertEqual(seen, ['1'])
+        reddit.close()
+
+
+class TestSetFunc(TestCase):
+    def test_set_func_comment(self):
+        reddit = FakeReddit(comments=generate('comment', 10))
+        seen = []
+        bot = CommentBot(reddit=reddit, func_comment=lambda c: seen.append(('old', c.id)),
+                         subreddits=['test'], n_jobs=1)
+        with running(bot, reddit):
+            wait_until(lambda: len(seen) >= 10)
+
+            bot.set_func_comment(lambda c, tag: seen.append((tag, c.id)), ['new'])
+            reddit._items['comment'].extend(generate('comment', 12)[10:])
+            bot._process_comment(reddit._items['comment'][-1])
+        self.assertEqual(seen[-1], ('new', 'c'))
+
+        with self.assertRaises(Exception):
+            bot.set_func_comment(func_comments=lambda comments: None)
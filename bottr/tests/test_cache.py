@@ -0,0 +1,30 @@
+import time
+from unittest import TestCase
+
+from bottr.cache import TTLCache
+
+
+class TestTTLCache(TestCase):
+    def test_get_set_and_stats(self):
+        cache = TTLCache()
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(cache.hit_rate, 0.5)
+
+    def test_maxsize_evicts_least_recently_used(self):
+        cache = TTLCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+
+    def test_ttl(self):
+        cache = TTLCache(ttl=0.05)
+        cache.set('a', 1)
+        time.sleep(0.1)
+        self.assertNotIn('a', cache)
+        self.assertEqual(cache.get('a', 'gone'), 'gone')
@@ -0,0 +1,63 @@
+from unittest import TestCase
+
+from bottr import ratelimit
+from bottr.actions import Edit, Outbox, Reply
+from bottr.clients import ClientPool
+from bottr.fake import FakeReddit, generate, wait_until
+
+
+class TestClientPool(TestCase):
+    def setUp(self):
+        self.alice = FakeReddit(username='alice')
+        self.bob = FakeReddit(username='Bob')
+        self.clients = ClientPool([self.alice, self.bob])
+
+    def test_choose(self):
+        self.assertIs(self.clients.choose(account='bob'), self.bob)
+        with self.assertRaises(Exception):
+            self.clients.choose(account='carol')
+
+        # Equal budgets take turns, a blocked account is avoided
+        self.assertEqual(set(self.clients.choose() for _ in range(2)), {self.alice, self.bob})
+        ratelimit.for_reddit(self.alice).block(60)
+        self.assertEqual(set(self.clients.choose() for _ in range(4)), {self.bob})
+
+    def test_bind(self):
+        comment = generate('comment', 1)[0]
+        comment._reddit = self.alice
+        bound = ClientPool.bind(comment, self.bob)
+        bound.reply('hi')
+        self.assertIs(comment._reddit, self.alice)
+        self.assertEqual(self.bob.actions, [('reply', 't1_1', 'hi')])
+
+    def test_outbox(self):
+        comments = generate('comment', 2)
+        comments[1].author = 'alice'
+        for comment in comments:
+            comment._reddit = self.alice
+
+        outbox = Outbox(clients=self.clients)
+        outbox.start()
+        outbox.put(comments[0], Reply('as bob', account='bob'))
+        outbox.put(comments[1], Edit('edited'))
+        outbox.stop()
+
+        self.assertEqual(self.bob.actions, [('reply', 't1_1', 'as bob')])
+        self.assertEqual(self.alice.actions, [('edit', 't1_2', 'edited')])
+
+    def test_paused_account_does_not_block_others(self):
+        comments = generate('comment', 2)
+        for comment in comments:
+            comment._reddit = self.alice
+
+        ratelimit.for_reddit(self.bob).block(60)
+        outbox = Outbox(clients=self.clients)
+        outbox.start()
+        outbox.put(comments[0], Reply('as bob', account='bob'))
+        outbox.put(comments[1], Reply('as alice', account='alice'))
+        wait_until(lambda: self.alice.actions)
+
+        self.assertEqual(self.alice.actions, [('reply', 't1_2', 'as alice')])
+        self.assertEqual(len(outbox), 1)
+        self.assertFalse(outbox.stop(drain=False))
+        self.assertEqual(self.bob.actions, [])
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import threading
+from unittest import TestCase
+
+from bottr.coordinator import Coordinator, HashRing
+
+
+class TestHashRing(TestCase):
+    def test_only_moves_keys_of_new_member(self):
+        keys = ['sub{}'.format(i) for i in range(200)]
+        before = HashRing(['a', 'b'])
+        after = HashRing(['a', 'b', 'c'])
+        moved = [k for k in keys if before.owner(k) != after.owner(k)]
+        self.assertTrue(all(after.owner(k) == 'c' for k in moved))
+        self.assertGreater(len(moved), 30)
+        self.assertIsNone(HashRing([]).owner('sub'))
+
+
+class TestCoordinator(TestCase):
+    def test_handoff(self):
+        subs = sorted('sub{}'.format(i) for i in range(30))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'coordinator.db')
+            a = Coordinator(path, member='a')
+            b = Coordinator(path, member='b')
+            self.assertEqual(a.rebalance(subs), subs)
+
+            # b joins, but only takes over subreddits once a released them
+            self.assertEqual(b.rebalance(subs), [])
+            held_a = a.rebalance(subs)
+            held_b = b.rebalance(subs)
+            self.assertEqual(sorted(held_a + held_b), subs)
+            self.assertTrue(held_a and held_b)
+            self.assertEqual(a.members(), ['a', 'b'])
+
+            # a leaves, b takes over everything
+            a.stop()
+            self.assertEqual(b.rebalance(subs), subs)
+            a.close()
+            b.close()
+
+    def test_start(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            changed = threading.Event()
+            assigned = []
+
+            def on_change(subs):
+                assigned.append(subs)
+                changed.set()
+
+            coordinator = Coordinator(os.path.join(tmp, 'coordinator.db'), member='a',
+                                      heartbeat_interval=0.05, lease_timeout=1)
+            coordinator.start(['B', 'a'], on_change)
+            self.assertTrue(changed.wait(5))
+            coordinator.stop()
+            coordinator.close()
+            self.assertEqual(assigned, [['a', 'b']])
@@ -0,0 +1,55 @@
+import threading
+from unittest import TestCase
+
+from bottr.benchmark import run_benchmark, percentile
+from bottr.bot import CommentBot
+from bottr.fake import FakeReddit, generate, run_until
+
+
+class TestFakeReddit(TestCase):
+    def test_stream_filters_subreddits(self):
+        reddit = FakeReddit(comments=generate('comment', 6, subreddits=['a', 'b', 'c']))
+        reddit.close()
+        ids = [c.id for c in reddit.subreddit('a+c').stream.comments()]
+        self.assertEqual(ids, ['1', '3', '4', '6'])
+
+    def test_reply_is_recorded(self):
+        reddit = FakeReddit(comments=generate('comment', 1))
+        reddit.close()
+        for comment in reddit.subreddit('test').stream.comments():
+            comment.reply('hi')
+        self.assertEqual(reddit.actions, [('reply', 't1_1', 'hi')])
+
+    def test_pause_after_yields_none(self):
+        reddit = FakeReddit()
+        stream = reddit.inbox.stream(pause_after=0)
+        self.assertIsNone(next(stream))
+        reddit.close()
+
+    def test_comment_bot(self):
+        reddit = FakeReddit(comments=generate('comment', 50))
+        seen = []
+        lock = threading.Lock()
+        done = threading.Event()
+
+        def parse(comment):
+            with lock:
+                seen.append(comment.id)
+                if len(seen) == 50:
+                    done.set()
+
+        bot = CommentBot(reddit=reddit, func_comment=parse, subreddits=['test'], n_jobs=3)
+        self.assertTrue(run_until(bot, reddit, done.is_set))
+        self.assertEqual(len(set(seen)), 50)
+
+
+class TestBenchmark(TestCase):
+    def test_percentile(self):
+        self.assertEqual(percentile([1, 2, 3, 4, 5], 50), 3)
+        self.assertEqual(percentile([], 99), 0.0)
+
+    def test_run_benchmark(self):
+        for kind in ['comment', 'submission', 'message']:
+            result = run_benchmark(kind=kind, n_items=100, n_jobs=2, timeout=10)
+            self.assertEqual(len(result.latencies), 100)
+            self.assertGreater(result.throughput, 0)
@@ -0,0 +1,35 @@
+from unittest import TestCase
+
+from bottr.bot import CommentBot
+from bottr.fake import FakeReddit, generate, run_until
+from bottr.hydrate import Hydrator
+
+
+class TestHydrator(TestCase):
+    def test_hydrate(self):
+        submissions = generate('submission', 150, body='Bananas')
+        comments = generate('comment', 150)
+        reddit = FakeReddit(comments=comments, submissions=submissions)
+
+        hydrator = Hydrator(['submission', 'parent'])
+        hydrator.hydrate(comments)
+        self.assertEqual([len(call) for call in reddit.info_calls], [100, 50])
+        self.assertIs(comments[0].submission, submissions[0])
+        self.assertIs(hydrator.parent(comments[1]), submissions[1])
+
+        # Related things are cached
+        hydrator.hydrate(comments[:10])
+        self.assertEqual(len(reddit.info_calls), 2)
+
+        with self.assertRaises(Exception):
+            Hydrator(['author'])
+
+    def test_comment_bot(self):
+        reddit = FakeReddit(comments=generate('comment', 50),
+                            submissions=generate('submission', 50, body='Bananas'))
+        titles = []
+        bot = CommentBot(reddit=reddit, func_comment=lambda c: titles.append(c.submission.title),
+                         subreddits=['test'], hydrator=Hydrator(['submission'], wait=0.05))
+        run_until(bot, reddit, lambda: len(titles) >= 50)
+        self.assertEqual(titles, ['Bananas'] * 50)
+        self.assertLessEqual(len(reddit.info_calls), 5)
@@ -0,0 +1,78 @@
+from unittest import TestCase
+
+from bottr.actions import Reply
+from bottr.bot import CommentBot
+from bottr.fake import FakeReddit, generate, run_until
+from bottr.memo import Memo, normalize
+
+
+class TestMemo(TestCase):
+    def test_normalize(self):
+        self.assertEqual(normalize('  This!!'), 'this')
+        self.assertEqual(normalize('Ｔｈｉｓ\n is   IT.'), 'this is it')
+
+    def test_call(self):
+        memo = Memo()
+        comments = generate('comment', 3, body='This!')
+        comments[1].body = 'this'
+        comments[2].body = 'that'
+        calls = []
+
+        def classify(comment):
+            calls.append(comment.id)
+            return len(calls)
+
+        self.assertEqual([memo.call(classify, c, 'comment') for c in comments], [1, 1, 2])
+        self.assertEqual(calls, ['1', '3'])
+        self.assertEqual((memo.hits, memo.misses), (1, 2))
+
+    def test_args_are_part_of_the_key(self):
+        memo = Memo()
+        comment = generate('comment', 1, body='banana')[0]
+
+        def tag(c, label):
+            return label
+
+        self.assertEqual(memo.call(tag, comment, 'comment', 'fruit'), 'fruit')
+        self.assertEqual(memo.call(tag, comment, 'comment', 'yellow'), 'yellow')
+        self.assertEqual(memo.call(tag, comment, 'comment', ['unhashable']), ['unhashable'])
+        self.assertEqual(memo.hits, 0)
+
+    def test_call_batch(self):
+        memo = Memo()
+        comments = generate('comment', 4, body='copypasta')
+        comments[3].body = 'original'
+        batches = []
+
+        def classify(batch):
+            batches.append([c.id for c in batch])
+            return [c.body.upper() for c in batch]
+
+        self.assertEqual(memo.call_batch(classify, comments[:2], 'comment'),
+                         ['COPYPASTA', 'COPYPASTA'])
+        self.assertEqual(memo.call_batch(classify, comments[2:], 'comment'),
+                         ['COPYPASTA', 'ORIGINAL'])
+        self.assertEqual(batches, [['1'], ['4']])
+
+        with self.assertRaises(Exception):
+            memo.call_batch(lambda batch: [], generate('comment', 1, body='new'), 'comment')
+
+
+class TestCommentBot(TestCase):
+    def test_memo(self):
+        reddit = FakeReddit(comments=generate('comment', 20, body='Bananas!'))
+        calls = []
+
+        def classify(comment):
+            calls.append(comment.id)
+            return Reply('Bananas.')
+
+        memo = Memo()
+        bot = CommentBot(reddit=reddit, func_comment=classify, subreddits=['test'], n_jobs=1,
+                         memo=memo)
+        run_until(bot, reddit, lambda: len(reddit.actions) >= 20)
+
+        # Every comment is replied to, but only the first one is classified
+        self.assertEqual(len(reddit.actions), 20)
+        self.assertEqual(calls, ['1'])
+        self.assertEqual(memo.hits, 19)
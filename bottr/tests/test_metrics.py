@@ -0,0 +1,89 @@
+import urllib.request
+from unittest import TestCase
+
+from bottr.bot import CommentBot
+from bottr.fake import FakeReddit, generate, run_until
+from bottr.metrics import EnqueueTimes, Registry
+
+
+class TestRegistry(TestCase):
+    def test_render(self):
+        registry = Registry()
+        registry.counter('jobs_total', 'Jobs', ['bot']).labels(bot='a').inc(2)
+        registry.gauge('depth', 'Depth').set(3)
+        histogram = registry.histogram('seconds', 'Seconds', buckets=[0.1, 1])
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+
+        text = registry.render()
+        self.assertIn('# TYPE jobs_total counter\njobs_total{bot="a"} 2\n', text)
+        self.assertIn('depth 3\n', text)
+        self.assertIn('seconds_bucket{le="0.1"} 1\n', text)
+        self.assertIn('seconds_bucket{le="1"} 2\n', text)
+        self.assertIn('seconds_bucket{le="+Inf"} 3\n', text)
+        self.assertIn('seconds_count 3\n', text)
+        self.assertEqual(histogram.percentile(50), 1)
+        self.assertEqual(histogram.percentile(100), float('inf'))
+
+    def test_shared_metrics_and_labels(self):
+        registry = Registry()
+        counter = registry.counter('jobs_total', 'Jobs', ['bot'])
+        self.assertIs(registry.counter('jobs_total', 'Jobs', ['bot']), counter)
+        with self.assertRaises(Exception):
+            counter.labels(stream='comments')
+        with self.assertRaises(Exception):
+            registry.gauge('jobs_total', 'Jobs')
+
+    def test_serve(self):
+        registry = Registry()
+        registry.counter('jobs_total', 'Jobs').inc()
+        server = registry.serve(port=0)
+        try:
+            url = 'http://127.0.0.1:{}/metrics'.format(server.server_address[1])
+            body = urllib.request.urlopen(url, timeout=5).read().decode('utf-8')
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertIn('jobs_total 1\n', body)
+
+
+class TestEnqueueTimes(TestCase):
+    def test_key_and_bound(self):
+        times = EnqueueTimes(key=lambda job: job.fullname, maxsize=2)
+        comments = generate('comment', 3)
+        for comment in comments:
+            times.add(comment)
+        self.assertEqual(len(times), 2)
+
+        # A copy of a stored job is found by its key, the oldest time was forgotten
+        self.assertIsNotNone(times.pop(generate('comment', 3)[2]))
+        self.assertIsNone(times.pop(comments[0]))
+        self.assertEqual(len(times), 1)
+
+
+class TestBotMetrics(TestCase):
+    def test_comment_bot_metrics(self):
+        reddit = FakeReddit(comments=generate('comment', 10))
+        registry = Registry()
+        done = []
+
+        def parse(comment):
+            done.append(comment.id)
+            if comment.id == '3':
+                raise ValueError('Handler failed')
+
+        bot = CommentBot(reddit=reddit, name='MetricsBot', func_comment=parse,
+                         subreddits=['test'], n_jobs=2, metrics=registry)
+        run_until(bot, reddit, lambda: len(done) >= 10)
+
+        def get(name):
+            return registry.get(name).labels(bot='MetricsBot', stream='comments')
+
+        self.assertEqual(get('bottr_items_received_total').value, 10)
+        self.assertEqual(get('bottr_items_processed_total').value, 9)
+        self.assertEqual(get('bottr_items_failed_total').value, 1)
+        self.assertEqual(get('bottr_busy_workers').value, 0)
+        self.assertEqual(get('bottr_queue_wait_seconds').count, 10)
+        self.assertEqual(get('bottr_handler_seconds').count, 10)
+        self.assertEqual(get('bottr_stream_lag_seconds').count, 10)
@@ -0,0 +1,80 @@
+import threading
+import time
+from queue import Queue
+from unittest import TestCase
+
+from bottr.bot import BotQueueWorker, CommentBot
+from bottr.fake import FakeReddit, generate, run_until, wait_until
+from bottr.metrics import BotMetrics, Registry
+from bottr.pool import AutoscalePolicy, WorkerPool
+
+
+class TestAutoscalePolicy(TestCase):
+    def test_desired(self):
+        policy = AutoscalePolicy(min_jobs=2, max_jobs=5, max_depth=2, max_wait=1.0)
+        self.assertEqual(policy.desired(2, 4), 2)
+        self.assertEqual(policy.desired(2, 5), 3)
+        self.assertEqual(policy.desired(4, 100), 5)
+        self.assertEqual(policy.desired(2, 0, wait=1.5), 3)
+        self.assertEqual(policy.desired(2, 0, wait=0.5), 2)
+        self.assertTrue(policy.may_retire(3))
+        self.assertFalse(policy.may_retire(2))
+
+        with self.assertRaises(Exception):
+            AutoscalePolicy(min_jobs=3, max_jobs=2)
+
+
+class TestWorkerPool(TestCase):
+    def test_grows_and_retires(self):
+        jobs = Queue()
+        release = threading.Event()
+        done = []
+        metrics = BotMetrics(Registry(), 'test').stream('comment')
+
+        def handle(job):
+            release.wait(5)
+            done.append(job)
+
+        def create(name, retire, idle_timeout):
+            return BotQueueWorker(name=name, jobs=jobs, target=handle, metrics=metrics,
+                                  retire=retire, idle_timeout=idle_timeout)
+
+        policy = AutoscalePolicy(min_jobs=1, max_jobs=4, max_depth=1, max_wait=None,
+                                 idle_timeout=0.05)
+        pool = WorkerPool('test', jobs, create, policy, metrics)
+        pool.start()
+        for i in range(10):
+            jobs.put(i)
+
+        # The only worker is blocked, the backlog grows the pool up to its maximum
+        pool.scale()
+        self.assertEqual(pool.size, 2)
+        pool.scale()
+        pool.scale()
+        self.assertEqual(pool.size, 4)
+        self.assertEqual(metrics.workers.value, 4)
+
+        release.set()
+        jobs.join()
+        wait_until(lambda: pool.size <= 1)
+        self.assertEqual(pool.size, 1)
+
+        pool.stop()
+        self.assertEqual(sorted(done), list(range(10)))
+        self.assertFalse(any(t.is_alive() for t in pool.threads))
+
+
+class TestAutoscaleBot(TestCase):
+    def test_comment_bot(self):
+        reddit = FakeReddit(comments=generate('comment', 40))
+        seen = []
+
+        def slow(comment):
+            time.sleep(0.01)
+            seen.append(comment.id)
+
+        policy = AutoscalePolicy(min_jobs=1, max_jobs=4, max_depth=1, interval=0.01)
+        bot = CommentBot(reddit=reddit, func_comment=slow, subreddits=['test'],
+                         autoscale=policy, metrics=Registry())
+        run_until(bot, reddit, lambda: len(seen) >= 40)
+        self.assertEqual(sorted(seen), sorted(c.id for c in reddit._items['comment']))
@@ -0,0 +1,42 @@
+import pickle
+from unittest import TestCase
+
+from bottr.actions import Reply, apply_actions
+from bottr.bot import CommentBot
+from bottr.fake import FakeReddit, generate, run_until
+from bottr.process import snapshot
+
+
+def classify(comment):
+    """Module-level handler, so it can be sent to a process pool."""
+    if int(comment.id, 16) % 2 == 0:
+        return Reply('even {}'.format(comment.id))
+
+
+class TestSnapshot(TestCase):
+    def test_snapshot_is_picklable(self):
+        comment = generate('comment', 1)[0]
+        snap = pickle.loads(pickle.dumps(snapshot(comment, 'comment')))
+        self.assertEqual(snap.body, comment.body)
+        self.assertEqual(snap.fullname, 't1_1')
+        self.assertIsNone(snap.score)
+
+
+class TestActions(TestCase):
+    def test_apply_actions(self):
+        reddit = FakeReddit(comments=generate('comment', 1))
+        comment = reddit._items['comment'][0]
+        apply_actions([Reply('a'), Reply('b')], comment)
+        apply_actions(None, comment)
+        self.assertEqual(reddit.actions, [('reply', 't1_1', 'a'), ('reply', 't1_1', 'b')])
+
+
+class TestProcessPool(TestCase):
+    def test_comment_bot_with_processes(self):
+        reddit = FakeReddit(comments=generate('comment', 20))
+        bot = CommentBot(reddit=reddit, func_comment=classify, subreddits=['test'],
+                         n_jobs=4, n_processes=2)
+        run_until(bot, reddit, lambda: len(reddit.actions) >= 10, timeout=10)
+        self.assertEqual(sorted(reddit.actions),
+                         sorted(('reply', 't1_{:x}'.format(i), 'even {:x}'.format(i))
+                                for i in range(2, 21, 2)))
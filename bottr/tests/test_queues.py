@@ -0,0 +1,387 @@
+import os
+import tempfile
+import threading
+import time
+from queue import Empty, Full, Queue
+from unittest import TestCase
+
+from bottr.bot import CommentBot
+from bottr.fake import FakeReddit, generate, run_until, running, wait_until
+from bottr.metrics import Registry
+from bottr.queues import FairPolicy, FairQueue, OverflowPolicy, OverflowQueue, SQLiteQueue, \
+    WeightedQueue, DROP_OLDEST, DROP_PRIORITY, SPILL, abandon, _pickle_load
+from bottr.retry import RetryPolicy
+
+
+def failing_load(failures: int):
+    """Pickle load function raising :code:`ConnectionError` on its first calls."""
+    calls = []
+
+    def load(lines):
+        calls.append(lines)
+        if len(calls) <= failures:
+            raise ConnectionError('Connection reset')
+        return _pickle_load(lines)
+
+    return load, calls
+
+
+class TestWeightedQueue(TestCase):
+    def test_weighted_round_robin(self):
+        q = WeightedQueue(key=lambda job: job[0], weights={'a': 3, 'b': 1})
+        for i in range(8):
+            q.put(('a', i))
+            q.put(('b', i))
+        lanes = [q.get()[0] for _ in range(8)]
+        self.assertEqual(lanes.count('a'), 6)
+        self.assertEqual(lanes.count('b'), 2)
+
+    def test_idle_lane_leaves_share(self):
+        q = WeightedQueue(key=lambda job: job[0], weights={'a': 1, 'b': 5})
+        for i in range(3):
+            q.put(('a', i))
+        self.assertEqual([q.get() for _ in range(3)], [('a', 0), ('a', 1), ('a', 2)])
+
+    def test_sentinel_after_items(self):
+        q = WeightedQueue(key=lambda job: job[0])
+        q.put(None)
+        q.put(('a', 0))
+        self.assertEqual(q.get(), ('a', 0))
+        self.assertIsNone(q.get())
+        self.assertEqual(q.qsize(), 0)
+
+    def test_lane_size_blocks_only_full_lane(self):
+        q = WeightedQueue(key=lambda job: job[0], lane_size=1)
+        q.put(('a', 0))
+        q.put(('b', 0), block=False)
+        with self.assertRaises(Full):
+            q.put(('a', 1), block=False)
+
+        t = threading.Thread(target=q.put, args=(('a', 1),))
+        t.start()
+        q.get()
+        q.get()
+        t.join(1)
+        self.assertFalse(t.is_alive())
+
+
+class TestFairQueue(TestCase):
+    def test_flood_does_not_delay_other_subreddits(self):
+        q = FairQueue(weights={'news': 2})
+        flood = generate('comment', 100, subreddits=['AskReddit'])
+        for item in flood + generate('comment', 2, subreddits=['news']):
+            q.put(item)
+        subs = [q.get().subreddit for _ in range(6)]
+        self.assertEqual(subs.count('news'), 2)
+        self.assertEqual(q.lane_sizes(), {(0, 'askreddit'): 96})
+
+    def test_priority_first(self):
+        q = FairQueue(priority=lambda item: 1 if 'u/bot' in item.body else 0)
+        items = generate('message', 3) + generate('message', 1, body='Hey u/bot')
+        for item in items:
+            q.put(item)
+        q.put(None)
+        self.assertEqual([q.get() for _ in range(5)], [items[3]] + items[:3] + [None])
+
+    def test_shedding(self):
+        dropped = []
+        q = FairQueue(priority=lambda item: 1 if item.subreddit == 'mod' else 0, lane_size=3,
+                      maxsize=5, on_drop=dropped.append)
+        items = generate('comment', 8, subreddits=['big'] * 4 + ['small', 'mod', 'small', 'big'])
+        for item in items:
+            q.put(item, block=False)
+
+        # The oldest item of the full lane, then of the largest lane of the lowest priority
+        self.assertEqual(dropped, items[:3])
+        self.assertEqual(q.dropped, 3)
+        self.assertEqual(q.lane_sizes(), {(0, 'big'): 2, (0, 'small'): 2, (1, 'mod'): 1})
+        q.put(None)
+        self.assertEqual([q.get() for _ in range(6)],
+                         [items[5], items[3], items[4], items[7], items[6], None])
+
+        for _ in range(6):
+            q.task_done()
+        q.join()
+
+    def test_comment_bot(self):
+        # Comments 21 and 42 are in the small subreddit
+        reddit = FakeReddit(comments=generate('comment', 42, subreddits=['big'] * 20 + ['small']))
+        done = []
+        started = threading.Event()
+
+        def parse(comment):
+            started.wait(5)
+            done.append(comment.subreddit)
+
+        bot = CommentBot(reddit=reddit, func_comment=parse, subreddits=['big', 'small'], n_jobs=1,
+                         fair=FairPolicy())
+        with running(bot, reddit):
+            time.sleep(0.3)
+            started.set()
+            wait_until(lambda: len(done) >= 42)
+
+        self.assertEqual(len(done), 42)
+        self.assertEqual(done[:6].count('small'), 2)
+
+    def test_priority_behind_flood(self):
+        # A single stream yields a flood from one subreddit and then a priority item
+        reddit = FakeReddit(comments=generate('comment', 61, subreddits=['big'] * 60 + ['small']))
+        done = []
+        started = threading.Event()
+
+        def parse(comment):
+            started.wait(5)
+            done.append(comment.subreddit)
+
+        bot = CommentBot(reddit=reddit, func_comment=parse, subreddits=['big', 'small'], n_jobs=1,
+                         fair=FairPolicy(priority=lambda c: c.subreddit == 'small'))
+        with running(bot, reddit):
+            time.sleep(0.3)
+            started.set()
+            wait_until(lambda: len(done) >= 61)
+
+        self.assertEqual(len(done), 61)
+        self.assertIn('small', done[:2])
+
+
+class TestAbandon(TestCase):
+    def test_keeps_sentinels(self):
+        q = Queue()
+        for job in [1, None, 2]:
+            q.put(job)
+        self.assertEqual(abandon(q), 2)
+        self.assertIsNone(q.get())
+        q.task_done()
+        q.join()
+
+        q = WeightedQueue(key=lambda job: job % 2)
+        for job in [1, 2, None]:
+            q.put(job)
+        self.assertEqual(abandon(q), 2)
+        self.assertIsNone(q.get())
+
+
+class TestOverflowQueue(TestCase):
+    def test_drop_oldest(self):
+        dropped = []
+        q = OverflowQueue(3, DROP_OLDEST, on_drop=dropped.append)
+        for i in range(5):
+            q.put(i)
+        q.put(None)
+        self.assertEqual([q.get() for _ in range(4)], [2, 3, 4, None])
+        self.assertEqual(dropped, [0, 1])
+        self.assertEqual(q.dropped, 2)
+
+    def test_drop_priority(self):
+        q = OverflowQueue(3, DROP_PRIORITY, priority=lambda job: job[1])
+        for job in [('a', 2), ('b', 1), ('c', 3), ('d', 0), ('e', 2), ('f', 1)]:
+            q.put(job)
+        # 'd' and 'f' are lower than all queued items, 'b' was the lowest when 'e' arrived
+        self.assertEqual([q.get()[0] for _ in range(3)], ['a', 'c', 'e'])
+        self.assertEqual(q.dropped, 3)
+
+        # Items are done once dropped, so join() does not wait for them
+        for _ in range(3):
+            q.task_done()
+        q.join()
+
+    def test_spill(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'spill')
+            q = OverflowQueue(2, SPILL, spill_path=path, load_batch=2)
+            for i in range(5):
+                q.put(i)
+            self.assertEqual(q.spilled, 3)
+            self.assertEqual(q.qsize(), 5)
+            self.assertEqual([q.get() for _ in range(5)], [0, 1, 2, 3, 4])
+            self.assertEqual(os.path.getsize(path), 0)
+
+            # Stopping leaves the spilled items in the file
+            for i in range(5, 9):
+                q.put(i)
+            q.put(None)
+            self.assertEqual([q.get() for _ in range(3)], [5, 6, None])
+            self.assertEqual(q.spill_size, 2)
+            q.close()
+
+            # Items spilled before a restart are taken first
+            q = OverflowQueue(2, SPILL, spill_path=path)
+            q.put(9)
+            self.assertEqual([q.get() for _ in range(3)], [7, 8, 9])
+            q.close()
+
+    def test_spill_load_failure(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            load, calls = failing_load(1)
+            q = OverflowQueue(1, SPILL, spill_path=os.path.join(tmp, 'spill'), load=load,
+                              retry=RetryPolicy(base=0.1, jitter=0))
+            for i in range(4):
+                q.put(i)
+            self.assertEqual(q.get(), 0)
+
+            # The failed batch stays in the file and is loaded again after the delay
+            with self.assertRaises(Empty):
+                q.get(timeout=0.02)
+            self.assertEqual(q.spill_size, 3)
+            self.assertEqual([q.get(timeout=1) for _ in range(3)], [1, 2, 3])
+            self.assertEqual(len(calls), 2)
+            for _ in range(4):
+                q.task_done()
+            q.join()
+            q.close()
+
+    def test_spilled_comments_are_fetched_again(self):
+        reddit = FakeReddit(comments=generate('comment', 30))
+        registry = Registry()
+        done = []
+        started = threading.Event()
+
+        def parse(comment):
+            started.wait(5)
+            done.append(comment.id)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            bot = CommentBot(reddit=reddit, name='SpillBot', func_comment=parse,
+                             subreddits=['test'], n_jobs=1, metrics=registry,
+                             overflow=OverflowPolicy(SPILL, spill_path=os.path.join(tmp, 'spill')))
+            with running(bot, reddit):
+                spilled = registry.get('bottr_items_spilled_total').labels(bot='SpillBot',
+                                                                           stream='comments')
+                wait_until(lambda: spilled.value >= 25)
+                started.set()
+                wait_until(lambda: len(done) >= 30)
+
+        self.assertEqual(done, ['{:x}'.format(i + 1) for i in range(30)])
+        self.assertGreaterEqual(spilled.value, 25)
+        self.assertTrue(reddit.info_calls)
+
+
+class TestSQLiteQueue(TestCase):
+    def test_unacknowledged_jobs_survive_restart(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'queue.db')
+            q = SQLiteQueue(path, commit_every=1)
+            for i in range(4):
+                q.put(i)
+            self.assertEqual(q.get(), 0)
+            q.task_done()
+            self.assertEqual(q.get(), 1)
+
+            # Crash while 1 is in progress
+            q.close()
+
+            q = SQLiteQueue(path, load_batch=2)
+            q.put(4)
+            q.put(None)
+            jobs = []
+            while True:
+                job = q.get()
+                if job is None:
+                    break
+                jobs.append(job)
+                q.task_done()
+            q.join()
+            self.assertEqual(jobs, [1, 2, 3, 4])
+            q.close()
+
+            self.assertEqual(SQLiteQueue(path).qsize(), 0)
+
+    def test_abandon_keeps_jobs(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'queue.db')
+            q = SQLiteQueue(path)
+            for i in range(3):
+                q.put(i)
+            q.put(None)
+            self.assertEqual(abandon(q), 3)
+            self.assertIsNone(q.get())
+            q.join()
+            q.close()
+
+            self.assertEqual(SQLiteQueue(path).qsize(), 3)
+
+    def test_visibility_timeout(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            q = SQLiteQueue(os.path.join(tmp, 'queue.db'), visibility_timeout=0.05)
+            q.put('a')
+            q.put('b')
+            self.assertEqual(q.get(), 'a')
+            self.assertEqual(q.get(), 'b')
+            q.task_done()
+            time.sleep(0.1)
+
+            # A thread acknowledges its oldest job, so 'a' is done and 'b' is handed out again
+            self.assertEqual(q.get(timeout=1), 'b')
+            self.assertEqual(q.qsize(), 0)
+            q.close()
+
+    def test_load_failure(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'queue.db')
+            q = SQLiteQueue(path)
+            for i in range(3):
+                q.put(i)
+            q.close()
+
+            load, calls = failing_load(1)
+            q = SQLiteQueue(path, load=load, retry=RetryPolicy(base=0.1, jitter=0))
+            with self.assertRaises(Empty):
+                q.get(timeout=0.02)
+            self.assertEqual(q.qsize(), 0)
+            self.assertEqual([q.get(timeout=1) for _ in range(3)], [0, 1, 2])
+            self.assertEqual(len(calls), 2)
+
+            # Jobs that were not loaded yet are left for the next run when stopping
+            q.put(None)
+            self.assertIsNone(q.get())
+            q.close()
+
+    def test_comment_bot_survives_failing_info(self):
+        comments = generate('comment', 5)
+        reddit = FakeReddit(comments=comments)
+        info = reddit.info
+        failures = []
+        done = []
+
+        def failing_info(fullnames):
+            if not failures:
+                failures.append(fullnames)
+                raise ConnectionError('Connection reset')
+            return info(fullnames)
+
+        reddit.info = failing_info
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'queue.db')
+            q = SQLiteQueue(path, dump=lambda c: c.fullname)
+            for comment in comments[:3]:
+                q.put(comment)
+            q.close()
+
+            bot = CommentBot(reddit=reddit, func_comment=lambda c: done.append(c.id),
+                             subreddits=['test'], n_jobs=1, queue_path=path)
+            run_until(bot, reddit, lambda: len(done) >= 5)
+
+        self.assertEqual(done, ['1', '2', '3', '4', '5'])
+        self.assertEqual(failures, [['t1_1', 't1_2', 't1_3']])
+
+    def test_comment_bot_resumes_jobs(self):
+        comments = generate('comment', 10)
+        reddit = FakeReddit(comments=comments)
+        done = []
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'queue.db')
+
+            # A previous run queued the first three comments, but did not process them
+            q = SQLiteQueue(path, dump=lambda c: c.fullname)
+            for comment in comments[:3]:
+                q.put(comment)
+            q.close()
+
+            # The stream yields them again, but they are in flight already
+            bot = CommentBot(reddit=reddit, func_comment=lambda c: done.append(c.id),
+                             subreddits=['test'], n_jobs=1, queue_path=path)
+            run_until(bot, reddit, lambda: len(done) >= 10)
+
+        self.assertEqual(done, ['{:x}'.format(i + 1) for i in range(10)])
+        self.assertEqual(reddit.info_calls, [['t1_1', 't1_2', 't1_3']])
@@ -0,0 +1,64 @@
+import time
+from unittest import TestCase
+
+from bottr import ratelimit
+from bottr.fake import FakeReddit, generate
+from bottr.ratelimit import RateLimiter
+from bottr.util import handle_rate_limit
+
+
+class TestRateLimiter(TestCase):
+    def test_burst_then_rate(self):
+        limiter = RateLimiter(rate=20, burst=2)
+        self.assertTrue(limiter.try_acquire())
+        self.assertTrue(limiter.try_acquire())
+        self.assertFalse(limiter.try_acquire())
+        start = time.monotonic()
+        self.assertTrue(limiter.acquire())
+        self.assertGreater(time.monotonic() - start, 0.03)
+
+    def test_block(self):
+        limiter = RateLimiter(rate=100, burst=5)
+        limiter.block(0.1)
+        self.assertGreater(limiter.blocked_for, 0)
+        self.assertAlmostEqual(limiter.wait_time(), 0.1, delta=0.05)
+        self.assertFalse(limiter.acquire(timeout=0.05))
+        self.assertTrue(limiter.acquire(timeout=1))
+
+    def test_shared_per_reddit(self):
+        reddit = FakeReddit()
+        self.assertIs(ratelimit.for_reddit(reddit), ratelimit.for_reddit(reddit))
+        self.assertIsNot(ratelimit.for_reddit(reddit), ratelimit.for_reddit(FakeReddit()))
+        self.assertIs(ratelimit.for_reddit(None), ratelimit.default_limiter)
+
+
+class TestHandleRateLimit(TestCase):
+    def test_ratelimit_error_blocks_shared_limiter(self):
+        reddit = FakeReddit(comments=generate('comment', 1))
+        comment = reddit._items['comment'][0]
+        calls = []
+
+        def reply(body):
+            calls.append(body)
+            if len(calls) == 1:
+                raise Exception("RATELIMIT: 'try again in 1 seconds.' on field 'ratelimit'")
+            return body
+        reply.__self__ = comment
+
+        start = time.monotonic()
+        self.assertEqual(handle_rate_limit(reply, 'hi'), 'hi')
+        self.assertGreater(time.monotonic() - start, 0.9)
+        self.assertEqual(calls, ['hi', 'hi'])
+
+    def test_explicit_reddit_and_unattributed_calls(self):
+        reddit = FakeReddit()
+        limiter = ratelimit.for_reddit(reddit)
+        for _ in range(5):
+            self.assertEqual(handle_rate_limit(lambda x: x, 1, reddit=reddit), 1)
+        self.assertFalse(limiter.try_acquire())
+
+        # Plain functions are not paced by the process-wide default limiter
+        start = time.monotonic()
+        for _ in range(20):
+            handle_rate_limit(lambda x: x, 1)
+        self.assertLess(time.monotonic() - start, 0.5)
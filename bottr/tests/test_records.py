@@ -0,0 +1,60 @@
+import pickle
+from unittest import TestCase
+
+from bottr.actions import Reply
+from bottr.bot import CommentBot
+from bottr.fake import FakeReddit, generate, run_until
+from bottr.records import ItemRecord, Projection
+from bottr.rules import Rule
+
+
+class TestProjection(TestCase):
+    def test_record(self):
+        reddit = FakeReddit(comments=generate('comment', 1, body='Bananas'))
+        comment = reddit._items['comment'][0]
+
+        record = Projection({'comment': ['body', 'author']}).record(comment, 'comment')
+        self.assertEqual(record.fields, ('author', 'body', 'id', 'name'))
+        self.assertEqual((record.body, record.author, record.fullname), ('Bananas', 'user0', 't1_1'))
+        self.assertFalse(hasattr(record, '__dict__'))
+
+        # Methods are looked up on the rehydrated thing, which only has the projected fields
+        with self.assertRaises(AttributeError):
+            record.parent_id
+        record.reply('hi')
+        self.assertEqual(reddit.actions, [('reply', 't1_1', 'hi')])
+
+        with self.assertRaises(Exception):
+            Projection({'comment': ['_reddit']})
+
+    def test_pickle(self):
+        reddit = FakeReddit()
+        record = Projection().record(generate('submission', 1)[0], 'submission')
+        restored = pickle.loads(pickle.dumps(record))
+        self.assertIsInstance(restored, ItemRecord)
+        self.assertEqual(restored.values(), record.values())
+
+        # Without the reddit instance, it has to be passed to rehydrate
+        with self.assertRaises(Exception):
+            restored.rehydrate()
+        restored.rehydrate(reddit).reply('hi')
+        self.assertEqual(reddit.actions, [('reply', 't3_1', 'hi')])
+
+
+class TestCommentBot(TestCase):
+    def test_projection(self):
+        reddit = FakeReddit(comments=generate('comment', 20, body='Bananas'))
+        received = []
+
+        def parse(comment):
+            received.append(comment)
+            return Reply('Bananas!')
+
+        rules = [Rule(parse, keywords=['Bananas'])]
+        bot = CommentBot(reddit=reddit, rules=rules, subreddits=['test'],
+                         projection=Projection({'comment': ['body', 'subreddit']}))
+        run_until(bot, reddit, lambda: len(reddit.actions) >= 20)
+
+        self.assertTrue(all(isinstance(c, ItemRecord) for c in received))
+        self.assertEqual(sorted(a[1] for a in reddit.actions),
+                         sorted('t1_{:x}'.format(i + 1) for i in range(20)))
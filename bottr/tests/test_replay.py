@@ -0,0 +1,49 @@
+import os
+import tempfile
+import time
+from unittest import TestCase
+
+from bottr.bot import CommentBot
+from bottr.fake import FakeReddit, generate, run_until
+from bottr.replay import Recorder, ReplayReddit
+
+
+class TestReplay(TestCase):
+    def record(self, path: str, n: int):
+        reddit = FakeReddit(comments=generate('comment', n, subreddits=['a', 'b']))
+        recorder = Recorder(path)
+        seen = []
+        bot = CommentBot(reddit=reddit, func_comment=lambda c: seen.append(c.id),
+                         subreddits=['a', 'b'], recorder=recorder)
+        run_until(bot, reddit, lambda: len(seen) >= n)
+        recorder.close()
+        return recorder
+
+    def test_record_and_replay(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'comments.jsonl.gz')
+            self.assertEqual(self.record(path, 20).recorded, 20)
+
+            reddit = ReplayReddit(path, speed=None)
+            seen = []
+            bot = CommentBot(reddit=reddit, func_comment=lambda c: seen.append((c.id, c.subreddit)),
+                             subreddits=['a'])
+            run_until(bot, reddit, lambda: len(seen) >= 10)
+            self.assertEqual(sorted(seen), sorted((c.id, 'a') for c in reddit._items['comment']
+                                                  if c.subreddit == 'a'))
+
+    def test_speed(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'comments.jsonl.gz')
+            self.record(path, 2)
+
+            # Spread the two comments one second apart, then replay them ten times faster
+            reddit = ReplayReddit(path, speed=10)
+            first, second = reddit._items['comment']
+            second.recorded_utc = first.recorded_utc + 1
+
+            started = time.perf_counter()
+            stream = reddit.subreddit('all').stream.comments()
+            self.assertEqual([next(stream).id, next(stream).id], [first.id, second.id])
+            self.assertAlmostEqual(time.perf_counter() - started, 0.1, delta=0.08)
+            reddit.close()
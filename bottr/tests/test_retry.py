@@ -0,0 +1,75 @@
+from unittest import TestCase
+
+import prawcore
+from praw.exceptions import APIException
+
+from bottr.bot import CommentBot
+from bottr.fake import FakeReddit, generate, run_until
+from bottr.retry import RetryPolicy, FATAL, RATELIMIT, TRANSIENT
+
+
+class Response(object):
+    """Minimal response for constructing prawcore exceptions"""
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FlakyReddit(FakeReddit):
+    """Fake reddit whose comment stream fails once after yielding a few items."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connects = 0
+
+    def stream(self, kind, accepts=None, pause_after=None):
+        self.connects += 1
+        for i, item in enumerate(super().stream(kind, accepts, pause_after)):
+            if self.connects == 1 and i == 5:
+                raise prawcore.exceptions.ServerError(Response(503))
+            yield item
+
+
+class TestRetryPolicy(TestCase):
+    def test_delay_grows_and_is_capped(self):
+        policy = RetryPolicy(base=1, factor=2, max_delay=10, jitter=0)
+        self.assertEqual([policy.delay(a) for a in range(5)], [1, 2, 4, 8, 10])
+        self.assertEqual(policy.delay(10000), 10)
+
+    def test_jitter(self):
+        policy = RetryPolicy(base=8, jitter=0.5)
+        for _ in range(20):
+            self.assertTrue(4 <= policy.delay(0) <= 8)
+
+    def test_classify(self):
+        policy = RetryPolicy(max_attempts=3, jitter=0)
+        ratelimit = APIException('RATELIMIT', 'try again in 2 minutes', None)
+        self.assertEqual(policy.classify(prawcore.exceptions.NotFound(Response(404))), FATAL)
+        self.assertEqual(policy.classify(ratelimit), RATELIMIT)
+        self.assertEqual(policy.classify(Exception('timeout')), TRANSIENT)
+        self.assertIsNone(policy.delay(0, prawcore.exceptions.Forbidden(Response(403))))
+        self.assertEqual(policy.delay(0, ratelimit), 120)
+        self.assertIsNone(policy.delay(3))
+
+
+class TestStreamResumption(TestCase):
+    def test_restart_resumes_without_duplicates(self):
+        reddit = FlakyReddit(comments=generate('comment', 20))
+        seen = []
+        bot = CommentBot(reddit=reddit, func_comment=lambda c: seen.append(c.id),
+                         subreddits=['test'], n_jobs=2, retry=RetryPolicy(base=0.01))
+        run_until(bot, reddit, lambda: len(seen) >= 20)
+        self.assertEqual(reddit.connects, 2)
+        self.assertEqual(sorted(seen), sorted(c.id for c in reddit._items['comment']))
+
+
+class TestOutOfOrderItems(TestCase):
+    def test_older_items_are_not_dropped(self):
+        comments = generate('comment', 4)
+        comments[1], comments[2] = comments[2], comments[1]
+        reddit = FakeReddit(comments=comments)
+        seen = []
+        bot = CommentBot(reddit=reddit, func_comment=lambda c: seen.append(c.id),
+                         subreddits=['test'], n_jobs=1)
+        run_until(bot, reddit, lambda: len(seen) >= 4)
+        self.assertEqual(seen, ['1', '3', '2', '4'])
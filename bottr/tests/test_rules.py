@@ -0,0 +1,87 @@
+from unittest import TestCase
+
+from bottr.bot import CommentBot
+from bottr.fake import FakeComment, FakeReddit, generate, run_until
+from bottr.rules import Rule, RuleSet
+
+
+def comment(body, subreddit='test', author='alice'):
+    return FakeComment(id='1', body=body, subreddit=subreddit, author=author)
+
+
+class TestRuleSet(TestCase):
+    def test_first_matching_rule_wins(self):
+        ban, banana = Rule(print, keywords=['ban']), Rule(print, keywords=['banana'])
+        rules = RuleSet([ban, banana], 'comment')
+        self.assertIs(rules.match(comment('a banana')), ban)
+        self.assertIsNone(rules.match(comment('an apple')))
+
+    def test_shadowed_rules_are_found(self):
+        # 'ban' matches first at the same position, but only 'banana' holds for r/fruit
+        ban = Rule(print, keywords=['ban'], subreddits=['politics'])
+        banana = Rule(print, keywords=['banana'], subreddits=['Fruit'])
+        rules = RuleSet([ban, banana], 'comment')
+        self.assertIs(rules.match(comment('a banana', subreddit='fruit')), banana)
+
+    def test_regex_author_and_predicate(self):
+        bot = Rule(print, regex=r'!remind\s+\d+', authors=['Alice'],
+                   predicate=lambda c: len(c.body) < 20)
+        rules = RuleSet([bot], 'comment', ignore_case=True)
+        self.assertIs(rules.match(comment('!REMIND 3')), bot)
+        self.assertIsNone(rules.match(comment('!remind 3', author='bob')))
+        self.assertIsNone(rules.match(comment('!remind 3 ' + 'x' * 20)))
+        self.assertIsNone(rules.match(comment('!remind me')))
+
+    def test_inline_flags_and_backreferences(self):
+        flagged = Rule(print, regex='(?i)banana')
+        repeated = Rule(print, regex=r'(a)\1', keywords=['cherry'])
+        apple = Rule(print, regex='(app)le')
+        rules = RuleSet([flagged, repeated, apple], 'comment')
+        self.assertIs(rules.match(comment('A BANANA')), flagged)
+        self.assertIs(rules.match(comment('baa')), repeated)
+        self.assertIs(rules.match(comment('cherry')), repeated)
+        self.assertIsNone(rules.match(comment('ab')))
+        self.assertIs(rules.match(comment('an apple')), apple)
+
+        with self.assertRaises(Exception):
+            RuleSet([Rule(print, regex='(unbalanced')], 'comment')
+
+    def test_rule_without_text_conditions(self):
+        fallback = Rule(print, subreddits=['test'])
+        rules = RuleSet([Rule(print, keywords=['banana']), fallback], 'comment')
+        self.assertIs(rules.match(comment('an apple')), fallback)
+        self.assertEqual(rules.route(comment('an apple', subreddit='other')), None)
+
+
+class TestRuleRouting(TestCase):
+    def test_only_matches_are_queued(self):
+        items = generate('comment', 6)
+        items += [FakeComment(id=str(100 + i), body='a banana', subreddit='test', author='bob')
+                  for i in range(3)]
+        reddit = FakeReddit(comments=items)
+        handled = []
+
+        bot = CommentBot(reddit=reddit, subreddits=['test'], n_jobs=2,
+                         rules=[Rule(lambda c, tag: handled.append((tag, c.id)),
+                                     keywords=['banana'], args=['fruit'])])
+        run_until(bot, reddit, lambda: len(handled) >= 3)
+        self.assertEqual(sorted(handled), [('fruit', '100'), ('fruit', '101'), ('fruit', '102')])
+
+    def test_rules_replace_handler(self):
+        with self.assertRaises(Exception):
+            CommentBot(reddit=None, func_comment=print, rules=[Rule(print, keywords=['x'])])
+
+    def test_failing_predicate_skips_item(self):
+        reddit = FakeReddit(comments=generate('comment', 5, body='a banana'))
+        handled = []
+
+        def predicate(comment):
+            if comment.id == '2':
+                raise ValueError('Not loaded')
+            return True
+
+        bot = CommentBot(reddit=reddit, subreddits=['test'], n_jobs=1,
+                         rules=[Rule(lambda c: handled.append(c.id), keywords=['banana'],
+                                     predicate=predicate)])
+        run_until(bot, reddit, lambda: len(handled) >= 4)
+        self.assertEqual(handled, ['1', '3', '4', '5'])
@@ -0,0 +1,78 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from bottr.bot import CommentBot
+from bottr.fake import FakeReddit, generate, run_until
+from bottr.seen import SeenSet, SQLiteSeenSet
+
+
+class TestSeenSet(TestCase):
+    def test_add(self):
+        seen = SeenSet()
+        self.assertTrue(seen.add('t1_a'))
+        self.assertFalse(seen.add('t1_a'))
+        self.assertIn('t1_a', seen)
+
+    def test_capacity_evicts_least_recent(self):
+        seen = SeenSet(capacity=2)
+        seen.add('t1_a')
+        seen.add('t1_b')
+        seen.add('t1_a')
+        seen.add('t1_c')
+        self.assertEqual(len(seen), 2)
+        self.assertIn('t1_a', seen)
+        self.assertNotIn('t1_b', seen)
+
+
+class TestPersistence(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_file(self):
+        path = os.path.join(self.dir.name, 'seen.txt')
+        seen = SeenSet(path=path, flush_every=10)
+        seen.add('t1_a')
+        seen.add('t1_b')
+        self.assertNotIn('t1_a', SeenSet(path=path))
+        seen.flush()
+        restored = SeenSet(path=path, capacity=1)
+        self.assertNotIn('t1_a', restored)
+        self.assertIn('t1_b', restored)
+
+    def test_sqlite(self):
+        path = os.path.join(self.dir.name, 'seen.db')
+        seen = SQLiteSeenSet(path, capacity=2)
+        for fullname in ['t1_a', 't1_b', 't1_c']:
+            seen.add(fullname)
+        seen.close()
+        restored = SQLiteSeenSet(path)
+        self.assertFalse(restored.add('t1_c'))
+        self.assertTrue(restored.add('t1_a'))
+        restored.close()
+
+
+class TestBotSeen(TestCase):
+    def test_marked_seen_once_processed(self):
+        reddit = FakeReddit(comments=generate('comment', 3))
+        seen = SeenSet()
+        unseen_while_processing = []
+        done = []
+
+        def parse(comment):
+            unseen_while_processing.append(comment.fullname not in seen)
+            done.append(comment.id)
+            if comment.id == '2':
+                raise ValueError('Handler failed')
+
+        bot = CommentBot(reddit=reddit, func_comment=parse, subreddits=['test'], n_jobs=1,
+                         seen=seen)
+        run_until(bot, reddit, lambda: len(seen) >= 3)
+
+        self.assertEqual(unseen_while_processing, [True, True, True])
+
+        # Failed items are marked as well, so they are not retried forever
+        self.assertEqual(sorted(seen._fullnames), ['t1_1', 't1_2', 't1_3'])
@@ -0,0 +1,83 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from bottr.bot import CommentBot
+from bottr.fake import FakeReddit, FakeComment
+from bottr.util import AncestryCache, SubsWatcher, check_comment_depth, check_comment_depths, \
+    parse_wait_time
+
+
+def thread():
+    """A comment tree a -> b -> c -> (d1, d2) below submission t3_s"""
+    parents = {'a': 't3_s', 'b': 't1_a', 'c': 't1_b', 'd1': 't1_c', 'd2': 't1_c'}
+    comments = [FakeComment(id=i, parent_id=p, subreddit='test') for i, p in parents.items()]
+    return FakeReddit(comments=comments), {c.id: c for c in comments}
+
+
+class TestUtil(TestCase):
+    def test_parse_wait_time(self):
+        self.assertEqual(parse_wait_time('try again in 3 minutes'), 180)
+        self.assertEqual(parse_wait_time('try again in 5 seconds'), 5)
+        self.assertEqual(parse_wait_time('something else'), 60)
+
+
+class TestAncestryCache(TestCase):
+    def test_depth_is_cached_for_siblings(self):
+        reddit, comments = thread()
+        cache = AncestryCache()
+        self.assertEqual(cache.depth(comments['d1']), 3)
+        calls = len(reddit.info_calls)
+        self.assertEqual(cache.depth(comments['d2']), 3)
+        self.assertEqual(len(reddit.info_calls), calls)
+        self.assertEqual(cache.depth(comments['a']), 0)
+
+    def test_check_comment_depth(self):
+        reddit, comments = thread()
+        cache = AncestryCache()
+        self.assertTrue(check_comment_depth(comments['d1'], max_depth=3, cache=cache))
+        self.assertFalse(check_comment_depth(comments['d1'], max_depth=2, cache=AncestryCache()))
+        self.assertTrue(check_comment_depth(comments['b'], max_depth=1, cache=cache))
+
+    def test_prefetch_one_request_per_level(self):
+        reddit, comments = thread()
+        cache = AncestryCache()
+        cache.prefetch([comments['d1'], comments['d2']])
+        self.assertEqual(reddit.info_calls, [['t1_c'], ['t1_b'], ['t1_a']])
+        self.assertEqual(cache.depth(comments['d2']), 3)
+        self.assertEqual(len(reddit.info_calls), 3)
+
+    def test_unknown_ancestry_fails_the_check(self):
+        orphan = FakeComment(id='o', parent_id='t1_missing', subreddit='test')
+        FakeReddit(comments=[orphan])
+        cache = AncestryCache()
+        self.assertFalse(check_comment_depth(orphan, max_depth=3, cache=cache))
+        with self.assertRaises(Exception):
+            cache.depth(orphan)
+
+    def test_check_comment_depths(self):
+        reddit, comments = thread()
+        self.assertEqual(check_comment_depths([comments['d1'], comments['b']], max_depth=2),
+                         [False, True])
+        self.assertEqual(reddit.info_calls, [['t1_a', 't1_c']])
+
+
+class TestSubsWatcher(TestCase):
+    def test_check(self):
+        bot = CommentBot(reddit=None, shard_size=2)
+        with tempfile.TemporaryDirectory() as tmp:
+            subs_file = os.path.join(tmp, 'subreddits.txt')
+            blacklist_file = os.path.join(tmp, 'blacklist.txt')
+            with open(subs_file, 'w') as f:
+                f.write('a\nB\nc\n\n')
+
+            watcher = SubsWatcher([bot], subs_file, blacklist_file)
+            self.assertTrue(watcher.check())
+            self.assertFalse(watcher.check())
+            self.assertEqual(bot._shard_subs, [['a', 'b'], ['c']])
+
+            with open(blacklist_file, 'w') as f:
+                f.write('c\n')
+            self.assertTrue(watcher.check())
+            self.assertEqual(bot._shard_subs, [['a', 'b']])
+            self.assertEqual(bot._blacklist, {'c'})
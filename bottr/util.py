@@ -1,15 +1,27 @@
+import functools
 import logging
+import os
 import re
+import threading
 import time
 from typing import Callable, Any, List
 
 import praw
 
+from bottr import ratelimit
+from bottr.cache import TTLCache
+from bottr.metrics import default_registry
+
 """Rate limit regular expression to extract the time in minutes/seconds"""
 RATELIMIT = re.compile(r'in (\d+) (minutes|seconds)')
 
 util_logger = logging.getLogger(__name__)
 
+ratelimited_seconds = default_registry.counter('bottr_ratelimited_seconds_total',
+                                               'Seconds calls waited for the rate limiter')
+ratelimit_errors = default_registry.counter('bottr_ratelimit_errors_total',
+                                            'RATELIMIT errors returned by reddit')
+
 def parse_wait_time(text: str) -> int:
     """Parse the waiting time from the exception"""
     val = RATELIMIT.findall(text)
@@ -26,44 +38,93 @@ def parse_wait_time(text: str) -> int:
     return 1 * 60
 
 
-def handle_rate_limit(func: Callable[[Any], Any], *args, **kwargs) -> Any:
+def _reddit_of(func: Callable) -> praw.Reddit:
+    """:class:`praw.Reddit` instance of a bound PRAW method, also wrapped in a partial, or None"""
+    while isinstance(func, functools.partial):
+        func = func.func
+    return getattr(getattr(func, '__self__', None), '_reddit', None)
+
+
+def handle_rate_limit(func: Callable[[Any], Any], *args, reddit: praw.Reddit = None,
+                      **kwargs) -> Any:
     """
     Calls :code:`func` with given arguments and handle rate limit exceptions.
 
+    Calls are paced by the :class:`~bottr.ratelimit.RateLimiter` shared by all workers and bots
+    using the same :class:`praw.Reddit` instance, which is :code:`reddit` or the instance of a
+    bound PRAW method such as :code:`comment.reply`. Other functions are not paced. If reddit
+    answers with a :code:`RATELIMIT` error, the shared limiter pauses all writes for the
+    requested time, instead of every worker running into the error and sleeping on its own.
+
+    The calling thread still waits for the limiter, also during such a pause. To let workers go
+    on processing items instead, return :class:`~bottr.actions.Action` objects from the
+    handlers and execute them with an :class:`~bottr.actions.Outbox`.
+
+    The time spent waiting for the limiter and the number of :code:`RATELIMIT` errors are counted
+    in :data:`~bottr.metrics.default_registry`.
+
     :param func: Function to call
     :param args: Argument list for :code:`func`
+    :param reddit: Reddit instance whose rate limiter paces the call. Defaults to the instance of
+        :code:`func`, if it is a bound PRAW method.
     :param kwargs: Dict arguments for `func`
     :returns: :code:`func` result
     """
+    if reddit is None:
+        reddit = _reddit_of(func)
+    limiter = ratelimit.for_reddit(reddit) if reddit is not None else None
+    name = getattr(func, '__name__', repr(func))
+
     error_count = 0
     while True:
+        if limiter is not None:
+            started = time.monotonic()
+            limiter.acquire()
+            ratelimited_seconds.inc(time.monotonic() - started)
         try:
             return func(*args, **kwargs)
         except Exception as e:
             if error_count > 3:
                 util_logger.error('Retried to call <{}> 3 times without success. '
-                                  'Continuing without calling it.'.format(func.__name__))
+                                  'Continuing without calling it.'.format(name))
                 break
 
             if 'DELETED_COMMENT' in str(e):
                 util_logger.warning('The comment has been deleted. '
-                                    'Function <{}> was not executed.'.format(func.__name__))
+                                    'Function <{}> was not executed.'.format(name))
                 break
             wait = parse_wait_time(str(e))
             util_logger.error(e)
+            error_count += 1
+
+            if 'RATELIMIT' in str(e):
+                ratelimit_errors.inc()
+                if limiter is not None:
+                    # Pause all callers sharing the limiter, the next acquire() waits for it
+                    limiter.block(wait)
+                else:
+                    time.sleep(wait)
+                    ratelimited_seconds.inc(wait)
+                continue
+
             util_logger.warning('Waiting ~{} minutes'.format(round(float(wait + 30) / 60)))
             time.sleep(wait + 30)
-            error_count += 1
 
 
-def check_comment_depth(comment: praw.models.Comment, max_depth=3) -> bool:
+def check_comment_depth(comment: praw.models.Comment, max_depth=3,
+                        cache: 'AncestryCache' = None) -> bool:
     """
     Check if comment is in a allowed depth range
 
     :param comment: :class:`praw.models.Comment` to count the depth of
     :param max_depth: Maximum allowed depth
+    :param cache: Optional :class:`AncestryCache` shared by all workers. Without it, every call walks
+        up the comment tree with one request per parent.
     :return: True if comment is in depth range between 0 and max_depth
     """
+    if cache is not None:
+        return cache.depth(comment, max_depth) <= max_depth
+
     count = 0
     while not comment.is_root:
         count += 1
@@ -75,6 +136,143 @@ def check_comment_depth(comment: praw.models.Comment, max_depth=3) -> bool:
     return True
 
 
+def check_comment_depths(comments: List[praw.models.Comment], max_depth=3,
+                         cache: 'AncestryCache' = None) -> List[bool]:
+    """
+    :func:`check_comment_depth` for a batch of comments, e.g. in a :code:`func_comments` handler.
+    The missing ancestors of all comments are fetched together, with one request per tree level.
+
+    :param comments: Comments to check
+    :param max_depth: Maximum allowed depth
+    :param cache: :class:`AncestryCache` to use. Defaults to a new one for this batch.
+    :return: One result per comment
+    """
+    if cache is None:
+        cache = AncestryCache()
+    cache.prefetch(comments, max_depth + 1)
+    return [cache.depth(comment, max_depth) <= max_depth for comment in comments]
+
+
+class AncestryCache(object):
+    """
+    Shared cache of the comment tree, mapping comment fullnames to their parent fullname and
+    their depth, i.e. their number of comment ancestors.
+
+    Sibling comments share their ancestors, so most depth lookups in busy threads are answered
+    from the cache. Missing ancestors are fetched with :func:`praw.Reddit.info`, and
+    :func:`~AncestryCache.prefetch` resolves the ancestors of many comments with one request per
+    tree level, instead of one request per parent and comment.
+
+    :param reddit: Reddit instance to fetch ancestors with. Defaults to the one of the comments.
+    :param maxsize: Maximum number of comments to remember
+    :param ttl: Seconds a cached comment stays valid
+
+    **Example usage**::
+
+        ancestry = AncestryCache()
+
+        def parse(comment):
+            if check_comment_depth(comment, max_depth=3, cache=ancestry):
+                comment.reply('Not too deep.')
+    """
+
+    def __init__(self, reddit: praw.Reddit = None, maxsize: int = 100000, ttl: float = 3600):
+        self._reddit = reddit
+        self._parents = TTLCache(maxsize, ttl)
+        self._depths = TTLCache(maxsize, ttl)
+
+    def _learn(self, comment: praw.models.Comment):
+        # Read the loaded data directly, attribute access on a lazy object would fetch it
+        parent = vars(comment).get('parent_id')
+        if parent is not None:
+            self._parents.set(comment.fullname, parent)
+
+    def _fetch(self, reddit: praw.Reddit, fullnames: List[str]):
+        """Fetch comments in batches of 100 and remember their parents."""
+        for i in range(0, len(fullnames), 100):
+            for comment in reddit.info(fullnames[i:i + 100]):
+                self._learn(comment)
+
+    def _known(self, fullname: str) -> bool:
+        return fullname.startswith('t3_') or fullname in self._depths or fullname in self._parents
+
+    def prefetch(self, comments: List[praw.models.Comment], max_depth: int = None):
+        """
+        Fetch the missing ancestors of all :code:`comments`, with one bulk request per tree level.
+
+        :param comments: Comments, e.g. a batch of a :code:`func_comments` handler
+        :param max_depth: Stop after this many levels
+        """
+        if not comments:
+            return
+
+        reddit = self._reddit or comments[0]._reddit
+        frontier = set()
+        for comment in comments:
+            self._learn(comment)
+            parent = self._parents.get(comment.fullname)
+            if parent is not None and not self._known(parent):
+                frontier.add(parent)
+
+        level = 0
+        while frontier and (max_depth is None or level < max_depth):
+            self._fetch(reddit, sorted(frontier))
+            level += 1
+
+            parents = (self._parents.get(fullname) for fullname in frontier)
+            frontier = set(p for p in parents if p is not None and not self._known(p))
+
+    def depth(self, comment: praw.models.Comment, max_depth: int = None) -> int:
+        """
+        Number of comment ancestors of :code:`comment`, 0 for a top-level comment.
+
+        Ancestors that are not cached are fetched one level at a time, since each fetch reveals
+        the next parent. Use :func:`~AncestryCache.prefetch` or :func:`check_comment_depths` to
+        fetch the ancestors of many comments together.
+
+        :param comment: Comment to get the depth of
+        :param max_depth: Stop counting once the depth exceeds this value
+        :return: Depth of the comment, or a value above :code:`max_depth` if it is deeper or its
+            ancestors cannot be found. Without :code:`max_depth`, the latter raises an exception.
+        """
+        reddit = self._reddit or comment._reddit
+        self._learn(comment)
+
+        # Descendants of the current comment, starting with the given one
+        chain = []  # type: List[str]
+        fullname = comment.fullname
+        while True:
+            depth = self._depths.get(fullname)
+            if depth is not None:
+                break
+
+            parent = self._parents.get(fullname)
+            if parent is None:
+                self._fetch(reddit, [fullname])
+                parent = self._parents.get(fullname)
+                if parent is None:
+                    # Unknown ancestry must not pass as shallow
+                    if max_depth is None:
+                        raise Exception('Could not find the parent of {}.'.format(fullname))
+                    util_logger.warning('Could not find the parent of {}'.format(fullname))
+                    return max_depth + 1
+
+            if parent.startswith('t3_'):
+                depth = 0
+                self._depths.set(fullname, depth)
+                break
+
+            chain.append(fullname)
+            if max_depth is not None and len(chain) > max_depth:
+                return len(chain)
+            fullname = parent
+
+        for i, descendant in enumerate(reversed(chain)):
+            self._depths.set(descendant, depth + i + 1)
+
+        return depth + len(chain)
+
+
 def init_reddit(creds_path='creds.props') -> praw.Reddit:
     """Initialize the reddit session by reading the credentials from the file at :code:`creds_path`.
 
@@ -120,4 +318,108 @@ def get_subs(subs_file='subreddits.txt', blacklist_file='blacklist.txt') -> List
 
     # Filter blacklisted
     subs_filtered = list(sorted(set(subs).difference(set(blacklisted))))
-    return subs_filtered
\ No newline at end of file
+    return subs_filtered
+
+def read_subs(path: str) -> List[str]:
+    """
+    Lowercase subreddit names in a file, one per line. Blank lines are skipped.
+
+    :param path: Path of the file
+    """
+    with open(path) as f:
+        return [line.strip().lower() for line in f if line.strip()]
+
+
+class SubsWatcher(object):
+    """
+    Applies changes of a file of subreddits and a file of blacklisted subreddits to running bots,
+    without restarting them.
+
+    Every :code:`interval` seconds, the watcher checks whether one of the files was modified. If
+    so, it passes the blacklisted subreddits to :func:`~bottr.bot.AbstractBot.set_blacklist` and
+    the other subreddits to :func:`~bottr.bot.AbstractBot.set_subreddits` of each bot, which
+    restarts only the streams whose subreddits changed. A missing blacklist file counts as empty.
+    If a file cannot be read, the error is logged and the bots keep their lists.
+
+    :param bots: Bots to update
+    :param subs_file: List of subreddits, see :func:`get_subs`
+    :param blacklist_file: List of blacklisted subreddits, see :func:`get_subs`
+    :param interval: Seconds between two checks
+
+    **Example usage**::
+
+        bot = CommentBot(reddit=reddit, func_comment=parse, subreddits=get_subs(), shard_size=100)
+        bot.start()
+
+        watcher = SubsWatcher([bot])
+        watcher.start()
+    """
+
+    def __init__(self, bots: List, subs_file: str = 'subreddits.txt',
+                 blacklist_file: str = 'blacklist.txt', interval: float = 10.0):
+        self._bots = list(bots)
+        self._subs_file = subs_file
+        self._blacklist_file = blacklist_file
+        self._interval = interval
+        self._versions = None  # type: tuple
+        self._stop_event = threading.Event()
+        self._thread = None  # type: threading.Thread
+
+    @staticmethod
+    def _version(path: str) -> tuple:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def check(self) -> bool:
+        """
+        Update the bots if a file was modified since the last check, or on the first check.
+
+        :return: True if the bots were updated
+        """
+        versions = self._version(self._subs_file), self._version(self._blacklist_file)
+        if versions == self._versions:
+            return False
+
+        try:
+            subs = read_subs(self._subs_file)
+            blacklist = read_subs(self._blacklist_file) if versions[1] is not None else []
+        except OSError:
+            util_logger.exception('Failed to read the subreddits, keeping the current ones')
+            return False
+
+        blacklisted = set(blacklist)
+        subs = sorted(set(s for s in subs if s not in blacklisted))
+        for bot in self._bots:
+            bot.set_blacklist(blacklist)
+            bot.set_subreddits(subs)
+
+        self._versions = versions
+        util_logger.info('Updated {} bots to {} subreddits and {} blacklisted subreddits'
+                         .format(len(self._bots), len(subs), len(blacklisted)))
+        return True
+
+    def start(self):
+        """Check the files every :code:`interval` seconds in a background thread, starting now."""
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='subs-watcher-thread')
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.check()
+            except Exception:
+                util_logger.exception('Failed to update the subreddits of the bots')
+
+            if self._stop_event.wait(self._interval):
+                return
+
+    def stop(self):
+        """Stop checking the files."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None